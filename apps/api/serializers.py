@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from apps.student.models import Student
 from apps.group.models import Group
-from apps.grade.models import Grade
+from apps.grade.models import Grade, GradeChange
 
 
 class StudentSerializer(serializers.ModelSerializer):
@@ -22,3 +22,15 @@ class GradeSerializer(serializers.ModelSerializer):
         model = Grade
         fields = ['id', 'student', 'mark', 'pages', 'subject', 'teacher', 'date']
 
+
+
+class GradeChangeSerializer(serializers.ModelSerializer):
+    """Изменение оценки; поля оценки называются так же, как в GradeSerializer"""
+    grade = serializers.IntegerField(source='grade_id')
+    student = serializers.IntegerField(source='student_id')
+    subject = serializers.IntegerField(source='subject_id')
+    teacher = serializers.IntegerField(source='teacher_id')
+
+    class Meta:
+        model = GradeChange
+        fields = ['id', 'action', 'grade', 'student', 'mark', 'pages', 'subject', 'teacher', 'date', 'created_at']
@@ -13,4 +13,5 @@ urlpatterns = [
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('diary/', DiaryAPIView.as_view(), name='diary-api'),
+    path('changes/', GradeChangesAPIView.as_view(), name='grade-changes-api'),
 ]
\ No newline at end of file
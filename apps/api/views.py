@@ -8,6 +8,11 @@ from rest_framework.views import APIView
 from datetime import datetime
 from apps.schedule.models import Subject
 from apps.grade.models import Grade
+from apps.grade.utils import (
+    CHANGES_MAX_PAGE_SIZE, CHANGES_PAGE_SIZE, grade_changes, latest_change_cursor, month_range
+)
+from apps.user.profile import Profile, load_profile_data
+from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 
 class StudentRetrieveView(views.APIView):
@@ -42,13 +47,22 @@ class DiaryAPIView(APIView):
     def get(self, request):
         "Получение дневника студента. Требуется токен"
         student = Student.objects.get(user__id=request.user.id)
+        # Курсор берётся до чтения оценок: изменения во время загрузки придут в changes
+        cursor = latest_change_cursor()
         subjects = Subject.objects.order_by('name')
         grades = Grade.objects.filter(student=student).order_by('date')
         date = request.GET.get('month')
         
         if date:
-            year, month = date.split('-')
-            grades = grades.filter(Q(date__month=month) & Q(date__year=year))
+            try:
+                year, month = map(int, date.split('-'))
+                start, end = month_range(year, month)
+            except ValueError:
+                # Неверный месяц (2024-13, abc, 2024) — показываем текущий
+                today = datetime.now()
+                date = f'{today.year}-{today.month:02}'
+                start, end = month_range(today.year, today.month)
+            grades = grades.filter(date__gte=start, date__lt=end)
         else:
             date = f'{datetime.now().year}-{datetime.now().month:02}'
         
@@ -59,6 +73,51 @@ class DiaryAPIView(APIView):
             'subjects': [subject.name for subject in subjects],
             'grades': GradeSerializer(grades, many=True).data,
             'days': [day.strftime('%Y-%m-%d') for day in days],
-            'date': date
+            'date': date,
+            'cursor': cursor,
+        })
+
+
+class GradeChangesAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Изменения оценок после курсора since. Требуется токен
+
+        Без since возвращается только текущий курсор — с него клиент
+        продолжает после полной загрузки (его же отдаёт diary/). Пока
+        has_more, следующую страницу запрашивают с полученным cursor.
+        reset — журнал начат заново (очистка или восстановление базы):
+        клиент загружает данные полностью и продолжает с нового курсора.
+        Студент видит свои оценки, преподаватель — студентов своих групп.
+        """
+        try:
+            since = int(request.GET['since']) if 'since' in request.GET else None
+            limit = int(request.GET.get('limit', CHANGES_PAGE_SIZE))
+            if (since is not None and since < 0) or limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({'detail': 'Неверный курсор или limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if since is None:
+            return Response({'changes': [], 'cursor': latest_change_cursor(), 'has_more': False, 'reset': False})
+
+        profile = Profile(request.user, load_profile_data(request.user))
+        if profile.is_admin:
+            student_ids = None
+        elif profile.is_student:
+            student_ids = [profile.pk]
+        elif profile.is_teacher:
+            student_ids = Student.group.through.objects.filter(
+                group_id__in=profile.group_ids
+            ).values('student_id')
+        else:
+            return Response({'detail': 'Недостаточно прав'}, status=status.HTTP_403_FORBIDDEN)
+
+        changes, cursor, has_more, reset = grade_changes(since, student_ids, min(limit, CHANGES_MAX_PAGE_SIZE))
+        return Response({
+            'changes': GradeChangeSerializer(changes, many=True).data,
+            'cursor': cursor,
+            'has_more': has_more,
+            'reset': reset,
         })
-    
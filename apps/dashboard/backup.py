@@ -0,0 +1,180 @@
+"""Резервное копирование базы в сжатый NDJSON и восстановление из него
+
+Формат записи совпадает с dumpdata: {"model": "app.model", "pk": ..., "fields": {...}},
+но записи идут по одной на строку, модели — в порядке зависимостей по внешним
+ключам, а файл сжат gzip. Чтение потоковое, поэтому так же читаются и старые
+JSON-файлы dumpdata (backup.json).
+"""
+import datetime
+import gzip
+import io
+import json
+import tempfile
+
+from django.apps import apps
+from django.core.management.base import CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+# Производные таблицы не выгружаются: после восстановления они пересчитываются.
+# Журнал изменений оценок тоже: курсоры клиентов относятся к текущей базе,
+# после восстановления журнал начинается заново (GradeChange.start_over)
+DERIVED_MODELS = {
+    'grade.studentmonthlystats', 'grade.gradechange', 'dashboard.counter',
+    'dashboard.searchdocument', 'dashboard.searchtoken',
+}
+
+# Таблицы, которые migrate заполняет сам: при загрузке из копии они заменяются целиком
+MIGRATE_FILLED_MODELS = {'contenttypes.contenttype', 'auth.permission'}
+
+
+class BackupJSONEncoder(DjangoJSONEncoder):
+    """Как у dumpdata, но время пишется с микросекундами — копия восстанавливается без потерь"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def model_label(model):
+    return model._meta.label_lower
+
+
+def dump_models(labels=(), exclude=()):
+    """Модели для выгрузки, отсортированные так, что связанные идут раньше"""
+    if labels:
+        models = []
+        for label in labels:
+            if '.' in label:
+                models.append(apps.get_model(label))
+            else:
+                models.extend(apps.get_app_config(label).get_models())
+    else:
+        models = list(apps.get_models())
+
+    excluded = set(DERIVED_MODELS)
+    for label in exclude:
+        if '.' in label:
+            excluded.add(label.lower())
+        else:
+            excluded.update(model_label(model) for model in apps.get_app_config(label).get_models())
+
+    models = [
+        model for model in models
+        if model._meta.managed
+        and not model._meta.proxy
+        and not model._meta.auto_created
+        and model_label(model) not in excluded
+    ]
+    return sort_models(models)
+
+
+def sort_models(models):
+    """Топологическая сортировка по FK/M2M; циклы оставляются в исходном порядке"""
+    pending = list(dict.fromkeys(models))
+    dependencies = {}
+    for model in pending:
+        related = set()
+        for field in model._meta.get_fields():
+            if field.is_relation and field.concrete and field.related_model is not None:
+                related.add(field.related_model._meta.concrete_model)
+            elif field.many_to_many and not field.auto_created and field.related_model is not None:
+                related.add(field.related_model._meta.concrete_model)
+        related.discard(model)
+        dependencies[model] = related & set(pending)
+
+    ordered = []
+    while pending:
+        ready = [model for model in pending if not (dependencies[model] - set(ordered))]
+        if not ready:
+            ready = pending[:1]
+        for model in ready:
+            ordered.append(model)
+            pending.remove(model)
+    return ordered
+
+
+def open_backup(path, mode):
+    """Открыть файл копии; .gz (или gzip-сигнатура при чтении) — сжатый"""
+    if mode == 'w':
+        if path.endswith('.gz'):
+            return gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+        return open(path, 'w', encoding='utf-8')
+
+    raw = open(path, 'rb')
+    magic = raw.read(2)
+    raw.seek(0)
+    if magic == b'\x1f\x8b':
+        return io.TextIOWrapper(gzip.GzipFile(fileobj=raw), encoding='utf-8')
+    return io.TextIOWrapper(raw, encoding='utf-8')
+
+
+def iter_records(stream, chunk_size=1 << 16):
+    """Записи из NDJSON или из JSON-массива dumpdata, без чтения файла целиком"""
+    decoder = json.JSONDecoder()
+    buffer = stream.read(chunk_size).lstrip()
+    if not buffer:
+        return
+
+    if not buffer.startswith('['):
+        for line in io.StringIO(buffer + stream.readline()):
+            if line.strip():
+                yield json.loads(line)
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+        return
+
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Файл резервной копии повреждён или обрезан')
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield record
+        buffer = buffer[end:]
+        if len(buffer) < chunk_size and not eof:
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+
+
+def sorted_records(records):
+    """Записи в порядке зависимостей моделей (sort_models)
+
+    dumpdata пишет модели в порядке приложений, а не связей. Записи
+    раскладываются по моделям во временные файлы и читаются в нужном
+    порядке, поэтому память не растёт с размером копии.
+    """
+    spools = {}
+    try:
+        for record in records:
+            label = record['model'].lower()
+            if label not in spools:
+                spools[label] = tempfile.TemporaryFile('w+', encoding='utf-8')
+            spools[label].write(json.dumps(record, ensure_ascii=False) + '\n')
+
+        models = {}
+        for label in spools:
+            try:
+                models[apps.get_model(label)] = label
+            except LookupError:
+                raise CommandError(f'Неизвестная модель в копии: {label}')
+        for model in sort_models(list(models)):
+            spool = spools[models[model]]
+            spool.seek(0)
+            for line in spool:
+                yield json.loads(line)
+    finally:
+        for spool in spools.values():
+            spool.close()
@@ -0,0 +1,171 @@
+"""Бенчмарк горячих страниц через тестовый клиент Django
+
+Для каждого масштаба данных (см. SCALES, параметры populate_db) страницы
+из CASES запрашиваются несколько раз, и для каждой фиксируются задержка
+первого (холодного) запроса, p50/p95 остальных, число SQL-запросов и
+размер ответа. Результат сравнивается с сохранённым базовым JSON —
+так регрессии видны до выкладки. Запускается командой benchmark;
+базовый прогон масштаба small лежит в BASELINE_PATH и обновляется
+вместе с изменениями, которые меняют число запросов страниц.
+"""
+import math
+import os
+import time
+
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, reverse
+
+from apps.group.models import Group
+from apps.schedule.models import Schedule
+from apps.student.models import Student
+from apps.teacher.models import Teacher
+from apps.user.models import User
+
+
+# Масштабы — параметры populate_db
+SCALES = {
+    'small': {'schools': 1, 'groups': 10, 'students_per_group': 10, 'years': 0.25},
+    'medium': {'schools': 2, 'groups': 10, 'students_per_group': 20, 'years': 1},
+    'large': {'schools': 10, 'groups': 10, 'students_per_group': 20, 'years': 2},
+}
+
+# (название, роль, имя URL, функция аргументов URL, GET-параметры)
+CASES = [
+    ('grade:list[admin]', 'admin', 'grade:list',
+     lambda f: {'group_pk': f['group'].pk, 'subject_pk': f['subject'].pk}, {}),
+    ('grade:list[teacher]', 'teacher', 'grade:list',
+     lambda f: {'group_pk': f['group'].pk, 'subject_pk': f['subject'].pk}, {}),
+    ('grade:group_journal', 'admin', 'grade:group_journal', lambda f: {'pk': f['group'].pk}, {}),
+    ('grade:diary', 'student', 'grade:diary', None, {}),
+    ('schedule:list[admin]', 'admin', 'schedule:list', None, {}),
+    ('schedule:list[teacher]', 'teacher', 'schedule:list', None, {}),
+    ('schedule:list[student]', 'student', 'schedule:list', None, {}),
+    ('group:list', 'admin', 'group:list', None, {}),
+    ('group:details', 'admin', 'group:details', lambda f: {'pk': f['group'].pk}, {}),
+    ('student:list', 'admin', 'student:list', None, {}),
+    ('teacher:list', 'admin', 'teacher:list', None, {}),
+    ('student:total_rating_list', 'admin', 'student:total_rating_list', None, {}),
+    ('student:choose_course_rating', 'admin', 'student:choose_course_rating', None, {}),
+    ('student:rating_by_course', 'admin', 'student:rating_by_course',
+     lambda f: {'pk': f['course'].pk}, {}),
+    ('dashboard:dashboard', 'admin', 'dashboard:dashboard', None, {}),
+    ('api:diary', 'student', 'diary-api', None, {}),
+]
+
+# Закоммиченный базовый прогон масштаба small
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+
+# Разница меньше этого порога не считается регрессией задержки (шум таймера)
+LATENCY_NOISE_MS = 5
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    index = max(math.ceil(fraction * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def fixtures():
+    """Объекты для URL и пользователи ролей: самая большая группа и её участники"""
+    group = Group.objects.annotate(
+        students_count=Count('student')
+    ).order_by('-students_count', 'id').first()
+    lesson = Schedule.objects.filter(group=group).select_related('subject').order_by('id').first()
+    subject = lesson.subject
+    teacher = (
+        Teacher.objects.filter(group=group, subjects=subject).exclude(user=None).order_by('id').first()
+        or Teacher.objects.filter(group=group).exclude(user=None).order_by('id').first()
+    )
+    student = Student.objects.filter(
+        group=group, student_status='active'
+    ).exclude(user=None).order_by('id').first()
+    admin = User.objects.filter(role__in=['admin', 'administrator']).order_by('id').first()
+    return {
+        'group': group,
+        'subject': subject,
+        'course': group.course,
+        'users': {
+            'admin': admin,
+            'teacher': teacher.user if teacher else None,
+            'student': student.user if student else None,
+        },
+    }
+
+
+def run_cases(repeat=10, cases=CASES):
+    """Прогон страниц на текущих данных; возвращает {название: метрики}"""
+    data = fixtures()
+    clients = {}
+    for role, user in data['users'].items():
+        if user is not None:
+            clients[role] = Client()
+            clients[role].force_login(user)
+
+    results = {}
+    for name, role, url_name, url_kwargs, params in cases:
+        if role not in clients:
+            results[name] = {'skipped': f'нет пользователя с ролью {role}'}
+            continue
+        try:
+            url = reverse(url_name, kwargs=url_kwargs(data) if url_kwargs else None)
+        except NoReverseMatch:
+            results[name] = {'skipped': f'URL {url_name} не подключён'}
+            continue
+        results[name] = measure(clients[role], url, params, repeat)
+    return results
+
+
+def measure(client, url, params, repeat):
+    """Первый запрос — холодный (пустой кэш), по остальным считаются перцентили"""
+    timings = []
+    queries = 0
+    for attempt in range(repeat + 1):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url, params)
+            elapsed = (time.perf_counter() - started) * 1000
+        if attempt == 0:
+            cold = elapsed
+        else:
+            timings.append(elapsed)
+            queries = len(captured)
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+    return {
+        'url': url,
+        'status': response.status_code,
+        'cold_ms': round(cold, 2),
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'queries': queries,
+        'bytes': len(content),
+    }
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Регрессии относительно базового прогона: список строк с описанием
+
+    Число запросов сравнивается точно, p95 и размер ответа — с допуском
+    tolerance (доля); задержки меньше LATENCY_NOISE_MS не учитываются.
+    """
+    regressions = []
+    for scale, scale_results in results.get('scales', {}).items():
+        base_cases = baseline.get('scales', {}).get(scale, {}).get('cases', {})
+        for name, current in scale_results.get('cases', {}).items():
+            base = base_cases.get(name)
+            if not base or 'skipped' in base or 'skipped' in current:
+                continue
+            prefix = f'{scale} / {name}'
+            if current['status'] != base['status']:
+                regressions.append(f'{prefix}: статус {base["status"]} → {current["status"]}')
+            if current['queries'] > base['queries']:
+                regressions.append(f'{prefix}: запросов {base["queries"]} → {current["queries"]}')
+            if (current['p95_ms'] > base['p95_ms'] * (1 + tolerance)
+                    and current['p95_ms'] - base['p95_ms'] > LATENCY_NOISE_MS):
+                regressions.append(f'{prefix}: p95 {base["p95_ms"]} → {current["p95_ms"]} мс')
+            if current['bytes'] > base['bytes'] * (1 + tolerance):
+                regressions.append(f'{prefix}: размер {base["bytes"]} → {current["bytes"]} байт')
+    return regressions
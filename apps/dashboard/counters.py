@@ -0,0 +1,187 @@
+"""Денормализованные счётчики: активные студенты групп и курсов, итоги школы
+
+Group.active_students_count и Course.active_students_count хранят число
+активных студентов, таблица Counter — итоги для дашборда (TOTALS).
+Сигналы (apps.dashboard.signals) меняют их на разницу при каждом
+изменении студента, его групп, преподавателя, группы или выпускника;
+bulk_create и update() сигналов не вызывают, поэтому после массовой
+загрузки и для починки расхождений есть reconcile().
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from apps.graduate.models import Graduate
+from apps.group.models import Group
+from apps.student.models import Student
+from apps.teacher.models import Teacher
+from .models import Counter, Course
+
+
+ACTIVE = 'active'
+
+TOTALS = ('students', 'active_students', 'teachers', 'groups', 'graduates', 'to_pay')
+
+
+def compute_totals():
+    """Итоги школы, посчитанные по таблицам"""
+    students = Student.objects.aggregate(
+        students=Count('id'),
+        active_students=Count('id', filter=Q(student_status=ACTIVE)),
+        to_pay=Coalesce(Sum('to_pay'), 0),
+    )
+    return {
+        **students,
+        'teachers': Teacher.objects.count(),
+        'groups': Group.objects.count(),
+        'graduates': Graduate.objects.count(),
+    }
+
+
+def totals():
+    """Итоги школы одним запросом; если счётчиков ещё нет, они заводятся"""
+    values = dict(Counter.objects.filter(name__in=TOTALS).values_list('name', 'value'))
+    if len(values) < len(TOTALS):
+        values = reconcile_totals()[0]
+    return values
+
+
+def add_totals(**deltas):
+    """Изменить итоги на разницу; отсутствующий счётчик пересчитывается целиком"""
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        if not Counter.objects.filter(name=name).update(value=F('value') + delta):
+            reconcile_totals()
+            return
+
+
+def _add_counts(model, deltas):
+    """{id: разница} → UPDATE по одному на каждое значение разницы"""
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if pk is not None and delta:
+            by_delta[delta].append(pk)
+    for delta, pks in by_delta.items():
+        model.objects.filter(pk__in=pks).update(
+            active_students_count=F('active_students_count') + delta
+        )
+
+
+def add_group_counts(deltas):
+    _add_counts(Group, deltas)
+
+
+def add_course_counts(deltas):
+    _add_counts(Course, deltas)
+
+
+def student_group_ids(student_id):
+    return list(Student.group.through.objects.filter(
+        student_id=student_id
+    ).values_list('group_id', flat=True))
+
+
+def student_state(student):
+    """То, от чего зависят счётчики студента"""
+    return {
+        'student_status': student.student_status,
+        'course_id': student.course_id,
+        'to_pay': student.to_pay or 0,
+    }
+
+
+def student_saved(student, previous):
+    """Учесть создание (previous=None) или изменение студента"""
+    current = student_state(student)
+    is_active = current['student_status'] == ACTIVE
+
+    if previous is None:
+        add_totals(students=1, active_students=int(is_active), to_pay=current['to_pay'])
+        if is_active:
+            # Групп у нового студента ещё нет: они добавляются через m2m
+            add_course_counts({current['course_id']: 1})
+        return
+
+    was_active = previous['student_status'] == ACTIVE
+    add_totals(to_pay=current['to_pay'] - (previous['to_pay'] or 0))
+
+    if was_active != is_active:
+        delta = 1 if is_active else -1
+        add_totals(active_students=delta)
+        add_course_counts({(current if is_active else previous)['course_id']: delta})
+        add_group_counts({group_id: delta for group_id in student_group_ids(student.pk)})
+    elif is_active and previous['course_id'] != current['course_id']:
+        add_course_counts({previous['course_id']: -1, current['course_id']: 1})
+
+
+def student_deleted(student, group_ids):
+    """Учесть удаление студента; group_ids — его группы до удаления"""
+    is_active = student.student_status == ACTIVE
+    add_totals(students=-1, active_students=-int(is_active), to_pay=-(student.to_pay or 0))
+    if is_active:
+        add_course_counts({student.course_id: -1})
+        add_group_counts({group_id: -1 for group_id in group_ids})
+
+
+def membership_changed(group_deltas):
+    """Студенты вошли в группы или вышли из них: {id группы: разница}"""
+    add_group_counts(group_deltas)
+
+
+def active_student_count(student_ids):
+    return Student.objects.filter(pk__in=student_ids, student_status=ACTIVE).count()
+
+
+def _active_members(kind):
+    """Число активных студентов группы или курса подзапросом"""
+    if kind == 'course':
+        members = Student.objects.filter(course=OuterRef('pk'), student_status=ACTIVE)
+        key = 'course'
+    else:
+        members = Student.group.through.objects.filter(
+            group=OuterRef('pk'), student__student_status=ACTIVE
+        )
+        key = 'group'
+    members = members.order_by().values(key).annotate(total=Count('*')).values('total')
+    return Coalesce(Subquery(members), 0)
+
+
+def _reconcile_counts(model, kind):
+    drifted = model.objects.annotate(
+        actual=_active_members(kind)
+    ).exclude(active_students_count=F('actual')).values_list('pk', 'active_students_count', 'actual')
+    drift = {pk: (stored, actual) for pk, stored, actual in drifted}
+    if drift:
+        model.objects.filter(pk__in=drift).update(active_students_count=_active_members(kind))
+    return drift
+
+
+def reconcile_totals():
+    """Пересчитать итоги школы; возвращает (итоги, {имя: (было, стало)})"""
+    actual = compute_totals()
+    stored = dict(Counter.objects.filter(name__in=TOTALS).values_list('name', 'value'))
+    drift = {
+        name: (stored.get(name), value)
+        for name, value in actual.items() if stored.get(name) != value
+    }
+    for name in drift:
+        Counter.objects.update_or_create(name=name, defaults={'value': actual[name]})
+    return actual, drift
+
+
+def reconcile():
+    """Сверить все счётчики с таблицами и исправить расхождения
+
+    Возвращает {'totals': ..., 'groups': ..., 'courses': ...} — что было
+    исправлено, в виде {ключ: (было, стало)}.
+    """
+    with transaction.atomic():
+        _, totals_drift = reconcile_totals()
+        return {
+            'totals': totals_drift,
+            'groups': _reconcile_counts(Group, 'group'),
+            'courses': _reconcile_counts(Course, 'course'),
+        }
@@ -0,0 +1,236 @@
+"""Живые события для открытых страниц (Server-Sent Events)
+
+Код, меняющий данные, публикует событие в канал (строку вроде
+'grade:3:7:2024-09'); асинхронные представления подписываются на канал и
+отдают события браузеру потоком text/event-stream через backend/asgi.py.
+
+Брокер выбирается настройкой LIVE_EVENTS_BACKEND:
+
+* InProcessBroker (по умолчанию) — подписчики в памяти процесса. Хватает
+  одного рабочего процесса ASGI-сервера.
+* PostgresBroker — публикация через NOTIFY, каждый процесс слушает LISTEN
+  в отдельном потоке и раздаёт события своим подписчикам. Нужен, когда
+  процессов несколько: событие из одного доходит до страниц всех.
+
+Очередь подписчика ограничена: если страница не успевает читать, поток
+закрывается событием resync, и страница перечитывает данные целиком.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'apps.dashboard.events.InProcessBroker'
+
+# Событий в очереди одного подписчика, дальше — resync
+QUEUE_SIZE = 256
+
+# Комментарий-пинг в тихом потоке, чтобы прокси не закрыли соединение
+KEEPALIVE_SECONDS = 15
+
+# Через сколько миллисекунд браузер переподключается после обрыва
+RETRY_MS = 5000
+
+_OVERFLOW = object()
+
+
+def sse_message(data, event=None, event_id=None):
+    """Одно сообщение в формате text/event-stream"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """Очередь событий одного подписчика в его цикле событий"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.overflowed = False
+
+    def push(self, event):
+        """Потокобезопасно: publish вызывается из синхронного кода в другом потоке"""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # цикл уже закрыт — подписчик ушёл
+
+    def _put(self, event):
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= QUEUE_SIZE:
+            self.overflowed = True
+            event = _OVERFLOW
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class InProcessBroker:
+    """Подписчики в памяти процесса: события не выходят за его пределы"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    @property
+    def active(self):
+        """Есть ли кому доставлять: без подписчиков публикацию можно не готовить"""
+        return bool(self._subscribers)
+
+    def publish(self, channel, event):
+        self._deliver(channel, event)
+
+    def _deliver(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.push(event)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                subscribers = self._subscribers[channel]
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+
+class PostgresBroker(InProcessBroker):
+    """NOTIFY/LISTEN PostgreSQL: события доходят до подписчиков всех процессов
+
+    Публикация — SELECT pg_notify(...) в текущем соединении Django.
+    Слушатель — поток с отдельным соединением, запускается при первой
+    подписке и переподключается после ошибок. Все каналы идут через один
+    канал PostgreSQL, имя канала приложения — внутри JSON.
+    """
+
+    NOTIFY_CHANNEL = 'live_events'
+
+    # Пауза перед переподключением слушателя после ошибки
+    RECONNECT_SECONDS = 5
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        super().__init__()
+        self.using = using
+        self._listener = None
+
+    @property
+    def active(self):
+        # Подписчики могут быть в других процессах
+        return True
+
+    def publish(self, channel, event):
+        payload = json.dumps({'channel': channel, 'event': event}, separators=(',', ':'))
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.NOTIFY_CHANNEL, payload])
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='live-events', daemon=True)
+                self._listener.start()
+        async with super().subscribe(channel) as subscription:
+            yield subscription
+
+    def _listen(self):
+        while True:
+            connection = connections.create_connection(self.using)
+            try:
+                connection.ensure_connection()
+                connection.set_autocommit(True)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.NOTIFY_CHANNEL}')
+                for payload in self._notifications(connection.connection):
+                    self._dispatch(payload)
+            except Exception:
+                logger.exception('Слушатель %s потерял соединение', self.NOTIFY_CHANNEL)
+            finally:
+                connection.close()
+            time.sleep(self.RECONNECT_SECONDS)
+
+    def _notifications(self, raw):
+        """Тексты уведомлений; psycopg2 опрашивается через select, psycopg 3 — генератором"""
+        if hasattr(raw, 'poll'):
+            while True:
+                if select.select([raw], [], [], KEEPALIVE_SECONDS)[0]:
+                    raw.poll()
+                    while raw.notifies:
+                        yield raw.notifies.pop(0).payload
+        else:
+            for notify in raw.notifies():
+                yield notify.payload
+
+    def _dispatch(self, payload):
+        try:
+            message = json.loads(payload)
+            self._deliver(message['channel'], message['event'])
+        except (ValueError, KeyError, TypeError):
+            logger.warning('Непонятное уведомление %s: %r', self.NOTIFY_CHANNEL, payload[:200])
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Брокер процесса по настройке LIVE_EVENTS_BACKEND (создаётся один раз)"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'LIVE_EVENTS_BACKEND', DEFAULT_BACKEND))()
+    return _broker
+
+
+async def event_stream(channel, backlog=None, broker=None):
+    """Поток SSE канала: события, пинги, resync при переполнении очереди
+
+    backlog — асинхронная функция без аргументов: события, пропущенные
+    клиентом до переподключения, или None, если их слишком много (тогда
+    resync). Вызывается уже после подписки, поэтому ничего не теряется;
+    событие может прийти дважды, клиент применяет его идемпотентно.
+    """
+    broker = broker or get_broker()
+    async with broker.subscribe(channel) as subscription:
+        yield f'retry: {RETRY_MS}\n: connected\n\n'
+        if backlog is not None:
+            missed = await backlog()
+            if missed is None:
+                yield sse_message({}, event='resync')
+                return
+            for event in missed:
+                yield sse_message(event, event_id=event.get('cursor'))
+        while True:
+            try:
+                event = await subscription.get(KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if event is _OVERFLOW:
+                yield sse_message({}, event='resync')
+                return
+            yield sse_message(event, event_id=event.get('cursor'))
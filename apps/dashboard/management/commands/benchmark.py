@@ -0,0 +1,123 @@
+import json
+import os
+from datetime import datetime
+from io import StringIO
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from apps.dashboard.benchmark import BASELINE_PATH, SCALES, compare, run_cases
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк горячих страниц: заполняет тестовую базу populate_db на нескольких '
+        'масштабах и записывает p50/p95, число запросов и размер ответов в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales',
+            default='small,medium',
+            help=f'Масштабы через запятую из: {", ".join(SCALES)} (по умолчанию: small,medium)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=10,
+            help='Повторов каждой страницы после холодного запроса (по умолчанию: 10)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Сид populate_db (по умолчанию: 42)'
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmark.json',
+            help='Файл результатов (по умолчанию: benchmark.json)'
+        )
+        parser.add_argument(
+            '--baseline',
+            help=(
+                'Базовый JSON для сравнения; при регрессиях команда завершается с ошибкой. '
+                f'Прогон масштаба small хранится в {os.path.relpath(BASELINE_PATH)}'
+            )
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Допустимый рост p95 и размера ответа, доля (по умолчанию: 0.2)'
+        )
+
+    def handle(self, *args, **options):
+        scales = [scale.strip() for scale in options['scales'].split(',') if scale.strip()]
+        unknown = [scale for scale in scales if scale not in SCALES]
+        if unknown:
+            raise CommandError(f'Неизвестные масштабы: {", ".join(unknown)}')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть не меньше 1')
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as stream:
+                baseline = json.load(stream)
+
+        # Данные генерируются только в тестовой базе, рабочая не затрагивается
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            results = {
+                'meta': {
+                    'created': datetime.now().isoformat(timespec='seconds'),
+                    'database': connection.vendor,
+                    'django': django.get_version(),
+                    'repeat': options['repeat'],
+                    'seed': options['seed'],
+                },
+                'scales': {},
+            }
+            for scale in scales:
+                self.stdout.write(f'📊 Масштаб {scale}: заполнение базы...')
+                call_command(
+                    'populate_db', clear=True, seed=options['seed'],
+                    stdout=self.stdout if options['verbosity'] > 1 else StringIO(),
+                    **SCALES[scale]
+                )
+                self.stdout.write(f'⏱️  Масштаб {scale}: замеры...')
+                cases = run_cases(repeat=options['repeat'])
+                results['scales'][scale] = {'options': SCALES[scale], 'cases': cases}
+                self.print_cases(cases)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        with open(options['output'], 'w', encoding='utf-8') as stream:
+            json.dump(results, stream, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'✅ Результаты записаны в {options["output"]}'))
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['tolerance'])
+            if regressions:
+                for line in regressions:
+                    self.stdout.write(self.style.ERROR(f'   ❌ {line}'))
+                raise CommandError(f'Регрессий относительно {options["baseline"]}: {len(regressions)}')
+            self.stdout.write(self.style.SUCCESS('✅ Регрессий относительно базового прогона нет'))
+
+    def print_cases(self, cases):
+        for name, result in cases.items():
+            if 'skipped' in result:
+                self.stdout.write(f'   ⏭️  {name}: пропущено ({result["skipped"]})')
+                continue
+            self.stdout.write(
+                f'   {name}: {result["status"]}, p50 {result["p50_ms"]} мс, '
+                f'p95 {result["p95_ms"]} мс, холодный {result["cold_ms"]} мс, '
+                f'запросов {result["queries"]}, {result["bytes"]} байт'
+            )
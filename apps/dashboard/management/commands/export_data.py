@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+
+from apps.dashboard.backup import BackupJSONEncoder, dump_models, model_label, open_backup
+
+
+class Command(BaseCommand):
+    help = 'Выгружает базу в сжатый NDJSON (замена dumpdata для резервных копий)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл копии, например backup.jsonl.gz (.gz — со сжатием)'
+        )
+        parser.add_argument(
+            'labels',
+            nargs='*',
+            help='Приложения или модели (app или app.Model); по умолчанию — все'
+        )
+        parser.add_argument(
+            '--exclude',
+            action='append',
+            default=[],
+            help='Исключить приложение или модель (можно указывать несколько раз)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Размер порции чтения из базы (по умолчанию: 2000)'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        encoder = BackupJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        models = dump_models(options['labels'], options['exclude'])
+
+        total = 0
+        with open_backup(options['path'], 'w') as stream:
+            for model in models:
+                count = 0
+                for record in self.model_records(model, chunk_size):
+                    stream.write(encoder.encode(record))
+                    stream.write('\n')
+                    count += 1
+                total += count
+                self.stdout.write(f'   ✅ {model_label(model)}: {count}')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'🎉 Выгружено записей: {total} → {options["path"]}')
+        )
+
+    def model_records(self, model, chunk_size):
+        """Записи модели; M2M собираются слиянием с таблицей связей, отсортированной по pk"""
+        opts = model._meta
+        fields = [field for field in opts.concrete_fields if not field.primary_key]
+        m2m_fields = [field for field in opts.many_to_many if field.remote_field.through._meta.auto_created]
+
+        rows = model._base_manager.order_by('pk').values_list(
+            'pk', *[field.attname for field in fields]
+        ).iterator(chunk_size=chunk_size)
+
+        m2m_streams = []
+        for field in m2m_fields:
+            through = field.remote_field.through
+            source = through._meta.get_field(field.m2m_field_name()).attname
+            target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+            links = through._base_manager.order_by(source, target).values_list(
+                source, target
+            ).iterator(chunk_size=chunk_size)
+            m2m_streams.append([field.name, links, next(links, None)])
+
+        for row in rows:
+            pk = row[0]
+            record_fields = {field.name: value for field, value in zip(fields, row[1:])}
+            for stream in m2m_streams:
+                name, links, pending = stream
+                values = []
+                while pending is not None and pending[0] < pk:
+                    pending = next(links, None)
+                while pending is not None and pending[0] == pk:
+                    values.append(pending[1])
+                    pending = next(links, None)
+                stream[2] = pending
+                record_fields[name] = values
+            yield {'model': model_label(model), 'pk': pk, 'fields': record_fields}
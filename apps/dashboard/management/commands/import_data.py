@@ -0,0 +1,244 @@
+import io
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from apps.dashboard.backup import (
+    DERIVED_MODELS, MIGRATE_FILLED_MODELS, iter_records, open_backup, sorted_records
+)
+from apps.grade.models import GradeChange
+
+
+@contextmanager
+def raw_timestamps(model):
+    """Отключает auto_now/auto_now_add, чтобы bulk_create не перезаписал даты из копии"""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _copy_value(value):
+    if value is None:
+        return ''
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class Command(BaseCommand):
+    help = (
+        'Восстанавливает базу из копии export_data (NDJSON, .gz) '
+        'или из JSON-файла dumpdata (backup.json)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл копии')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Размер пакета вставки (по умолчанию: 2000)'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help=(
+                'Удалить существующие строки каждой загружаемой модели перед вставкой '
+                '(типы содержимого и права, созданные migrate, заменяются всегда)'
+            )
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY на PostgreSQL (только bulk_create)'
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='База данных (по умолчанию: default)'
+        )
+
+    def handle(self, *args, **options):
+        self.using = options['database']
+        self.connection = connections[self.using]
+        self.batch_size = options['batch_size']
+        self.clear = options['clear']
+        self.use_copy = (
+            self.connection.vendor == 'postgresql' and not options['no_copy'] and self.copy_supported()
+        )
+
+        self.counts = {}
+        self.cleared = set()
+        self.batch_model = None
+        self.batch = []
+        self.links = {}
+        self.skipped_fields = set()
+
+        with open_backup(options['path'], 'r') as stream:
+            with transaction.atomic(using=self.using):
+                with self.connection.constraint_checks_disabled():
+                    for record in sorted_records(iter_records(stream)):
+                        self.load_record(record)
+                    self.flush()
+                    for through in list(self.links):
+                        self.flush_links(through)
+
+                loaded = [apps.get_model(label) for label in self.counts]
+                self.connection.check_constraints(
+                    table_names=[model._meta.db_table for model in loaded]
+                )
+                self.reset_sequences(loaded)
+                if 'grade.grade' in self.counts:
+                    # Оценки загружены в обход журнала изменений: клиенты ленты начинают заново
+                    GradeChange.start_over(clear=self.clear, using=self.using)
+
+        for label, count in self.counts.items():
+            self.stdout.write(f'   ✅ {label}: {count}')
+        for label, name in sorted(self.skipped_fields):
+            self.stdout.write(self.style.WARNING(f'   ⚠️  Пропущено неизвестное поле {label}.{name}'))
+
+        ContentType.objects.clear_cache()
+        self.stdout.write('📊 Пересчёт производных данных...')
+        call_command('rebuild_monthly_stats', stdout=self.stdout)
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
+        cache.clear()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'🎉 Восстановлено записей: {sum(self.counts.values())}')
+        )
+
+    def load_record(self, record):
+        label = record['model'].lower()
+        if label in DERIVED_MODELS:
+            return
+        try:
+            model = apps.get_model(label)
+        except LookupError:
+            raise CommandError(f'Неизвестная модель в копии: {record["model"]}')
+
+        if model is not self.batch_model:
+            self.flush()
+            self.batch_model = model
+            self.clear_model(model)
+
+        opts = model._meta
+        values = {opts.pk.attname: opts.pk.to_python(record.get('pk'))}
+        for name, value in record.get('fields', {}).items():
+            try:
+                field = opts.get_field(name)
+            except FieldDoesNotExist:
+                self.skipped_fields.add((label, name))
+                continue
+            if field.many_to_many:
+                self.add_links(field, values[opts.pk.attname], value)
+            elif field.is_relation:
+                values[field.attname] = None if value is None else field.target_field.to_python(value)
+            else:
+                values[field.attname] = field.to_python(value)
+
+        self.batch.append(model(**values))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def add_links(self, field, pk, targets):
+        through = field.remote_field.through
+        if not through._meta.auto_created:
+            return
+        source = through._meta.get_field(field.m2m_field_name()).attname
+        target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+        self.clear_model(through)
+        rows = self.links.setdefault(through, [])
+        for value in targets:
+            if isinstance(value, (list, tuple)):
+                raise CommandError('Натуральные ключи в M2M не поддерживаются, выгрузите копию без --natural-*')
+            rows.append(through(**{source: pk, target: value}))
+        if len(rows) >= self.batch_size:
+            self.flush_links(through)
+
+    def clear_model(self, model):
+        """При --clear удаляет строки модели до загрузки (без каскадов — ограничения отложены)
+
+        Типы содержимого и права migrate создаёт и в пустой базе, их id
+        могут не совпадать с копией — такие таблицы очищаются всегда.
+        """
+        if model in self.cleared:
+            return
+        if not self.clear and model._meta.label_lower not in MIGRATE_FILLED_MODELS:
+            return
+        self.cleared.add(model)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.connection.ops.quote_name(model._meta.db_table)}')
+
+    def flush(self):
+        if self.batch:
+            self.insert(self.batch_model, self.batch)
+            self.batch = []
+
+    def flush_links(self, through):
+        rows = self.links.pop(through, [])
+        if rows:
+            self.insert(through, rows)
+
+    def insert(self, model, objs):
+        if self.use_copy:
+            self.copy_rows(model, objs)
+        else:
+            with raw_timestamps(model):
+                model._base_manager.using(self.using).bulk_create(objs, batch_size=self.batch_size)
+        label = model._meta.label_lower
+        self.counts[label] = self.counts.get(label, 0) + len(objs)
+
+    def copy_supported(self):
+        """COPY из Python умеют psycopg2 (copy_expert) и psycopg 3 (copy)"""
+        with self.connection.cursor() as cursor:
+            return hasattr(cursor.cursor, 'copy_expert') or hasattr(cursor.cursor, 'copy')
+
+    def copy_rows(self, model, objs):
+        """Вставка пакета через COPY ... FROM STDIN (PostgreSQL)"""
+        fields = [
+            field for field in model._meta.concrete_fields
+            if not (field.primary_key and getattr(objs[0], field.attname) is None)
+        ]
+        quote = self.connection.ops.quote_name
+        buffer = io.StringIO()
+        for obj in objs:
+            buffer.write(','.join(
+                _copy_value(field.get_db_prep_save(getattr(obj, field.attname), self.connection))
+                for field in fields
+            ))
+            buffer.write('\n')
+        buffer.seek(0)
+        columns = ', '.join(quote(field.column) for field in fields)
+        sql = f'COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)'
+        with self.connection.cursor() as cursor:
+            if hasattr(cursor.cursor, 'copy_expert'):
+                cursor.copy_expert(sql, buffer)
+            else:
+                with cursor.cursor.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+
+    def reset_sequences(self, models):
+        statements = self.connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with self.connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
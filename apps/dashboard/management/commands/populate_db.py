@@ -1,9 +1,12 @@
+from django.core.cache import cache
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
 from faker import Faker
 import random
 from datetime import date, timedelta
+from multiprocessing import Pool
 
 from apps.user.models import User
 from apps.dashboard.models import Course
@@ -12,33 +15,160 @@ from apps.student.models import Student
 from apps.teacher.models import Teacher
 from apps.administrator.models import Administrator
 from apps.schedule.models import Day, Subject, Schedule
-from apps.grade.models import Grade
+from apps.grade.models import Grade, GradeChange, StudentMonthlyStats
 from apps.graduate.models import Graduate, GraduateAchievement
 
-fake = Faker('ru_RU')  # Русская локализация
+
+COURSES = [
+    'Основы Ислама',
+    'Коран и Хадисы',
+    'Арабский язык',
+    'Исламская история',
+    'Фикх (Исламское право)'
+]
+
+GROUP_LEVELS = ['Начинающие', 'Средний', 'Продвинутый', 'Выпускной']
+
+DAYS = [
+    'Понедельник', 'Вторник', 'Среда', 'Четверг',
+    'Пятница', 'Суббота', 'Воскресенье'
+]
+
+SUBJECTS = [
+    'Чтение Корана', 'Заучивание Корана', 'Тафсир',
+    'Хадисы', 'Арабская грамматика', 'Арабская лексика',
+    'Исламская история', 'Фикх', 'Акыда (Вероучение)',
+    'Исламская этика', 'Дуа и Зикр'
+]
+
+OCCUPATIONS = [
+    'Имам мечети',
+    'Преподаватель исламских наук',
+    'Студент университета',
+    'Переводчик арабского языка',
+    'Исламский консультант',
+    'Работает в исламском центре',
+    'Продолжает обучение',
+    'Частный преподаватель'
+]
+
+ACHIEVEMENTS = [
+    'Поступление в исламский университет',
+    'Получение иджазы по Корану',
+    'Назначение имамом мечети',
+    'Завершение курса арабского языка',
+    'Участие в международной конференции',
+    'Публикация исламской статьи',
+    'Организация исламского мероприятия'
+]
+
+# Доля студентов, получающих оценку на занятии, и распределение оценок
+ATTENDANCE = 0.85
+MARKS = [2, 3, 4, 5]
+MARK_WEIGHTS = [1, 3, 5, 6]
+
+# Сколько людей генерирует Faker за одну задачу (и один сид)
+PEOPLE_CHUNK = 500
+
+_faker = None
+
+
+def fake_people(task):
+    """Имена, телефоны и тексты для порции людей
+
+    Вызывается в пуле процессов, поэтому функция верхнего уровня. Каждая
+    порция получает свой сид, и результат не зависит от числа процессов.
+    """
+    global _faker
+    seed, kind, count, with_texts = task
+    if _faker is None:
+        _faker = Faker('ru_RU')
+    _faker.seed_instance(seed)
+    rng = random.Random(seed)
+
+    people = []
+    for _ in range(count):
+        if kind == 'teacher' or rng.random() < 0.5:
+            first_name, last_name = _faker.first_name_male(), _faker.last_name_male()
+        else:
+            first_name, last_name = _faker.first_name_female(), _faker.last_name_female()
+        person = {
+            'first_name': first_name,
+            'last_name': last_name,
+            'phone': _faker.phone_number()[:12],
+        }
+        if with_texts:
+            person['email'] = _faker.email()
+            person['texts'] = [_faker.text(max_nb_chars=200) for _ in range(5)]
+        people.append(person)
+    return people
 
 
 class Command(BaseCommand):
-    help = 'Заполняет базу данных тестовыми данными'
+    help = (
+        'Заполняет базу данных тестовыми данными; размер задаётся '
+        'масштабными параметрами (школы, группы, студенты, годы истории)'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
-            '--students',
+            '--schools',
             type=int,
-            default=50,
-            help='Количество студентов (по умолчанию: 50)'
+            default=1,
+            help='Количество школ — наборов курсов, групп и преподавателей (по умолчанию: 1)'
+        )
+        parser.add_argument(
+            '--groups',
+            type=int,
+            default=10,
+            help='Количество групп в школе (по умолчанию: 10)'
+        )
+        parser.add_argument(
+            '--students-per-group',
+            type=int,
+            default=5,
+            help='Количество студентов в группе (по умолчанию: 5)'
         )
         parser.add_argument(
             '--teachers',
             type=int,
             default=10,
-            help='Количество преподавателей (по умолчанию: 10)'
+            help='Количество преподавателей в школе (по умолчанию: 10)'
         )
         parser.add_argument(
             '--graduates',
             type=int,
             default=20,
-            help='Количество выпускников (по умолчанию: 20)'
+            help='Количество выпускников в школе (по умолчанию: 20)'
+        )
+        parser.add_argument(
+            '--years',
+            type=float,
+            default=0.25,
+            help='Глубина истории оценок в годах (по умолчанию: 0.25 — около трёх месяцев)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Сид генератора: одинаковые параметры дают одинаковые данные (по умолчанию: 42)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Размер пакета для bulk_create (по умолчанию: 5000)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='Процессов для генерации имён Faker; 0 — без пула (по умолчанию: 0)'
+        )
+        parser.add_argument(
+            '--password',
+            default=None,
+            help='Пароль всех созданных пользователей (по умолчанию вход по паролю отключён)'
         )
         parser.add_argument(
             '--clear',
@@ -47,357 +177,413 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
+        self.seed = options['seed']
+        self.rng = random.Random(self.seed)
+        self.batch_size = options['batch_size']
+        self.workers = options['workers']
+        # Хеш считается один раз: make_password на каждого пользователя — самая медленная часть
+        self.password = make_password(options['password'])
+
+        schools = options['schools']
+        groups_per_school = options['groups']
+        students_count = schools * groups_per_school * options['students_per_group']
+        teachers_count = schools * options['teachers']
+        graduates_count = schools * options['graduates']
+
+        self.stdout.write('🧑 Генерация имён...')
+        student_people = self.generate_people('student', students_count)
+        teacher_people = self.generate_people('teacher', teachers_count)
+        graduate_people = self.generate_people('graduate', graduates_count, with_texts=True)
+
         if options['clear']:
             self.stdout.write('🗑️  Очистка существующих данных...')
             self.clear_data()
 
         with transaction.atomic():
             self.stdout.write('📚 Создание базовых данных...')
-            self.create_base_data()
-            
+            schools_data = self.create_base_data(schools, groups_per_school)
+
             self.stdout.write('👨‍🏫 Создание преподавателей...')
-            teachers = self.create_teachers(options['teachers'])
-            
+            self.create_teachers(schools_data, teacher_people, options['teachers'])
+
             self.stdout.write('👨‍🎓 Создание студентов...')
-            students = self.create_students(options['students'])
-            
+            self.create_students(schools_data, student_people, options['students_per_group'])
+
             self.stdout.write('📅 Создание расписания...')
-            self.create_schedule(teachers)
-            
+            lessons = self.create_schedule(schools_data)
+
             self.stdout.write('📊 Создание оценок...')
-            self.create_grades(students, teachers)
-            
+            grades_count = self.create_grades(lessons, options['years'])
+
             self.stdout.write('🎓 Создание выпускников...')
-            self.create_graduates(options['graduates'])
-            
+            self.create_graduates(schools_data, graduate_people, options['graduates'])
+
             self.stdout.write('👤 Создание администраторов...')
             self.create_administrators()
 
+            # bulk_create не вызывает сигналы — сводку, счётчики, поиск и кэш обновляем целиком
+            call_command('rebuild_monthly_stats', batch_size=self.batch_size, stdout=self.stdout)
+            call_command('reconcile_counters', stdout=self.stdout)
+            call_command('rebuild_search_index', batch_size=self.batch_size, stdout=self.stdout)
+            # Ни очистка, ни новые оценки не попали в журнал изменений: он начинается
+            # заново (при --clear старые записи удаляются), клиенты ленты загружают всё
+            GradeChange.start_over(clear=options['clear'])
+        cache.clear()
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'✅ База данных успешно заполнена!\n'
-                f'   Студентов: {options["students"]}\n'
-                f'   Преподавателей: {options["teachers"]}\n'
-                f'   Выпускников: {options["graduates"]}'
+                f'   Школ: {schools}\n'
+                f'   Групп: {schools * groups_per_school}\n'
+                f'   Студентов: {students_count}\n'
+                f'   Преподавателей: {teachers_count}\n'
+                f'   Выпускников: {graduates_count}\n'
+                f'   Оценок: {grades_count}'
             )
         )
 
+    def generate_people(self, kind, count, with_texts=False):
+        """Данные Faker порциями; при --workers порции считаются в пуле процессов"""
+        tasks = []
+        for index, start in enumerate(range(0, count, PEOPLE_CHUNK)):
+            seed = random.Random(f'{self.seed}:{kind}:{index}').getrandbits(32)
+            tasks.append((seed, kind, min(PEOPLE_CHUNK, count - start), with_texts))
+
+        if self.workers > 0 and len(tasks) > 1:
+            with Pool(self.workers) as pool:
+                chunks = pool.map(fake_people, tasks)
+        else:
+            chunks = map(fake_people, tasks)
+        return [person for chunk in chunks for person in chunk]
+
+    def bulk_create(self, model, objs, key=None):
+        """bulk_create пакетами; если база не вернула pk (MySQL) — дочитываем их по key"""
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        if key and objs and objs[0].pk is None:
+            pks = dict(
+                model.objects.filter(
+                    **{f'{key}__in': [getattr(obj, key) for obj in objs]}
+                ).values_list(key, 'pk')
+            )
+            for obj in objs:
+                obj.pk = pks[getattr(obj, key)]
+        return objs
+
+    def create_users(self, prefix, people, role):
+        start = User.objects.filter(username__startswith=f'{prefix}_').count()
+        users = [
+            User(
+                username=f'{prefix}_{start + i + 1}',
+                first_name=person['first_name'],
+                last_name=person['last_name'],
+                role=role,
+                password=self.password
+            )
+            for i, person in enumerate(people)
+        ]
+        return self.bulk_create(User, users, key='username')
+
     def clear_data(self):
         """Очистка существующих данных"""
+        # Оценки и сводка удаляются одним DELETE: сигналы на миллион строк не нужны
+        with connection.cursor() as cursor:
+            for model in [Grade, StudentMonthlyStats]:
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+                count = cursor.rowcount
+                if count > 0:
+                    self.stdout.write(f'   Удалено {count} записей из {model.__name__}')
+
         models_to_clear = [
-            Grade, GraduateAchievement, Graduate, Schedule, 
-            Student, Teacher, Administrator, Subject, Day, 
+            GraduateAchievement, Graduate, Schedule,
+            Student, Teacher, Administrator, Subject, Day,
             Group, Course
         ]
-        
+
         for model in models_to_clear:
             count = model.objects.count()
             if count > 0:
                 model.objects.all().delete()
                 self.stdout.write(f'   Удалено {count} записей из {model.__name__}')
-        
+
         # Удаление пользователей (кроме суперпользователей)
         users_count = User.objects.filter(is_superuser=False).count()
         if users_count > 0:
             User.objects.filter(is_superuser=False).delete()
             self.stdout.write(f'   Удалено {users_count} пользователей')
 
-    def create_base_data(self):
-        """Создание базовых данных: курсы, группы, дни недели, предметы"""
-        
-        # Курсы
-        courses_data = [
-            'Основы Ислама',
-            'Коран и Хадисы', 
-            'Арабский язык',
-            'Исламская история',
-            'Фикх (Исламское право)'
-        ]
-        
-        courses = []
-        for course_name in courses_data:
-            course, created = Course.objects.get_or_create(title=course_name)
-            courses.append(course)
-            if created:
-                self.stdout.write(f'   Создан курс: {course_name}')
-
-        # Группы
-        group_names = [
-            'Начинающие-1', 'Начинающие-2', 'Начинающие-3',
-            'Средний-1', 'Средний-2', 'Средний-3',
-            'Продвинутый-1', 'Продвинутый-2',
-            'Выпускной-1', 'Выпускной-2'
-        ]
-        
-        groups = []
-        for i, group_name in enumerate(group_names):
-            course = courses[i % len(courses)]
-            group, created = Group.objects.get_or_create(
-                title=group_name,
-                defaults={'course': course}
-            )
-            groups.append(group)
-            if created:
-                self.stdout.write(f'   Создана группа: {group_name}')
+    def create_base_data(self, schools, groups_per_school):
+        """Создание базовых данных: дни недели, предметы, курсы и группы каждой школы"""
 
-        # Дни недели
-        days_data = [
-            'Понедельник', 'Вторник', 'Среда', 'Четверг', 
-            'Пятница', 'Суббота', 'Воскресенье'
-        ]
-        
-        for day_name in days_data:
-            day, created = Day.objects.get_or_create(title=day_name)
+        for order, day_name in enumerate(DAYS):
+            day, created = Day.objects.get_or_create(title=day_name, defaults={'order': order})
             if created:
                 self.stdout.write(f'   Создан день: {day_name}')
 
-        # Предметы
-        subjects_data = [
-            'Чтение Корана', 'Заучивание Корана', 'Тафсир',
-            'Хадисы', 'Арабская грамматика', 'Арабская лексика',
-            'Исламская история', 'Фикх', 'Акыда (Вероучение)',
-            'Исламская этика', 'Дуа и Зикр'
-        ]
-        
-        for subject_name in subjects_data:
+        for subject_name in SUBJECTS:
             subject, created = Subject.objects.get_or_create(name=subject_name)
             if created:
                 self.stdout.write(f'   Создан предмет: {subject_name}')
 
-        return courses, groups
+        schools_data = []
+        for school in range(schools):
+            suffix = f' (школа {school + 1})' if school else ''
 
-    def create_teachers(self, count):
-        """Создание преподавателей"""
-        teachers = []
+            courses = []
+            for course_name in COURSES:
+                course, created = Course.objects.get_or_create(title=f'{course_name}{suffix}')
+                courses.append(course)
+
+            # Уровни идут по порядку: первая четверть групп — начинающие и т. д.
+            groups = []
+            for i in range(groups_per_school):
+                level = GROUP_LEVELS[i * len(GROUP_LEVELS) // groups_per_school]
+                number = sum(1 for group in groups if group.title.startswith(level)) + 1
+                group, created = Group.objects.get_or_create(
+                    title=f'{level}-{number}{suffix}',
+                    defaults={'course': courses[i % len(courses)]}
+                )
+                groups.append(group)
+
+            schools_data.append({
+                'courses': courses,
+                'groups': groups,
+                'teachers': [],
+                'members': {group.id: [] for group in groups},
+            })
+            self.stdout.write(f'   Школа {school + 1}: {len(courses)} курсов, {len(groups)} групп')
+
+        return schools_data
+
+    def create_teachers(self, schools_data, people, per_school):
+        """Создание преподавателей; у каждой группы школы есть хотя бы один преподаватель"""
         subjects = list(Subject.objects.all())
-        groups = list(Group.objects.all())
-        
-        for i in range(count):
-            # Создание пользователя
-            username = f'teacher_{i+1}'
-            first_name = fake.first_name_male()
-            last_name = fake.last_name_male()
-            
-            user = User.objects.create_user(
-                username=username,
-                first_name=first_name,
-                last_name=last_name,
-                role='teacher'
-            )
-            
-            # Создание преподавателя
-            teacher = Teacher.objects.create(
-                user=user,
-                name=f'{first_name} {last_name}',
-                phone=fake.phone_number()[:12]
-            )
-            
-            # Назначение предметов (1-3 предмета)
-            teacher_subjects = random.sample(subjects, random.randint(1, 3))
-            teacher.subjects.set(teacher_subjects)
-            
-            # Назначение групп (1-2 группы)
-            teacher_groups = random.sample(groups, random.randint(1, 2))
-            teacher.group.set(teacher_groups)
-            
-            teachers.append(teacher)
-            
-            if (i + 1) % 5 == 0:
-                self.stdout.write(f'   Создано {i + 1} преподавателей...')
-        
-        return teachers
-
-    def create_students(self, count):
-        """Создание студентов"""
+        users = self.create_users('teacher', people, 'teacher')
+
+        teachers = []
+        for user, person in zip(users, people):
+            teachers.append(Teacher(
+                user_id=user.pk,
+                name=f'{person["first_name"]} {person["last_name"]}',
+                phone=person['phone']
+            ))
+        self.bulk_create(Teacher, teachers, key='user_id')
+
+        subject_links = []
+        group_links = []
+        for school, school_data in enumerate(schools_data):
+            school_teachers = teachers[school * per_school:(school + 1) * per_school]
+            groups = school_data['groups']
+            teacher_groups = {teacher.pk: set() for teacher in school_teachers}
+            if school_teachers:
+                for i, group in enumerate(groups):
+                    teacher_groups[school_teachers[i % len(school_teachers)].pk].add(group)
+
+            for teacher in school_teachers:
+                # Назначение предметов (1-3) и групп (1-2 плюс обязательные)
+                teacher.subject_ids = [
+                    subject.id for subject in self.rng.sample(subjects, self.rng.randint(1, 3))
+                ]
+                teacher_groups[teacher.pk].update(
+                    self.rng.sample(groups, min(len(groups), self.rng.randint(1, 2)))
+                )
+                teacher.group_ids = sorted(group.id for group in teacher_groups[teacher.pk])
+                subject_links += [
+                    Teacher.subjects.through(teacher_id=teacher.pk, subject_id=subject_id)
+                    for subject_id in teacher.subject_ids
+                ]
+                group_links += [
+                    Teacher.group.through(teacher_id=teacher.pk, group_id=group_id)
+                    for group_id in teacher.group_ids
+                ]
+            school_data['teachers'] = school_teachers
+
+        Teacher.subjects.through.objects.bulk_create(subject_links, batch_size=self.batch_size)
+        Teacher.group.through.objects.bulk_create(group_links, batch_size=self.batch_size)
+        self.stdout.write(f'   Создано {len(teachers)} преподавателей')
+
+    def create_students(self, schools_data, people, per_group):
+        """Создание студентов: каждый в своей группе, часть — ещё в одной группе школы"""
+        users = self.create_users('student', people, 'student')
+
         students = []
-        courses = list(Course.objects.all())
-        groups = list(Group.objects.all())
-        
-        for i in range(count):
-            # Создание пользователя
-            username = f'student_{i+1}'
-            first_name = fake.first_name()
-            last_name = fake.last_name()
-            
-            user = User.objects.create_user(
-                username=username,
-                first_name=first_name,
-                last_name=last_name,
-                role='student'
-            )
-            
-            # Создание студента
-            student = Student.objects.create(
-                user=user,
-                name=f'{first_name} {last_name}',
-                phone=fake.phone_number()[:12],
-                to_pay=random.randint(5000, 25000),
-                status=random.choice([True, False]),
-                student_status=random.choice(['active', 'active', 'active', 'inactive']),  # Больше активных
-                course=random.choice(courses)
-            )
-            
-            # Назначение групп (1-2 группы)
-            student_groups = random.sample(groups, random.randint(1, 2))
-            student.group.set(student_groups)
-            
-            students.append(student)
-            
-            if (i + 1) % 10 == 0:
-                self.stdout.write(f'   Создано {i + 1} студентов...')
-        
-        return students
-
-    def create_schedule(self, teachers):
-        """Создание расписания"""
-        days = list(Day.objects.all()[:6])  # Понедельник-Суббота
+        placement = []
+        person_index = 0
+        for school_data in schools_data:
+            for group in school_data['groups']:
+                for _ in range(per_group):
+                    user, person = users[person_index], people[person_index]
+                    person_index += 1
+                    students.append(Student(
+                        user_id=user.pk,
+                        name=f'{person["first_name"]} {person["last_name"]}',
+                        phone=person['phone'],
+                        to_pay=self.rng.randint(5000, 25000),
+                        status=self.rng.choice([True, False]),
+                        student_status=self.rng.choice(['active', 'active', 'active', 'inactive']),  # Больше активных
+                        course=group.course
+                    ))
+                    placement.append((school_data, group))
+        self.bulk_create(Student, students, key='user_id')
+
+        links = []
+        for student, (school_data, group) in zip(students, placement):
+            student_groups = [group]
+            if len(school_data['groups']) > 1 and self.rng.random() < 0.1:
+                extra = self.rng.choice(school_data['groups'])
+                if extra != group:
+                    student_groups.append(extra)
+            for student_group in student_groups:
+                links.append(Student.group.through(student_id=student.pk, group_id=student_group.id))
+                school_data['members'][student_group.id].append(student.pk)
+
+        Student.group.through.objects.bulk_create(links, batch_size=self.batch_size)
+        self.stdout.write(f'   Создано {len(students)} студентов')
+
+    def create_schedule(self, schools_data):
+        """Создание расписания; предметы и преподаватели берутся из закреплённых за группой"""
+        days = {day.title: day for day in Day.objects.all()}
+        weekdays = [days[title] for title in DAYS[:6] if title in days]  # Понедельник-Суббота
         subjects = list(Subject.objects.all())
-        groups = list(Group.objects.all())
-        
-        schedule_count = 0
-        
-        for group in groups:
-            # Для каждой группы создаем 3-5 занятий в неделю
-            lessons_per_week = random.randint(3, 5)
-            selected_days = random.sample(days, lessons_per_week)
-            
-            for day in selected_days:
-                subject = random.choice(subjects)
-                time_slot = random.randint(1, 6)  # 6 временных слотов в день
-                
-                # Проверяем, что расписание не дублируется
-                if not Schedule.objects.filter(
-                    group=group, day=day, time_slot=time_slot
-                ).exists():
-                    Schedule.objects.create(
+
+        schedules = []
+        lessons = []
+        for school_data in schools_data:
+            for group in school_data['groups']:
+                group_teachers = [
+                    teacher for teacher in school_data['teachers']
+                    if group.id in teacher.group_ids
+                ]
+                # Для каждой группы 3-5 занятий в неделю, не больше одного в день
+                lessons_per_week = min(len(weekdays), self.rng.randint(3, 5))
+                for day in self.rng.sample(weekdays, lessons_per_week):
+                    teacher = self.rng.choice(group_teachers) if group_teachers else None
+                    if teacher is not None:
+                        subject_id = self.rng.choice(teacher.subject_ids)
+                    else:
+                        subject_id = self.rng.choice(subjects).id
+                    schedules.append(Schedule(
                         group=group,
-                        subject=subject,
+                        subject_id=subject_id,
                         day=day,
-                        time_slot=time_slot
-                    )
-                    schedule_count += 1
-        
-        self.stdout.write(f'   Создано {schedule_count} записей расписания')
-
-    def create_grades(self, students, teachers):
-        """Создание оценок"""
-        subjects = list(Subject.objects.all())
+                        time_slot=self.rng.randint(1, 6)  # 6 временных слотов в день
+                    ))
+                    lessons.append({
+                        'weekday': DAYS.index(day.title),
+                        'subject_id': subject_id,
+                        'teacher_id': teacher.pk if teacher else None,
+                        'students': school_data['members'][group.id],
+                    })
+
+        Schedule.objects.bulk_create(schedules, batch_size=self.batch_size)
+        self.stdout.write(f'   Создано {len(schedules)} записей расписания')
+        return lessons
+
+    def create_grades(self, lessons, years):
+        """Оценки за каждое занятие расписания в пределах истории; пишутся пакетами"""
+        today = date.today()
+        start = today - timedelta(days=max(int(years * 365), 0))
+        by_weekday = {}
+        for lesson in lessons:
+            by_weekday.setdefault(lesson['weekday'], []).append(lesson)
+
+        rng = self.rng
+        batch = []
         grades_count = 0
-        
-        for student in students:
-            # Для каждого студента создаем 10-30 оценок за последние 3 месяца
-            num_grades = random.randint(10, 30)
-            
-            for _ in range(num_grades):
-                # Случайная дата за последние 90 дней
-                days_ago = random.randint(0, 90)
-                grade_date = date.today() - timedelta(days=days_ago)
-                
-                # Проверяем ограничение на дату (±2 дня от текущей даты для новых оценок)
-                # Но для тестовых данных создаем исторические оценки
-                
-                Grade.objects.create(
-                    student=student,
-                    mark=random.randint(2, 5),
-                    pages=random.randint(1, 10),
-                    subject=random.choice(subjects),
-                    teacher=random.choice(teachers),
-                    date=grade_date
-                )
-                grades_count += 1
-        
+        current = start
+        while current <= today:
+            for lesson in by_weekday.get(current.weekday(), []):
+                for student_id in lesson['students']:
+                    if rng.random() > ATTENDANCE:
+                        continue
+                    batch.append(Grade(
+                        student_id=student_id,
+                        mark=rng.choices(MARKS, MARK_WEIGHTS)[0],
+                        pages=rng.randint(1, 10),
+                        subject_id=lesson['subject_id'],
+                        teacher_id=lesson['teacher_id'],
+                        date=current
+                    ))
+            if len(batch) >= self.batch_size:
+                Grade.objects.bulk_create(batch, batch_size=self.batch_size)
+                grades_count += len(batch)
+                batch = []
+                self.stdout.write(f'   Создано {grades_count} оценок (по {current:%d.%m.%Y})...')
+            current += timedelta(days=1)
+
+        Grade.objects.bulk_create(batch, batch_size=self.batch_size)
+        grades_count += len(batch)
         self.stdout.write(f'   Создано {grades_count} оценок')
+        return grades_count
 
-    def create_graduates(self, count):
+    def create_graduates(self, schools_data, people, per_school):
         """Создание выпускников"""
-        # Создаем дополнительных студентов для выпускников
-        courses = list(Course.objects.all())
-        groups = list(Group.objects.all())
-        
-        for i in range(count):
-            # Создание пользователя
-            username = f'graduate_{i+1}'
-            first_name = fake.first_name()
-            last_name = fake.last_name()
-            
-            user = User.objects.create_user(
-                username=username,
-                first_name=first_name,
-                last_name=last_name,
-                role='student'
-            )
-            
-            # Создание студента-выпускника
-            student = Student.objects.create(
-                user=user,
-                name=f'{first_name} {last_name}',
-                phone=fake.phone_number()[:12],
+        users = self.create_users('graduate', people, 'student')
+        today = date.today()
+        first_day = date(2020, 1, 1)
+
+        students = []
+        graduates = []
+        links = []
+        for index, (user, person) in enumerate(zip(users, people)):
+            school_data = schools_data[index // per_school]
+            group = self.rng.choice(school_data['groups'])
+            students.append(Student(
+                user_id=user.pk,
+                name=f'{person["first_name"]} {person["last_name"]}',
+                phone=person['phone'],
                 to_pay=0,  # Выпускники обычно не должны
                 status=True,
                 student_status='graduated',
-                course=random.choice(courses)
-            )
-            
-            # Назначение группы
-            student.group.set([random.choice(groups)])
-            
-            # Создание записи выпускника
-            graduation_date = fake.date_between(
-                start_date=date(2020, 1, 1),
-                end_date=date.today()
+                course=self.rng.choice(school_data['courses'])
+            ))
+            links.append(group)
+        self.bulk_create(Student, students, key='user_id')
+        Student.group.through.objects.bulk_create([
+            Student.group.through(student_id=student.pk, group_id=group.id)
+            for student, group in zip(students, links)
+        ], batch_size=self.batch_size)
+
+        achievements = []
+        for index, (student, person) in enumerate(zip(students, people)):
+            school_data = schools_data[index // per_school]
+            texts = person['texts']
+            graduation_date = first_day + timedelta(
+                days=self.rng.randint(0, (today - first_day).days)
             )
-            
-            graduate = Graduate.objects.create(
+            graduate = Graduate(
                 student=student,
                 graduation_date=graduation_date,
-                graduation_group=random.choice(groups),
-                final_grade=round(random.uniform(3.0, 5.0), 1),
-                diploma_number=f'DIP-{graduation_date.year}-{i+1:03d}',
-                achievements=fake.text(max_nb_chars=200),
-                current_occupation=random.choice([
-                    'Имам мечети',
-                    'Преподаватель исламских наук',
-                    'Студент университета',
-                    'Переводчик арабского языка',
-                    'Исламский консультант',
-                    'Работает в исламском центре',
-                    'Продолжает обучение',
-                    'Частный преподаватель'
-                ]),
-                contact_phone=fake.phone_number()[:12],
-                contact_email=fake.email() if random.choice([True, False]) else '',
-                notes=fake.text(max_nb_chars=100) if random.choice([True, False]) else ''
+                graduation_group=self.rng.choice(school_data['groups']),
+                final_grade=round(self.rng.uniform(3.0, 5.0), 1),
+                diploma_number=f'DIP-{graduation_date.year}-{student.pk:06d}',
+                achievements=texts[0],
+                current_occupation=self.rng.choice(OCCUPATIONS),
+                contact_phone=person['phone'],
+                contact_email=person['email'] if self.rng.choice([True, False]) else '',
+                notes=texts[1][:100] if self.rng.choice([True, False]) else ''
             )
-            
+            graduates.append(graduate)
+
             # Создание достижений для некоторых выпускников
-            if random.choice([True, False]):
-                num_achievements = random.randint(1, 3)
-                for j in range(num_achievements):
-                    achievement_date = fake.date_between(
-                        start_date=graduation_date,
-                        end_date=date.today()
-                    )
-                    
-                    GraduateAchievement.objects.create(
+            if self.rng.choice([True, False]):
+                for j in range(self.rng.randint(1, 3)):
+                    achievements.append(GraduateAchievement(
                         graduate=graduate,
-                        title=random.choice([
-                            'Поступление в исламский университет',
-                            'Получение иджазы по Корану',
-                            'Назначение имамом мечети',
-                            'Завершение курса арабского языка',
-                            'Участие в международной конференции',
-                            'Публикация исламской статьи',
-                            'Организация исламского мероприятия'
-                        ]),
-                        description=fake.text(max_nb_chars=150),
-                        date_achieved=achievement_date,
-                        category=random.choice([
+                        title=self.rng.choice(ACHIEVEMENTS),
+                        description=texts[2 + j][:150],
+                        date_achieved=graduation_date + timedelta(
+                            days=self.rng.randint(0, (today - graduation_date).days)
+                        ),
+                        category=self.rng.choice([
                             'education', 'career', 'religious', 'social', 'other'
                         ])
-                    )
-            
-            if (i + 1) % 5 == 0:
-                self.stdout.write(f'   Создано {i + 1} выпускников...')
+                    ))
+
+        self.bulk_create(Graduate, graduates, key='student_id')
+        for achievement in achievements:
+            achievement.graduate_id = achievement.graduate.pk
+        GraduateAchievement.objects.bulk_create(achievements, batch_size=self.batch_size)
+        self.stdout.write(f'   Создано {len(graduates)} выпускников')
 
     def create_administrators(self):
         """Создание администраторов"""
@@ -405,21 +591,25 @@ class Command(BaseCommand):
             ('admin1', 'Администратор', 'Системный'),
             ('admin2', 'Заместитель', 'Директора'),
         ]
-        
+
         for username, first_name, last_name in admin_data:
-            user = User.objects.create_user(
+            if User.objects.filter(username=username).exists():
+                continue
+
+            user = User.objects.create(
                 username=username,
                 first_name=first_name,
                 last_name=last_name,
-                role='administrator'
+                role='administrator',
+                password=self.password
             )
-            
+
             Administrator.objects.create(
                 user=user,
                 name=f'{first_name} {last_name}',
-                phone=fake.phone_number()[:12]
+                phone=f'996{self.rng.randint(100000000, 999999999)}'
             )
-            
+
             self.stdout.write(f'   Создан администратор: {first_name} {last_name}')
 
     def create_superuser_if_not_exists(self):
@@ -431,4 +621,4 @@ class Command(BaseCommand):
                 first_name='Super',
                 last_name='Admin'
             )
-            self.stdout.write('   Создан суперпользователь: admin/admin123')
\ No newline at end of file
+            self.stdout.write('   Создан суперпользователь: admin/admin123')
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear, Round
+
+from apps.grade.models import Grade, StudentMonthlyStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводку оценок StudentMonthlyStats с нуля'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пакета для bulk_create (по умолчанию: 1000)'
+        )
+        parser.add_argument(
+            '--if-empty',
+            action='store_true',
+            help='Пересчитать, только если сводка пуста, а оценки есть (для запуска при деплое)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if options['if_empty'] and (StudentMonthlyStats.objects.exists() or not Grade.objects.exists()):
+            self.stdout.write('✅ Сводка оценок уже заполнена — пересчёт не нужен')
+            return
+
+        rows = Grade.objects.filter(
+            student__isnull=False
+        ).annotate(
+            year=ExtractYear('date'),
+            month=ExtractMonth('date')
+        ).values(
+            'student_id', 'subject_id', 'year', 'month'
+        ).annotate(
+            grade_count=Count('id'),
+            sum_marks=Sum('mark'),
+            sum_pages=Coalesce(Sum('pages'), 0.0),
+            weighted_score=Coalesce(Sum(F('mark') * F('pages')), 0.0),
+            average=Round(Sum('mark') / Count('id'), 2)
+        ).order_by()
+
+        with transaction.atomic():
+            self.stdout.write('🗑️  Очистка старой сводки...')
+            StudentMonthlyStats.objects.all().delete()
+
+            self.stdout.write('📊 Пересчёт сводки оценок...')
+            created = 0
+            batch = []
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(StudentMonthlyStats(**row))
+                if len(batch) >= batch_size:
+                    StudentMonthlyStats.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                StudentMonthlyStats.objects.bulk_create(batch)
+                created += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Сводка пересчитана: {created} записей')
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apps.dashboard.search import KIND_TITLES, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковые документы студентов, преподавателей и выпускников'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Записей за один проход (по умолчанию: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        counts = rebuild(batch_size=options['batch_size'])
+        for kind, count in counts.items():
+            self.stdout.write(f'   {KIND_TITLES[kind]}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'✅ Поисковый индекс пересобран: {sum(counts.values())}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from apps.dashboard.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики студентов групп, курсов и итоги школы с таблицами и исправляет расхождения'
+
+    def handle(self, *args, **options):
+        drift = reconcile()
+
+        labels = {'totals': 'Итоги школы', 'groups': 'Группы', 'courses': 'Курсы'}
+        fixed = 0
+        for kind, label in labels.items():
+            for key, (stored, actual) in sorted(drift[kind].items(), key=lambda item: str(item[0])):
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'   {label} / {key}: {stored} → {actual}')
+                fixed += 1
+
+        if fixed:
+            self.stdout.write(self.style.WARNING(f'⚠️  Исправлено счётчиков: {fixed} (подробно: -v 2)'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Счётчики совпадают с данными'))
@@ -0,0 +1,142 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from apps.dashboard.queries import N_PLUS_ONE_THRESHOLD, QueryTracker
+from apps.dashboard.timing import RequestTiming, current, track
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryInspectorMiddleware:
+    """Находит N+1 на страницах: повторяющиеся формы SQL пишутся в лог
+
+    Для разработки и тестов; включается настройкой QUERY_INSPECTOR=True.
+    Число запросов отдаётся заголовком X-Query-Count.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryTracker() as tracker:
+            response = self.get_response(request)
+
+        repeated = tracker.repeated(N_PLUS_ONE_THRESHOLD)
+        if repeated:
+            logger.warning(
+                'N+1 на %s: %d запросов, повторы:\n%s',
+                request.path, tracker.count, tracker.report(N_PLUS_ONE_THRESHOLD)
+            )
+        response['X-Query-Count'] = str(tracker.count)
+        return response
+
+
+class ServerTimingMiddleware:
+    """Время запроса по частям: SQL, представление, шаблоны
+
+    Для каждого запроса пишет строку в журнал (поля также в extra) и при
+    SERVER_TIMING=True добавляет заголовок Server-Timing, который видно во
+    вкладке Network браузера. Если SLOW_REQUEST_MS > 0, запросы дольше
+    порога попадают в журнал вместе со своим SQL. Время «view» — код
+    представления без SQL и шаблонов; потоковые ответы учитываются до
+    начала отдачи.
+
+    Под ASGI работает в цикле событий, не переводя каждый запрос в поток.
+    SQL представлений там выполняется в потоке sync_to_async со своими
+    соединениями и в db не попадает — поэтому обычные страницы обслуживает
+    WSGI, а ASGI только поток событий (см. docker-compose.yml).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timing = RequestTiming(record_sql=getattr(settings, 'SLOW_REQUEST_MS', 0) > 0)
+        started = time.perf_counter()
+        with track(timing), self.wrap_connections(timing):
+            response = self.get_response(request)
+        return self.finish(request, response, timing, started)
+
+    async def __acall__(self, request):
+        timing = RequestTiming(record_sql=getattr(settings, 'SLOW_REQUEST_MS', 0) > 0)
+        started = time.perf_counter()
+        with track(timing), self.wrap_connections(timing):
+            response = await self.get_response(request)
+        return self.finish(request, response, timing, started)
+
+    @staticmethod
+    def wrap_connections(timing):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timing))
+        return stack
+
+    def finish(self, request, response, timing, started):
+        """Записать замеры запроса в журнал и заголовок Server-Timing"""
+        slow_ms = getattr(settings, 'SLOW_REQUEST_MS', 0)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        view_ms = 0.0
+        view_started = getattr(request, '_timing_view_started', None)
+        if view_started is not None:
+            db_before, template_before = request._timing_view_offsets
+            view_ms = max(
+                (time.perf_counter() - view_started) * 1000
+                - (timing.db_ms - db_before)
+                - (timing.template_ms - template_before),
+                0.0
+            )
+
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': timing.queries,
+            'db_ms': round(timing.db_ms, 2),
+            'view_ms': round(view_ms, 2),
+            'template_ms': round(timing.template_ms, 2),
+            'total_ms': round(total_ms, 2),
+        }
+        logger.info(' '.join(f'{key}={value}' for key, value in fields.items()), extra=fields)
+
+        if slow_ms and total_ms >= slow_ms:
+            statements = '\n'.join(
+                f'  {elapsed:.2f} мс: {sql}' for elapsed, sql in timing.statements
+            )
+            logger.warning(
+                'Медленный запрос %s %s: %.0f мс, SQL (%d):\n%s',
+                request.method, request.path, total_ms, timing.queries, statements,
+                extra={**fields, 'sql': [sql for _, sql in timing.statements]}
+            )
+
+        if getattr(settings, 'SERVER_TIMING', False):
+            metrics = ', '.join([
+                f'db;dur={timing.db_ms:.2f};desc="{timing.queries} queries"',
+                f'view;dur={view_ms:.2f}',
+                f'tpl;dur={timing.template_ms:.2f}',
+                f'total;dur={total_ms:.2f}',
+            ])
+            if response.has_header('Server-Timing'):
+                metrics = f'{response["Server-Timing"]}, {metrics}'
+            response['Server-Timing'] = metrics
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = current()
+        if timing is not None:
+            request._timing_view_started = time.perf_counter()
+            request._timing_view_offsets = (timing.db_ms, timing.template_ms)
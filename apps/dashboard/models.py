@@ -5,6 +5,8 @@ class Course(models.Model):
     """Курс"""
 
     title = models.CharField(max_length=140, null=True)
+    # Поддерживается сигналами (apps.dashboard.counters), чинится командой reconcile_counters
+    active_students_count = models.IntegerField(default=0, editable=False, verbose_name='Активных студентов')
 
     class Meta:
         verbose_name = 'Курс'
@@ -12,3 +14,69 @@ class Course(models.Model):
 
     def __str__(self):
         return self.title
+
+
+
+class Counter(models.Model):
+    """Общий счётчик школы: студенты, преподаватели, группы, выпускники, сумма к оплате
+
+    Поддерживается сигналами (apps.dashboard.counters), чтобы дашборд не
+    считал строки на каждый запрос; расхождения чинит команда
+    reconcile_counters.
+    """
+
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Счётчик'
+        verbose_name_plural = 'Счётчики'
+
+    def __str__(self):
+        return f'{self.name} = {self.value}'
+
+
+class SearchDocument(models.Model):
+    """Текст для поиска по студенту, преподавателю или выпускнику
+
+    document — имя, телефон, логин и т.п., приведённые к латинице
+    (apps.dashboard.search.fold). На PostgreSQL по нему строится
+    GIN-индекс pg_trgm, на остальных базах ищется по SearchToken.
+    Поддерживается сигналами, пересобирается командой rebuild_search_index.
+    """
+
+    kind = models.CharField(max_length=20)
+    object_id = models.IntegerField()
+    document = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'Поисковый документ'
+        verbose_name_plural = 'Поисковые документы'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind}:{self.object_id}'
+
+
+class SearchToken(models.Model):
+    """Слово поискового документа для баз без pg_trgm
+
+    Поиск по префиксу слова идёт диапазоном по индексу token; у числовых
+    слов (телефоны) хранятся и все окончания, чтобы находилась любая
+    часть номера.
+    """
+
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name='tokens')
+    token = models.CharField(max_length=64)
+
+    class Meta:
+        verbose_name = 'Поисковое слово'
+        verbose_name_plural = 'Поисковые слова'
+        indexes = [
+            models.Index(fields=['token', 'document'], name='search_token_idx'),
+        ]
+
+    def __str__(self):
+        return self.token
@@ -0,0 +1,176 @@
+"""Постраничный вывод по ключу (keyset) для растущих списков
+
+Страница выбирается не через OFFSET, а условием «после последней строки
+предыдущей страницы» по колонкам сортировки: WHERE (name, id) > (...).
+Цена страницы не растёт с её номером, а курсор не «съезжает», когда в
+начало списка добавляются строки. Курсор — подписанные значения колонок
+сортировки первой или последней строки; испорченный или чужой курсор
+(другая сортировка) просто открывает первую страницу. Фильтры и поиск
+живут в тех же GET-параметрах и переносятся в ссылки страниц.
+
+Общее число строк считается приблизительно (approximate_count): на
+PostgreSQL для таблицы без фильтров — оценка планировщика, иначе счёт
+с LIMIT, который останавливается на COUNT_LIMIT.
+"""
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+
+
+# Строк на странице по умолчанию
+PER_PAGE = 30
+
+# Дальше этого числа строки не досчитываются: показывается «1000+»
+COUNT_LIMIT = 1000
+
+CURSOR_PARAM = 'cursor'
+
+_SALT = 'apps.dashboard.pagination'
+
+
+def _column(ordering):
+    """'-name' → ('name', True)"""
+    return ordering.lstrip('-'), ordering.startswith('-')
+
+
+def _after(ordering, values):
+    """Условие «строго после строки со значениями values» при сортировке ordering"""
+    condition = Q()
+    equal = {}
+    for order, value in zip(ordering, values):
+        name, descending = _column(order)
+        condition |= Q(**equal, **{f'{name}__{"lt" if descending else "gt"}': value})
+        equal[name] = value
+    return condition
+
+
+def _reverse(ordering):
+    return [order[1:] if order.startswith('-') else f'-{order}' for order in ordering]
+
+
+def _json_value(value):
+    """Значение колонки для курсора; даты — строкой ISO (Django разберёт её в фильтре)"""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def approximate_count(queryset, limit=COUNT_LIMIT):
+    """(число, точно ли): полный COUNT(*) по большой таблице не выполняется"""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] > limit:
+            return row[0], False
+    count = queryset.order_by()[:limit + 1].count()
+    return min(count, limit), count <= limit
+
+
+class KeysetPage:
+    """Страница списка: строки, курсоры соседних страниц и итог
+
+    Перебирается как список строк; next_url/previous_url — строки запроса
+    с прежними фильтрами и новым курсором.
+    """
+
+    def __init__(self, object_list, params, has_next, has_previous, next_cursor, previous_cursor, total):
+        self.object_list = object_list
+        self.params = params
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total, self.total_exact = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def total_display(self):
+        if self.total_exact:
+            return str(self.total)
+        if self.total > COUNT_LIMIT:
+            return f'≈{self.total}'
+        return f'{self.total}+'
+
+    def _url(self, cursor):
+        params = self.params.copy()
+        params.pop(CURSOR_PARAM, None)
+        if cursor is not None:
+            params[CURSOR_PARAM] = cursor
+        return f'?{params.urlencode()}'
+
+    @property
+    def next_url(self):
+        return self._url(self.next_cursor)
+
+    @property
+    def previous_url(self):
+        return self._url(self.previous_cursor)
+
+    @property
+    def first_url(self):
+        return self._url(None)
+
+
+def keyset_page(request, queryset, ordering=('-id',), per_page=PER_PAGE):
+    """Страница queryset по курсору из request.GET
+
+    ordering — колонки сортировки; последней должна идти уникальная
+    (обычно id), иначе строки с равными значениями могут потеряться
+    на границе страниц.
+    """
+    ordering = list(ordering)
+    total = approximate_count(queryset)
+
+    direction, values = 'next', None
+    cursor = request.GET.get(CURSOR_PARAM)
+    if cursor:
+        try:
+            data = signing.loads(cursor, salt=_SALT)
+            if data['ordering'] == ordering and len(data['values']) == len(ordering):
+                direction, values = data['direction'], data['values']
+        except (signing.BadSignature, KeyError, TypeError):
+            pass
+
+    def make_cursor(obj, to):
+        values = [_json_value(getattr(obj, _column(order)[0])) for order in ordering]
+        return signing.dumps({'ordering': ordering, 'values': values, 'direction': to}, salt=_SALT)
+
+    if direction == 'previous':
+        rows = list(queryset.filter(_after(_reverse(ordering), values)).order_by(*_reverse(ordering))[:per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if values is not None:
+            queryset = queryset.filter(_after(ordering, values))
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = values is not None
+
+    return KeysetPage(
+        rows,
+        request.GET,
+        has_next=has_next and bool(rows),
+        has_previous=has_previous and bool(rows),
+        next_cursor=make_cursor(rows[-1], 'next') if rows else None,
+        previous_cursor=make_cursor(rows[0], 'previous') if rows else None,
+        total=total,
+    )
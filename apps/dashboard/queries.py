@@ -0,0 +1,94 @@
+"""Поиск N+1 запросов и бюджеты числа запросов на страницу
+
+QueryTracker записывает SQL, выполненный внутри блока with, и группирует
+его по «отпечатку» — тексту запроса без конкретных значений. Одинаковый
+отпечаток, повторённый много раз за один запрос к странице, — признак
+N+1 (запрос на каждую строку списка). QUERY_BUDGETS задаёт максимум
+запросов для страниц бенчмарка; тесты проверяют его на растущих данных.
+"""
+import re
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Сколько одинаковых запросов за одну страницу уже считается N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+# Максимум SQL-запросов на страницу (названия — из apps.dashboard.benchmark.CASES).
+# Бюджет не должен зависеть от объёма данных: если число запросов растёт
+# вместе с числом строк, тест упадёт. Считается с общим кешем, когда профиль
+# пользователя берётся из сессии; с LocMemCache добавляются 1–2 запроса профиля
+QUERY_BUDGETS = {
+    'grade:list[admin]': 6,
+    'grade:list[teacher]': 7,
+    'grade:group_journal': 6,
+    'grade:diary': 7,
+    'schedule:list[admin]': 4,
+    'schedule:list[teacher]': 4,
+    'schedule:list[student]': 4,
+    'group:list': 7,
+    'group:details': 11,
+    'student:list': 8,
+    'teacher:list': 9,
+    'student:total_rating_list': 3,
+    'student:choose_course_rating': 5,
+    'student:rating_by_course': 4,
+    'dashboard:dashboard': 5,
+    'api:diary': 10,
+}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'(?:%s|\?)(?:\s*,\s*(?:%s|\?))+')
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Форма запроса: строки, числа и списки параметров заменены на ?"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _PLACEHOLDER_LIST.sub('?, ...', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class QueryTracker:
+    """Контекстный менеджер: все запросы к базе внутри блока
+
+    >>> with QueryTracker() as tracker:
+    ...     client.get(url)
+    >>> tracker.count, tracker.repeated()
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.connection = connections[using]
+        self.queries = []
+
+    def __enter__(self):
+        self.queries = []
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """[(отпечаток, сколько раз)] для форм, повторённых threshold раз и больше"""
+        counts = Counter(fingerprint(sql) for sql in self.queries)
+        return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+    def report(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Текстовый отчёт о повторах для сообщений тестов и логов"""
+        return '\n'.join(
+            f'  {count} × {shape[:300]}' for shape, count in self.repeated(threshold)
+        )
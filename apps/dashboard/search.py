@@ -0,0 +1,271 @@
+"""Поиск студентов, преподавателей и выпускников
+
+Для каждой записи хранится SearchDocument: имя, телефон, логин и т.п.,
+приведённые к латинице (fold), поэтому «Жамшид», «Jamshid» и «Zhamshid»
+находят одно и то же. На PostgreSQL документ ищется по GIN-индексу pg_trgm
+и ранжируется по word_similarity — находятся и слова с опечатками. На
+SQLite/MySQL ищется по таблице слов SearchToken: каждое слово запроса
+должно быть началом слова документа, выше — записи с целыми совпадениями.
+
+Документы обновляются сигналами (apps.dashboard.signals); bulk_create
+сигналов не вызывает, поэтому после массовой загрузки нужна команда
+rebuild_search_index.
+"""
+import re
+import unicodedata
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, F, FloatField, Func, Lookup, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast, Coalesce
+
+from apps.graduate.models import Graduate
+from apps.student.models import Student
+from apps.teacher.models import Teacher
+from .models import SearchDocument, SearchToken
+
+
+# Кириллица → латиница; казахские, киргизские и узбекские буквы — к ближайшим
+_CYRILLIC = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'j', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': '',
+    'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    'ә': 'a', 'ғ': 'g', 'қ': 'k', 'ң': 'n', 'ө': 'o', 'ұ': 'u', 'ү': 'u',
+    'һ': 'h', 'ҳ': 'h', 'ў': 'u', 'і': 'i',
+}
+_TRANSLITERATION = str.maketrans(_CYRILLIC)
+
+# Разные латинские записи одного звука сводятся к одной (после транслитерации)
+_LATIN_VARIANTS = [
+    ('dzh', 'j'), ('dj', 'j'), ('zh', 'j'), ('kh', 'h'), ('x', 'h'),
+    ('q', 'k'), ('w', 'v'), ('iy', 'i'), ('yi', 'i'),
+]
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+# Самое короткое окончание числа, которое попадает в SearchToken
+MIN_DIGITS_SUFFIX = 3
+
+TOKEN_MAX_LENGTH = SearchToken._meta.get_field('token').max_length
+
+# Сколько записей каждого вида показывает общий поиск в шапке
+GLOBAL_SEARCH_LIMIT = 10
+
+
+def fold(text):
+    """Текст в латинице нижнего регистра без диакритики"""
+    text = unicodedata.normalize('NFKD', str(text or '').lower().translate(_TRANSLITERATION))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    for variant, replacement in _LATIN_VARIANTS:
+        text = text.replace(variant, replacement)
+    return text
+
+
+def tokenize(text):
+    """Слова текста после fold"""
+    return _WORD.findall(fold(text))
+
+
+def index_tokens(words):
+    """Слова для SearchToken: числа вместе со всеми окончаниями"""
+    tokens = set()
+    for word in words:
+        word = word[:TOKEN_MAX_LENGTH]
+        tokens.add(word)
+        if word.isdigit():
+            tokens.update(word[start:] for start in range(1, len(word) - MIN_DIGITS_SUFFIX + 1))
+    return tokens
+
+
+def _student_fields(student):
+    return [student.name, student.phone, student.user.username if student.user else '']
+
+
+def _teacher_fields(teacher):
+    return [teacher.name, teacher.phone, teacher.user.username if teacher.user else '']
+
+
+def _graduate_fields(graduate):
+    user = graduate.student.user
+    names = [user.first_name, user.last_name] if user else []
+    return [graduate.student.name, *names, graduate.diploma_number]
+
+
+# вид → (модель, select_related, поля документа)
+KINDS = {
+    'student': (Student, ['user'], _student_fields),
+    'teacher': (Teacher, ['user'], _teacher_fields),
+    'graduate': (Graduate, ['student__user'], _graduate_fields),
+}
+
+KIND_TITLES = {
+    'student': 'Студенты',
+    'teacher': 'Преподаватели',
+    'graduate': 'Выпускники',
+}
+
+_KIND_BY_MODEL = {model: kind for kind, (model, _, _) in KINDS.items()}
+
+
+def kind_of(model):
+    return _KIND_BY_MODEL[model]
+
+
+def uses_trigrams(using=DEFAULT_DB_ALIAS):
+    return connections[using].vendor == 'postgresql'
+
+
+class TrigramWordSimilar(Lookup):
+    """document %> запрос: запрос похож на часть документа (pg_trgm, по GIN-индексу)"""
+
+    lookup_name = 'trigram_word_similar'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} %%> {rhs}', (*lhs_params, *rhs_params)
+
+
+SearchDocument._meta.get_field('document').register_lookup(TrigramWordSimilar)
+
+
+def ensure_trigram_index(using=DEFAULT_DB_ALIAS):
+    """Расширение pg_trgm и GIN-индекс по документам (только PostgreSQL)
+
+    Миграций в проекте нет, поэтому индекс создаётся после migrate
+    (сигнал post_migrate) и командой rebuild_search_index.
+    """
+    if not uses_trigrams(using):
+        return
+    table = SearchDocument._meta.db_table
+    with connections[using].cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_trgm ON {table} '
+            f'USING gin (document gin_trgm_ops)'
+        )
+
+
+def build_documents(kind, objects):
+    """Заменить документы объектов одного вида"""
+    _, _, fields = KINDS[kind]
+    objects = list(objects)
+    words = {obj.pk: tokenize(' '.join(str(value) for value in fields(obj) if value)) for obj in objects}
+
+    SearchDocument.objects.filter(kind=kind, object_id__in=words).delete()
+    SearchDocument.objects.bulk_create([
+        SearchDocument(kind=kind, object_id=pk, document=' '.join(object_words))
+        for pk, object_words in words.items()
+    ])
+    if uses_trigrams():
+        return
+
+    # bulk_create на MySQL не возвращает id — читаем их отдельно
+    ids = SearchDocument.objects.filter(kind=kind, object_id__in=words).values_list('object_id', 'id')
+    SearchToken.objects.bulk_create([
+        SearchToken(document_id=document_id, token=token)
+        for object_id, document_id in ids
+        for token in index_tokens(words[object_id])
+    ])
+
+
+def index_objects(kind, pks):
+    """Пересобрать документы объектов вида kind по их id"""
+    model, related, _ = KINDS[kind]
+    pks = [pk for pk in pks if pk is not None]
+    if pks:
+        build_documents(kind, model.objects.select_related(*related).filter(pk__in=pks))
+
+
+def remove_objects(kind, pks):
+    SearchDocument.objects.filter(kind=kind, object_id__in=pks).delete()
+
+
+def rebuild(batch_size=1000):
+    """Пересобрать все документы; возвращает {вид: число записей}"""
+    ensure_trigram_index()
+    counts = {}
+    with transaction.atomic():
+        SearchDocument.objects.all().delete()
+        for kind, (model, related, _) in KINDS.items():
+            objects = model.objects.select_related(*related).order_by('pk')
+            counts[kind] = 0
+            batch = []
+            for obj in objects.iterator(chunk_size=batch_size):
+                batch.append(obj)
+                if len(batch) >= batch_size:
+                    build_documents(kind, batch)
+                    counts[kind] += len(batch)
+                    batch = []
+            if batch:
+                build_documents(kind, batch)
+                counts[kind] += len(batch)
+    return counts
+
+
+def matching_documents(kind, query):
+    """Документы вида kind, подходящие под запрос, с релевантностью rank
+
+    None, если в запросе нет ни одного слова (поиск не задан).
+    """
+    words = tokenize(query)
+    if not words:
+        return None
+    documents = SearchDocument.objects.filter(kind=kind)
+
+    if uses_trigrams():
+        text = ' '.join(words)
+        return documents.filter(
+            Q(document__contains=text) | Q(document__trigram_word_similar=text)
+        ).annotate(
+            # word_similarity возвращает real; курсор пагинации хранит float8,
+            # и без приведения равные ранги на границе страницы не совпадут
+            rank=Cast(
+                Func(Value(text), F('document'), function='word_similarity', output_field=FloatField()),
+                FloatField()
+            )
+        )
+
+    for word in words:
+        # Диапазон вместо LIKE: префикс ищется по индексу на любой базе
+        documents = documents.filter(pk__in=SearchToken.objects.filter(
+            token__gte=word, token__lt=word + '{'
+        ).values('document_id'))
+    exact = SearchToken.objects.filter(
+        document=OuterRef('pk'), token__in=words
+    ).order_by().values('document').annotate(total=Count('*')).values('total')
+    return documents.annotate(rank=Coalesce(Subquery(exact), 0))
+
+
+def search(queryset, query):
+    """queryset, отфильтрованный поиском и упорядоченный по релевантности
+
+    Пустой запрос возвращает queryset без изменений.
+    """
+    kind = kind_of(queryset.model)
+    documents = matching_documents(kind, query)
+    if documents is None:
+        return queryset
+    rank = documents.filter(object_id=OuterRef('pk')).values('rank')[:1]
+    return queryset.filter(
+        pk__in=documents.values('object_id')
+    ).annotate(search_rank=Subquery(rank)).order_by('-search_rank', '-pk')
+
+
+def search_everywhere(query, limit=GLOBAL_SEARCH_LIMIT):
+    """Лучшие совпадения каждого вида для поиска в шапке
+
+    [{'kind', 'title', 'objects', 'has_more'}] — только виды с совпадениями.
+    """
+    results = []
+    for kind, (model, related, _) in KINDS.items():
+        found = list(search(model.objects.select_related(*related), query)[:limit + 1])
+        if found:
+            results.append({
+                'kind': kind,
+                'title': KIND_TITLES[kind],
+                'objects': found[:limit],
+                'has_more': len(found) > limit,
+            })
+    return results
@@ -0,0 +1,126 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.graduate.models import Graduate
+from apps.group.models import Group
+from apps.student.models import Student
+from apps.teacher.models import Teacher
+from apps.user.models import User
+from . import counters, search
+
+
+@receiver(pre_save, sender=Student)
+def student_pre_save(sender, instance, **kwargs):
+    """Запоминаем статус, курс и сумму до изменения"""
+    instance._counted = None
+    if instance.pk is not None:
+        instance._counted = Student.objects.filter(pk=instance.pk).values(
+            'student_status', 'course_id', 'to_pay'
+        ).first()
+
+
+@receiver(post_save, sender=Student)
+def student_post_save(sender, instance, **kwargs):
+    counters.student_saved(instance, getattr(instance, '_counted', None))
+
+
+@receiver(pre_delete, sender=Student)
+def student_pre_delete(sender, instance, **kwargs):
+    """Связи с группами удаляются без m2m_changed — запоминаем группы заранее"""
+    instance._counted_groups = []
+    if instance.student_status == counters.ACTIVE:
+        instance._counted_groups = counters.student_group_ids(instance.pk)
+
+
+@receiver(post_delete, sender=Student)
+def student_post_delete(sender, instance, **kwargs):
+    counters.student_deleted(instance, getattr(instance, '_counted_groups', []))
+
+
+@receiver(m2m_changed, sender=Student.group.through)
+def student_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Состав групп изменился: пересчитываем активных студентов этих групп
+
+    pk_set для remove содержит и id, которых не было в группе, поэтому
+    реально удаляемые связи выбираются до удаления (pre_remove/pre_clear).
+    """
+    through = Student.group.through
+    if action in ('pre_remove', 'pre_clear'):
+        links = through.objects.filter(**{'group_id' if reverse else 'student_id': instance.pk})
+        if pk_set is not None:
+            links = links.filter(**{'student_id__in' if reverse else 'group_id__in': pk_set})
+        instance._counted_links = list(links.values_list('student_id', 'group_id'))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if action == 'post_add':
+        links = [(student_id, instance.pk) for student_id in pk_set] if reverse else \
+            [(instance.pk, group_id) for group_id in pk_set]
+        sign = 1
+    else:
+        links = getattr(instance, '_counted_links', [])
+        sign = -1
+
+    if reverse:
+        active = counters.active_student_count({student_id for student_id, _ in links})
+        counters.membership_changed({instance.pk: sign * active})
+    elif instance.student_status == counters.ACTIVE:
+        counters.membership_changed({group_id: sign for _, group_id in links})
+
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=Graduate)
+def counted_created(sender, instance, created, **kwargs):
+    if created:
+        counters.add_totals(**{_TOTAL_NAMES[sender]: 1})
+
+
+@receiver(post_delete, sender=Teacher)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Graduate)
+def counted_deleted(sender, instance, **kwargs):
+    counters.add_totals(**{_TOTAL_NAMES[sender]: -1})
+
+
+_TOTAL_NAMES = {Teacher: 'teachers', Group: 'groups', Graduate: 'graduates'}
+
+
+# Поиск (apps.dashboard.search): документ пересобирается при изменении
+# записи или её пользователя; имя студента входит и в документ выпускника
+
+@receiver(post_save, sender=Student)
+def student_search_changed(sender, instance, **kwargs):
+    search.index_objects('student', [instance.pk])
+    search.index_objects('graduate', Graduate.objects.filter(student=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Teacher)
+def teacher_search_changed(sender, instance, **kwargs):
+    search.index_objects('teacher', [instance.pk])
+
+
+@receiver(post_save, sender=Graduate)
+def graduate_search_changed(sender, instance, **kwargs):
+    search.index_objects('graduate', [instance.pk])
+
+
+@receiver(post_save, sender=User)
+def user_search_changed(sender, instance, update_fields=None, **kwargs):
+    """Логин и имя пользователя входят в документы; вход (last_login) их не меняет"""
+    if update_fields is not None and not set(update_fields) & _USER_SEARCH_FIELDS:
+        return
+    search.index_objects('student', Student.objects.filter(user=instance).values_list('pk', flat=True))
+    search.index_objects('teacher', Teacher.objects.filter(user=instance).values_list('pk', flat=True))
+    search.index_objects('graduate', Graduate.objects.filter(student__user=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_delete, sender=Graduate)
+def search_object_deleted(sender, instance, **kwargs):
+    search.remove_objects(search.kind_of(sender), [instance.pk])
+
+
+_USER_SEARCH_FIELDS = {'username', 'first_name', 'last_name'}
@@ -1,3 +1,453 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import date
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import Client, TestCase, override_settings
+from django.urls import NoReverseMatch, reverse
+
+from apps.dashboard.backup import sorted_records
+from apps.dashboard.benchmark import BASELINE_PATH, CASES, compare, fixtures, run_cases
+from apps.dashboard.counters import reconcile, totals
+from apps.dashboard.models import Counter, Course, SearchDocument, SearchToken
+from apps.dashboard.pagination import PER_PAGE, approximate_count
+from apps.dashboard.queries import QUERY_BUDGETS, QueryTracker, fingerprint
+from apps.dashboard.search import fold, search, tokenize
+from apps.graduate.models import Graduate
+from apps.grade.models import Grade, GradeChange, StudentMonthlyStats
+from apps.grade.utils import grade_changes, latest_change_cursor
+from apps.group.models import Group
+from apps.schedule.models import Subject
+from apps.student.models import Student
+from apps.teacher.models import Code, Teacher, TeacherReport
+from apps.user.models import User
+
+
+class BackupCommandsTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='Тестовый курс')
+        self.group = Group.objects.create(title='Тестовая группа', course=self.course)
+        self.subject = Subject.objects.create(name='Чтение Корана')
+        self.teacher = Teacher.objects.create(name='Учитель')
+        self.teacher.subjects.add(self.subject)
+        self.student = Student.objects.create(name='Студент', course=self.course)
+        self.student.group.add(self.group)
+        Grade.objects.create(
+            student=self.student, teacher=self.teacher, subject=self.subject,
+            mark=5, pages=2, date=date.today()
+        )
+        self.code = Code.objects.create(value='1234')
+        self.directory = tempfile.mkdtemp()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def wipe(self):
+        for model in (Grade, GradeChange, Student, Teacher, Group, Subject, Course, Code):
+            model.objects.all().delete()
+
+    def test_export_import_roundtrip(self):
+        code_created_at = self.code.created_at
+        call_command('export_data', self.path('backup.jsonl.gz'), 'dashboard', 'group', 'schedule',
+                     'student', 'teacher', 'grade', stdout=StringIO())
+        self.wipe()
+
+        call_command('import_data', self.path('backup.jsonl.gz'), stdout=StringIO())
+
+        student = Student.objects.get()
+        self.assertEqual(list(student.group.values_list('title', flat=True)), ['Тестовая группа'])
+        self.assertEqual(list(Teacher.objects.get().subjects.all()), [self.subject])
+        self.assertEqual(Grade.objects.get().student, student)
+        self.assertEqual(Code.objects.get().created_at, code_created_at)
+        self.assertEqual(StudentMonthlyStats.objects.get().grade_count, 1)
+
+    def test_import_reads_dumpdata_json(self):
+        call_command('dumpdata', 'dashboard', 'group', 'schedule', 'student', 'teacher', 'grade',
+                     indent=4, output=self.path('backup.json'), stdout=StringIO())
+        with open(self.path('backup.json'), encoding='utf-8') as stream:
+            derived = (StudentMonthlyStats, GradeChange, Counter, SearchDocument, SearchToken)
+            expected = len(json.load(stream)) - sum(model.objects.count() for model in derived)
+        self.wipe()
+
+        output = StringIO()
+        call_command('import_data', self.path('backup.json'), '--clear', '--batch-size', '2', stdout=output)
+
+        self.assertIn(f'Восстановлено записей: {expected + 2}', output.getvalue())
+        self.assertEqual(Grade.objects.get().mark, 5)
+        self.assertTrue(self.student.group.filter(id=self.group.id).exists())
+        # Оценки загружены в обход журнала изменений: он начат заново
+        self.assertEqual(list(GradeChange.objects.values_list('action', flat=True)), [GradeChange.RESET])
+
+    def test_dumpdata_restores_into_migrated_database(self):
+        # Полная копия dumpdata: оценки раньше студентов, типы и права, уже созданные migrate
+        call_command('dumpdata', 'grade', 'contenttypes', 'auth', 'dashboard', 'group', 'schedule',
+                     'student', 'teacher', output=self.path('backup.json'), stdout=StringIO())
+        self.wipe()
+
+        call_command('import_data', self.path('backup.json'), stdout=StringIO())
+
+        self.assertEqual(Grade.objects.get().student.name, 'Студент')
+        self.assertEqual(StudentMonthlyStats.objects.get().grade_count, 1)
+
+    def test_sorted_records_put_dependencies_first(self):
+        records = [
+            {'model': 'grade.grade', 'pk': 1, 'fields': {}},
+            {'model': 'student.student', 'pk': 1, 'fields': {}},
+            {'model': 'dashboard.course', 'pk': 1, 'fields': {}},
+        ]
+        models = [record['model'] for record in sorted_records(iter(records))]
+        self.assertLess(models.index('dashboard.course'), models.index('student.student'))
+        self.assertLess(models.index('student.student'), models.index('grade.grade'))
+
+
+class PopulateDbTest(TestCase):
+    options = ['--groups', '4', '--students-per-group', '3', '--teachers', '2',
+               '--graduates', '2', '--years', '0.1', '--seed', '7']
+
+    def snapshot(self):
+        return (
+            list(Student.objects.order_by('user__username').values_list('user__username', 'name', 'student_status')),
+            list(Grade.objects.order_by('student__user__username', 'date', 'subject_id').values_list(
+                'student__user__username', 'date', 'mark', 'subject__name'
+            )),
+        )
+
+    def test_scale_and_seed(self):
+        call_command('populate_db', '--schools', '2', *self.options, stdout=StringIO())
+
+        self.assertEqual(Group.objects.count(), 8)
+        self.assertEqual(Student.objects.exclude(student_status='graduated').count(), 24)
+        self.assertEqual(Teacher.objects.count(), 4)
+        self.assertTrue(Grade.objects.exists())
+        self.assertEqual(
+            StudentMonthlyStats.objects.aggregate(total=Sum('grade_count'))['total'],
+            Grade.objects.count()
+        )
+        # Пароль хешируется один раз на всех
+        self.assertEqual(User.objects.filter(role='student').values('password').distinct().count(), 1)
+
+        first = self.snapshot()
+        GradeChange.record(Grade.objects.all()[:3], GradeChange.CREATED)
+        GradeChange.settle()
+        cursor = latest_change_cursor()
+        call_command('populate_db', '--clear', '--schools', '2', *self.options, stdout=StringIO())
+        self.assertEqual(self.snapshot(), first)
+        # Журнал изменений очищается вместе с оценками, остаётся отметка reset после старых записей
+        marker = GradeChange.objects.get()
+        self.assertEqual(marker.action, GradeChange.RESET)
+        self.assertGreater(marker.feed_id, cursor)
+        self.assertTrue(grade_changes(cursor)[3])
+
+
+class BenchmarkTest(TestCase):
+    def test_cases_render_and_compare(self):
+        call_command('populate_db', '--groups', '4', '--students-per-group', '3', '--teachers', '2',
+                     '--graduates', '1', '--years', '0.1', stdout=StringIO())
+
+        cases = run_cases(repeat=1)
+
+        for name, result in cases.items():
+            if 'skipped' not in result:
+                self.assertEqual(result['status'], 200, name)
+                self.assertGreater(result['bytes'], 0, name)
+
+        results = {'scales': {'small': {'cases': cases}}}
+        self.assertEqual(compare(results, results), [])
+
+        name = 'grade:list[admin]'
+        slower = json.loads(json.dumps(results))
+        slower['scales']['small']['cases'][name]['queries'] += 1
+        slower['scales']['small']['cases'][name]['p95_ms'] += 100
+        self.assertEqual(len(compare(slower, results)), 2)
+
+    def test_baseline_covers_every_case(self):
+        with open(BASELINE_PATH, encoding='utf-8') as stream:
+            baseline = json.load(stream)
+        self.assertEqual(set(baseline['scales']['small']['cases']), {case[0] for case in CASES})
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': tempfile.mkdtemp(),
+}})
+class QueryBudgetTest(TestCase):
+    def populate(self, students_per_group):
+        call_command('populate_db', '--groups', '4', '--students-per-group', str(students_per_group),
+                     '--teachers', '3', '--graduates', '1', '--years', '0.1', stdout=StringIO())
+
+    def assertWithinBudgets(self):
+        data = fixtures()
+        clients = {}
+        for role, user in data['users'].items():
+            clients[role] = Client()
+            clients[role].force_login(user)
+
+        for name, role, url_name, url_kwargs, params in CASES:
+            try:
+                url = reverse(url_name, kwargs=url_kwargs(data) if url_kwargs else None)
+            except NoReverseMatch:
+                continue
+            clients[role].get(url, params)  # прогрев кэша
+            with QueryTracker() as tracker:
+                response = clients[role].get(url, params)
+            self.assertEqual(response.status_code, 200, name)
+            self.assertLessEqual(
+                tracker.count, QUERY_BUDGETS[name],
+                f'{name}: {tracker.count} запросов при бюджете {QUERY_BUDGETS[name]}\n{tracker.report()}'
+            )
+            self.assertEqual(tracker.repeated(), [], f'{name}: N+1\n{tracker.report()}')
+
+    def test_budgets_hold_as_data_grows(self):
+        self.assertEqual(set(QUERY_BUDGETS), {case[0] for case in CASES})
+        self.populate(2)
+        self.assertWithinBudgets()
+        self.populate(6)
+        self.assertWithinBudgets()
+
+    def test_tracker_reports_repeated_shapes(self):
+        courses = [Course.objects.create(title=f'Курс {i}') for i in range(4)]
+        with QueryTracker() as tracker:
+            for course in courses:
+                Course.objects.get(id=course.id)
+            list(Course.objects.filter(id__in=[course.id for course in courses]))
+
+        self.assertEqual(tracker.count, 5)
+        ((shape, count),) = tracker.repeated()
+        self.assertEqual(count, 4)
+        self.assertIn('WHERE "dashboard_course"."id" = ?', shape)
+        self.assertEqual(
+            fingerprint("SELECT 1 FROM t WHERE a IN (%s, %s, %s) AND b = 'x'"),
+            fingerprint("SELECT 2 FROM t WHERE a IN (%s, %s) AND b = 'yy'")
+        )
+
+
+class ServerTimingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin', role='admin')
+        self.client.force_login(self.user)
+        Course.objects.create(title='Тестовый курс')
+
+    @override_settings(SERVER_TIMING=True)
+    def test_header_and_log_fields(self):
+        with self.assertLogs('apps.dashboard.middleware', level='INFO') as logs:
+            response = self.client.get(reverse('student:choose_course_rating'))
+
+        metrics = {
+            part.split(';')[0].strip(): part for part in response['Server-Timing'].split(',')
+        }
+        self.assertEqual(set(metrics), {'db', 'view', 'tpl', 'total'})
+        self.assertRegex(metrics['db'], r'db;dur=[\d.]+;desc="\d+ queries"')
+
+        record = logs.records[-1]
+        self.assertEqual(record.path, reverse('student:choose_course_rating'))
+        self.assertGreater(record.queries, 0)
+        self.assertGreater(record.template_ms, 0)
+        self.assertGreaterEqual(record.total_ms, record.db_ms + record.template_ms)
+
+    @override_settings(SERVER_TIMING=False, SLOW_REQUEST_MS=0)
+    def test_header_and_slow_log_are_opt_in(self):
+        with self.assertNoLogs('apps.dashboard.middleware', level='WARNING'):
+            response = self.client.get(reverse('student:choose_course_rating'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(SLOW_REQUEST_MS=0.001)
+    def test_slow_request_log_contains_sql(self):
+        with self.assertLogs('apps.dashboard.middleware', level='WARNING') as logs:
+            self.client.get(reverse('student:choose_course_rating'))
+
+        record = logs.records[-1]
+        self.assertIn('Медленный запрос', record.getMessage())
+        self.assertTrue(any('dashboard_course' in sql for sql in record.sql))
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='Хифз')
+        self.other_course = Course.objects.create(title='Таджвид')
+        self.group = Group.objects.create(title='Группа 1', course=self.course)
+        self.other_group = Group.objects.create(title='Группа 2', course=self.course)
+
+    def assertInSync(self):
+        """Счётчики, поддержанные сигналами, совпадают с пересчётом"""
+        self.assertEqual(reconcile(), {'totals': {}, 'groups': {}, 'courses': {}})
+
+    def active(self, obj):
+        obj.refresh_from_db()
+        return obj.active_students_count
+
+    def test_signals_keep_counters_in_sync(self):
+        students = [Student.objects.create(name=f'Студент {i}', course=self.course, to_pay=100) for i in range(3)]
+        for student in students:
+            student.group.add(self.group)
+        self.group.student_set.add(students[0], students[1])  # повторное добавление не считается
+        students[2].group.add(self.other_group)
+        self.assertEqual(self.active(self.group), 3)
+        self.assertEqual(self.active(self.course), 3)
+        self.assertInSync()
+
+        students[0].student_status = 'graduated'
+        students[0].save()
+        students[1].course = self.other_course
+        students[1].to_pay = 250
+        students[1].save()
+        students[2].group.remove(self.group, self.other_group)
+        self.other_group.student_set.remove(students[0])  # не состоял в группе
+        self.assertEqual(self.active(self.group), 1)
+        self.assertEqual(self.active(self.other_course), 1)
+        self.assertInSync()
+
+        self.group.student_set.clear()
+        students[2].delete()
+        Teacher.objects.create(name='Учитель')
+        Group.objects.create(title='Группа 3')
+        self.assertEqual(self.active(self.group), 0)
+        self.assertInSync()
+        self.assertEqual(totals()['students'], 2)
+
+    def test_reconcile_command_repairs_drift(self):
+        student = Student.objects.create(name='Студент', course=self.course)
+        student.group.add(self.group)
+        Group.objects.filter(pk=self.group.pk).update(active_students_count=7)
+        Counter.objects.filter(name='students').update(value=40)
+        Counter.objects.filter(name='teachers').delete()
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Исправлено счётчиков: 3', out.getvalue())
+        self.assertEqual(self.active(self.group), 1)
+        self.assertInSync()
+
+    def test_dashboard_reads_counters(self):
+        Student.objects.create(name='Студент', to_pay=300)
+        self.client.force_login(User.objects.create_user(username='admin', role='admin'))
+        with QueryTracker() as tracker:
+            response = self.client.get(reverse('dashboard:dashboard'))
+        self.assertEqual(response.context['total_students'], 1)
+        self.assertEqual(response.context['total_groups'], 2)
+        self.assertEqual(response.context['expected_profit'], 300)
+        self.assertEqual([sql for sql in tracker.queries if 'COUNT(' in sql.upper()], [])
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='abc-1234', role='student')
+        self.jamshid = Student.objects.create(name='Жамшид Хасанов', phone='996555123456', user=user)
+        self.other = Student.objects.create(name='Алия Маратовна', phone='996700000000')
+        self.teacher = Teacher.objects.create(name='Xurshid Qodirov', phone='996777111222')
+
+    def found(self, queryset, query):
+        return list(search(queryset, query))
+
+    def test_transliteration_folds_both_scripts(self):
+        self.assertEqual(fold('Жамшид'), fold('Jamshid'))
+        self.assertEqual(fold('Zhamshid'), fold('Джамшид'))
+        self.assertEqual(fold('Хуршид Кодиров'), fold('Xurshid Qodirov'))
+        self.assertEqual(tokenize('Мария, +996 555'), ['maria', '996', '555'])
+
+        students = Student.objects.all()
+        self.assertEqual(self.found(students, 'jamshid'), [self.jamshid])
+        self.assertEqual(self.found(students, 'ЖАМ хас'), [self.jamshid])
+        self.assertEqual(self.found(Teacher.objects.all(), 'Хуршид'), [self.teacher])
+        self.assertEqual(self.found(students, 'Хуршид'), [])
+
+    def test_phone_username_and_ranking(self):
+        students = Student.objects.all()
+        self.assertEqual(self.found(students, '5123'), [self.jamshid])
+        self.assertEqual(self.found(students, 'abc-1234'), [self.jamshid])
+
+        exact = Student.objects.create(name='Али', phone='996')
+        prefix = Student.objects.create(name='Алишер', phone='996')
+        self.assertEqual(self.found(students, 'али'), [exact, prefix, self.other])
+
+    def test_signals_follow_changes_and_graduates(self):
+        graduate = Graduate.objects.create(student=self.other, graduation_date=date(2024, 6, 1),
+                                           diploma_number='D-2024-17')
+        self.assertEqual(self.found(Graduate.objects.all(), '2024-17'), [graduate])
+
+        self.other.name = 'Алия Садыкова'
+        self.other.save()
+        self.assertEqual(self.found(Graduate.objects.all(), 'sadykova'), [graduate])
+
+        self.jamshid.user.username = 'new-9999'
+        self.jamshid.user.save()
+        self.assertEqual(self.found(Student.objects.all(), '9999'), [self.jamshid])
+
+        self.other.delete()
+        self.assertFalse(SearchDocument.objects.filter(kind='graduate').exists())
+
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found(Student.objects.all(), 'jamshid'), [self.jamshid])
+
+    def test_list_views_and_global_search(self):
+        self.client.force_login(User.objects.create_user(username='admin', role='admin'))
+
+        response = self.client.get(reverse('student:list'), {'search': 'Jamshid'})
+        self.assertEqual(list(response.context['students']), [self.jamshid])
+        response = self.client.get(reverse('teacher:list'), {'search': 'Хуршид'})
+        self.assertEqual(list(response.context['teachers']), [self.teacher])
+
+        response = self.client.get(reverse('dashboard:search'), {'q': 'шид'})
+        self.assertContains(response, 'action="/search/"')
+        self.assertEqual(response.context['results'], [])
+        response = self.client.get(reverse('dashboard:search'), {'q': 'хурш'})
+        self.assertEqual([group['kind'] for group in response.context['results']], ['teacher'])
+        self.assertContains(response, reverse('teacher:details', args=[self.teacher.id]))
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='admin', role='admin'))
+
+    def walk(self, url, params=None):
+        """Все страницы списка вперёд по курсорам: [[имена строк страницы]]"""
+        pages = []
+        response = self.client.get(url, params or {})
+        while True:
+            page = response.context['page']
+            pages.append([student.name for student in page])
+            if not page.has_next:
+                return pages, response
+            response = self.client.get(url + page.next_url)
+
+    def test_cursors_follow_filters_and_sort(self):
+        for index in range(PER_PAGE + 5):
+            Student.objects.create(name=f'Студент {index:02}', student_status='active' if index % 2 else 'inactive')
+
+        pages, _ = self.walk(reverse('student:list'))
+        self.assertEqual([len(page) for page in pages], [PER_PAGE, 5])
+        self.assertEqual(pages[0][0], f'Студент {PER_PAGE + 4:02}')
+
+        pages, response = self.walk(reverse('student:list'), {'sort': 'name', 'student_status': 'active'})
+        names = sum(pages, [])
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(len(names), (PER_PAGE + 5) // 2)
+        self.assertEqual(response.context['page'].total_display, str(len(names)))
+
+        # Новая строка в начале списка не сдвигает следующую страницу
+        first = self.client.get(reverse('student:list')).context['page']
+        Student.objects.create(name='Новый')
+        second = self.client.get(reverse('student:list') + first.next_url).context['page']
+        self.assertEqual([student.name for student in second], [f'Студент {index:02}' for index in range(4, -1, -1)])
+        back = self.client.get(reverse('student:list') + second.previous_url).context['page']
+        self.assertEqual(list(back), list(first))
+
+        broken = self.client.get(reverse('student:list'), {'cursor': 'испорчен'}).context['page']
+        self.assertFalse(broken.has_previous)
+
+    def test_reports_paginated_and_count_is_bounded(self):
+        teacher = Teacher.objects.create(name='Учитель')
+        group = Group.objects.create(title='Группа')
+        TeacherReport.objects.bulk_create([
+            TeacherReport(teacher=teacher, group=group, student_quantity=1, comment='')
+            for _ in range(PER_PAGE + 1)
+        ])
+        response = self.client.get(reverse('teacher:reports'))
+        self.assertEqual(len(response.context['report_list']), PER_PAGE)
+        self.assertTrue(response.context['report_list'].has_next)
+
+        self.assertEqual(approximate_count(TeacherReport.objects.all(), limit=10), (10, False))
+        self.assertEqual(approximate_count(TeacherReport.objects.all()), (PER_PAGE + 1, True))
@@ -0,0 +1,86 @@
+"""Замеры времени обработки запроса: SQL, шаблоны, представление
+
+ServerTimingMiddleware создаёт RequestTiming на время запроса; SQL
+замеряется обёрткой execute_wrapper, рендер шаблонов — бэкендом
+TimedDjangoTemplates (подключается в settings.TEMPLATES).
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+
+_current = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """Накопленные за запрос счётчики; statements пишутся только при record_sql"""
+
+    def __init__(self, record_sql=False):
+        self.record_sql = record_sql
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.statements = []
+        self._template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.db_ms += elapsed
+            if self.record_sql:
+                self.statements.append((elapsed, sql))
+
+    @contextmanager
+    def template(self):
+        """Время рендера; вложенные шаблоны не считаются повторно"""
+        self._template_depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._template_depth -= 1
+            if not self._template_depth:
+                self.template_ms += (time.perf_counter() - started) * 1000
+
+
+@contextmanager
+def track(timing):
+    token = _current.set(timing)
+    try:
+        yield timing
+    finally:
+        _current.reset(token)
+
+
+def current():
+    """RequestTiming текущего запроса или None вне ServerTimingMiddleware"""
+    return _current.get()
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timing = current()
+        if timing is None:
+            return super().render(context, request)
+        with timing.template():
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, который замеряет время рендера для Server-Timing"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
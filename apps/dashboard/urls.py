@@ -1,9 +1,10 @@
 from django.urls import path
-from .views import dashboard, landing
+from .views import dashboard, landing, search_view
 
 app_name = 'dashboard'
 
 urlpatterns = [
     path('', landing, name='landing'),
     path('dashboard/', dashboard, name='dashboard'),
+    path('search/', search_view, name='search'),
 ]
\ No newline at end of file
@@ -23,31 +23,38 @@ def landing(request):
 @login_required(login_url='user:login')
 @is_admin
 def dashboard(request):
-    from apps.student.models import Student
-    from apps.teacher.models import Teacher
-    from apps.group.models import Group
-    from apps.graduate.models import Graduate
-    from django.db.models import Sum
-    
-    # Статистика для dashboard
-    total_students = Student.objects.count()
-    total_teachers = Teacher.objects.count()
-    total_groups = Group.objects.count()
-    total_graduates = Graduate.objects.count()
-    
+    from .counters import totals
+
+    # Статистика для dashboard — готовые счётчики (apps.dashboard.counters)
+    counters = totals()
+
     # Финансовая статистика
-    expected_profit = Student.objects.aggregate(total=Sum('to_pay'))['total'] or 0
+    expected_profit = counters['to_pay']
     transactions_amount = 0  # Здесь можно добавить логику для оплаченных сумм
     remainder = expected_profit - transactions_amount
     
     context = {
-        'total_students': total_students,
-        'total_teachers': total_teachers,
-        'total_groups': total_groups,
-        'total_graduates': total_graduates,
+        'total_students': counters['students'],
+        'total_teachers': counters['teachers'],
+        'total_groups': counters['groups'],
+        'total_graduates': counters['graduates'],
         'expected_profit': expected_profit,
         'transactions_amount': transactions_amount,
         'remainder': remainder,
     }
     
-    return render(request, 'dashboard/dashboard.html', context)
\ No newline at end of file
+    return render(request, 'dashboard/dashboard.html', context)
+
+
+@login_required(login_url='user:login')
+@is_admin
+def search_view(request):
+    """Общий поиск из шапки: студенты, преподаватели и выпускники"""
+    from .search import search_everywhere
+
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+        'results': search_everywhere(query) if query else [],
+    }
+    return render(request, 'dashboard/search.html', context)
@@ -3,3 +3,4 @@ from .models import *
 
 
 admin.site.register(Grade)
+admin.site.register(GradeChange)
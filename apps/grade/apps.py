@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class GradeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.grade'
-    verbose_name = 'Оценки'
\ No newline at end of file
+    verbose_name = 'Оценки'
+
+    def ready(self):
+        from . import signals  # noqa: F401
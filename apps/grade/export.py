@@ -0,0 +1,231 @@
+"""Потоковая выгрузка журналов оценок в CSV и XLSX
+
+Строки читаются из базы порциями (QuerySet.iterator) в виде кортежей
+values_list и сразу уходят клиенту, поэтому память не растёт с объёмом
+выгрузки, даже если выгружается учебный год целиком.
+"""
+import csv
+import zipfile
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+
+from apps.student.models import Student
+from .models import Grade
+
+
+CHUNK_SIZE = 2000
+
+# Студентов в порции сводного журнала: их оценки читаются одним запросом
+STUDENT_CHUNK_SIZE = 200
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: write() просто возвращает строку"""
+
+    def write(self, value):
+        return value
+
+
+class _ChunkBuffer:
+    """Файл только для записи, из которого zipfile выгружается порциями"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_csv(header, rows):
+    """CSV по строкам; BOM нужен, чтобы Excel правильно открыл кириллицу"""
+    writer = csv.writer(Echo())
+    yield '\ufeff'
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+_XLSX_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_cell(value):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+
+
+def stream_xlsx(header, rows, sheet_title='Журнал'):
+    """Минимальный XLSX (один лист, inline-строки), собираемый на лету"""
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_title[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            pending = []
+            for row in _prepend(header, rows):
+                pending.append('<row>' + ''.join(_xlsx_cell(value) for value in row) + '</row>')
+                if len(pending) >= 500:
+                    sheet.write(''.join(pending).encode('utf-8'))
+                    pending = []
+                    yield buffer.drain()
+            sheet.write(''.join(pending).encode('utf-8'))
+            sheet.write(b'</sheetData></worksheet>')
+        yield buffer.drain()
+    yield buffer.drain()
+
+
+def _prepend(first, rows):
+    yield first
+    yield from rows
+
+
+def export_response(filename, header, rows, file_format='csv', sheet_title='Журнал'):
+    """StreamingHttpResponse с выгрузкой в нужном формате"""
+    if file_format == 'xlsx':
+        response = StreamingHttpResponse(
+            stream_xlsx(header, rows, sheet_title),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        filename = f'{filename}.xlsx'
+    else:
+        response = StreamingHttpResponse(
+            stream_csv(header, rows),
+            content_type='text/csv; charset=utf-8'
+        )
+        filename = f'{filename}.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _format_marks(marks):
+    return ' '.join(f'{mark:g}' for mark in marks)
+
+
+def journal_rows(group, subject, start, end):
+    """Журнал группы по предмету в виде сводной таблицы, как в grade_list
+
+    Заголовок: студент, даты с оценками, средний балл. Студенты идут
+    порциями по STUDENT_CHUNK_SIZE; оценки порции читаются одним запросом
+    и раскладываются по student_id — в памяти только оценки одной порции.
+    """
+    grades = Grade.objects.filter(
+        subject=subject,
+        date__gte=start,
+        date__lt=end,
+        student__group=group,
+        student__student_status='active'
+    )
+    dates = list(grades.values_list('date', flat=True).distinct().order_by('date'))
+    header = ['Студент'] + [grade_date.strftime('%d.%m.%Y') for grade_date in dates] + ['Средний']
+
+    def rows():
+        students = Student.objects.filter(
+            group=group,
+            student_status='active'
+        ).order_by('name', 'id').values_list('id', 'name').iterator(chunk_size=STUDENT_CHUNK_SIZE)
+
+        while True:
+            chunk = list(islice(students, STUDENT_CHUNK_SIZE))
+            if not chunk:
+                break
+            marks = {}
+            for student_id, grade_date, mark in grades.filter(
+                student_id__in=[student_id for student_id, _ in chunk]
+            ).order_by('date', 'id').values_list('student_id', 'date', 'mark'):
+                marks.setdefault(student_id, {}).setdefault(grade_date, []).append(mark)
+
+            for student_id, name in chunk:
+                by_date = marks.get(student_id, {})
+                all_marks = [mark for cell in by_date.values() for mark in cell]
+                average = round(sum(all_marks) / len(all_marks), 2) if all_marks else 0
+                yield [name] + [_format_marks(by_date.get(grade_date, [])) for grade_date in dates] + [average]
+
+    return header, rows()
+
+
+LONG_HEADER = ['Дата', 'Группа', 'Предмет', 'Студент', 'Оценка', 'Страницы', 'Преподаватель']
+
+
+def _long_rows(queryset, group_title=None):
+    fields = ['date', 'subject__name', 'student__name', 'mark', 'pages', 'teacher__name']
+    if group_title is None:
+        fields.insert(1, 'student__group__title')
+    for row in queryset.values_list(*fields).iterator(chunk_size=CHUNK_SIZE):
+        row = list(row)
+        row[0] = row[0].strftime('%d.%m.%Y')
+        if group_title is not None:
+            row.insert(1, group_title)
+        yield row
+
+
+def group_rows(group, start, end):
+    """Все оценки группы по всем предметам, одна строка на оценку"""
+    queryset = Grade.objects.filter(
+        student__group=group,
+        date__gte=start,
+        date__lt=end
+    ).order_by('date', 'subject__name', 'student__name', 'id')
+    return LONG_HEADER, _long_rows(queryset, group_title=group.title)
+
+
+def school_rows(start, end):
+    """Все оценки школы за период; студент в нескольких группах даёт строку на группу"""
+    queryset = Grade.objects.filter(
+        date__gte=start,
+        date__lt=end
+    ).order_by('date', 'student__group__title', 'subject__name', 'student__name', 'id')
+    return LONG_HEADER, _long_rows(queryset)
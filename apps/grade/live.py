@@ -0,0 +1,117 @@
+"""Живые изменения журнала: события ячеек для открытых страниц grade_list
+
+Каждое изменение оценки (запись GradeChange) после фиксации транзакции
+получает позицию в ленте и публикуется в каналы (группа, предмет, месяц) всех групп студента —
+страница журнала подписана на свой канал через grade:events и
+исправляет ячейку на месте. При изменении оценки событие получает и
+канал, где она была раньше: там её нужно убрать.
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from apps.dashboard.events import get_broker
+from apps.student.models import Student
+from apps.teacher.models import Teacher
+from .models import GradeChange
+from .utils import CHANGES_MAX_PAGE_SIZE, month_range
+
+
+def grade_channel(group_id, subject_id, year, month):
+    return f'grade:{group_id}:{subject_id}:{year}-{month:02}'
+
+
+def change_event(change, teacher_names):
+    """Событие ячейки для страницы журнала"""
+    return {
+        'cursor': change.feed_id,
+        'action': change.action,
+        'grade': change.grade_id,
+        'student': change.student_id,
+        'subject': change.subject_id,
+        'date': change.date.isoformat(),
+        'mark': change.mark,
+        'pages': change.pages,
+        'teacher_name': teacher_names.get(change.teacher_id, ''),
+    }
+
+
+def record_changes(grades, action, previous=None):
+    """Записать изменения в GradeChange, после фиксации выдать им позиции и опубликовать
+
+    previous — прежнее состояние изменённой оценки (для action=updated).
+    """
+    changes = GradeChange.record(grades, action)
+    if changes:
+        transaction.on_commit(lambda: settle_changes(changes, previous))
+    return changes
+
+
+def settle_changes(changes, previous=None):
+    """Выдать позиции ленты зафиксированным изменениям и разослать их события"""
+    feed_ids = GradeChange.settle()
+    if not get_broker().active:
+        return
+    missing = [change.id for change in changes if change.id not in feed_ids]
+    if missing:
+        # Позиции успел выдать settle другой транзакции
+        feed_ids.update(GradeChange.objects.filter(id__in=missing).values_list('id', 'feed_id'))
+    for change in changes:
+        change.feed_id = feed_ids.get(change.id)
+    publish_changes(changes, previous)
+
+
+def publish_changes(changes, previous=None):
+    """Разослать события изменений: по запросу на группы и на имена преподавателей"""
+    places = [
+        (change, [(change.student_id, change.subject_id, change.date)])
+        for change in changes
+    ]
+    if previous is not None:
+        places[0][1].append((previous.student_id, previous.subject_id, previous.date))
+
+    student_ids = {student_id for _, targets in places for student_id, _, _ in targets}
+    group_ids = {}
+    for student_id, group_id in Student.group.through.objects.filter(
+        student_id__in=student_ids
+    ).values_list('student_id', 'group_id'):
+        group_ids.setdefault(student_id, []).append(group_id)
+    teacher_names = dict(Teacher.objects.filter(
+        id__in={change.teacher_id for change in changes}
+    ).values_list('id', 'name'))
+
+    broker = get_broker()
+    for change, targets in places:
+        event = change_event(change, teacher_names)
+        channels = {
+            grade_channel(group_id, subject_id, grade_date.year, grade_date.month)
+            for student_id, subject_id, grade_date in targets
+            if student_id is not None and subject_id is not None
+            for group_id in group_ids.get(student_id, [])
+        }
+        for channel in channels:
+            broker.publish(channel, event)
+
+
+def missed_events(group_id, subject_id, year, month, since, limit=CHANGES_MAX_PAGE_SIZE):
+    """События канала после курсора since (Last-Event-ID переподключения)
+
+    None, если их больше limit или журнал за это время начат заново —
+    странице проще перечитать журнал. Оценка, перенесённая за это время
+    в другой предмет или месяц, здесь не видна: её прежнее место знает
+    только живое событие.
+    """
+    start, end = month_range(year, month)
+    changes = list(GradeChange.objects.filter(feed_id__gt=since).filter(
+        Q(
+            subject_id=subject_id,
+            date__gte=start,
+            date__lt=end,
+            student_id__in=Student.group.through.objects.filter(group_id=group_id).values('student_id'),
+        ) | Q(action=GradeChange.RESET)
+    ).order_by('feed_id')[:limit + 1])
+    if len(changes) > limit or any(change.action == GradeChange.RESET for change in changes):
+        return None
+    teacher_names = dict(Teacher.objects.filter(
+        id__in={change.teacher_id for change in changes}
+    ).values_list('id', 'name'))
+    return [change_event(change, teacher_names) for change in changes]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models import Max
+from django.db.models.functions import Round
 from apps.student.models import Student
 from apps.teacher.models import Teacher
 from apps.schedule.models import Subject
@@ -7,6 +9,13 @@ import datetime
 from django.core.exceptions import ValidationError
 
 
+# На сколько дней от сегодня можно ставить оценку; дальше clean() ставит сегодняшнюю дату
+GRADE_DATE_WINDOW = datetime.timedelta(days=2)
+
+# Ключ рекомендательной блокировки PostgreSQL, под которой раздаются позиции ленты изменений
+FEED_LOCK_KEY = 4_210_517
+
+
 class Grade(models.Model):
     """Оценка студента"""
 
@@ -37,6 +46,12 @@ class Grade(models.Model):
     class Meta:
         verbose_name = 'Оценка'
         verbose_name_plural = 'Оценки'
+        indexes = [
+            models.Index(fields=['date'], name='grade_date_idx'),
+            models.Index(fields=['subject', 'date'], name='grade_subject_date_idx'),
+            models.Index(fields=['student', 'date'], name='grade_student_date_idx'),
+            models.Index(fields=['student', 'subject', 'date'], name='grade_student_subject_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student} - {self.mark}"
@@ -44,8 +59,8 @@ class Grade(models.Model):
     def clean(self):
         """Валидация даты: только вчера, сегодня, завтра (+/-3 дня от текущей даты)"""
         today = datetime.date.today()
-        min_date = today - datetime.timedelta(days=2)  # позавчера
-        max_date = today + datetime.timedelta(days=2)  # послезавтра
+        min_date = today - GRADE_DATE_WINDOW  # позавчера
+        max_date = today + GRADE_DATE_WINDOW  # послезавтра
 
         if not (min_date <= self.date <= max_date):
             self.date = today
@@ -53,3 +68,253 @@ class Grade(models.Model):
     def save(self, *args, **kwargs):
         self.full_clean()  # запускаем clean() перед сохранением
         super().save(*args, **kwargs)
+
+
+class StudentMonthlyStats(models.Model):
+    """Сводка оценок студента по предмету за месяц (для рейтингов и дневника)
+
+    Обновляется сигналами при сохранении и удалении оценок; полностью
+    пересчитывается командой rebuild_monthly_stats. Оценки без предмета
+    (предмет удалён) копятся в строке с subject=None, чтобы рейтинг
+    учитывал их, как раньше учитывал все оценки месяца.
+    """
+
+    student = models.ForeignKey(
+        Student,
+        verbose_name="Студент",
+        on_delete=models.CASCADE,
+        related_name='monthly_stats'
+    )
+    subject = models.ForeignKey(
+        Subject,
+        verbose_name="Предмет",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='monthly_stats'
+    )
+    year = models.PositiveSmallIntegerField(verbose_name="Год")
+    month = models.PositiveSmallIntegerField(verbose_name="Месяц")
+
+    grade_count = models.IntegerField(default=0, verbose_name="Количество оценок")
+    sum_marks = models.FloatField(default=0, verbose_name="Сумма оценок")
+    sum_pages = models.FloatField(default=0, verbose_name="Сумма страниц")
+    weighted_score = models.FloatField(default=0, verbose_name="Сумма оценка × страницы")
+    average = models.FloatField(default=0, verbose_name="Средний балл")
+
+    class Meta:
+        verbose_name = 'Сводка оценок за месяц'
+        verbose_name_plural = 'Сводки оценок за месяц'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'subject', 'year', 'month'],
+                condition=models.Q(subject__isnull=False),
+                name='student_monthly_stats_unique'
+            ),
+            # NULL не равен NULL — строку без предмета ограничиваем отдельно
+            models.UniqueConstraint(
+                fields=['student', 'year', 'month'],
+                condition=models.Q(subject__isnull=True),
+                name='student_monthly_stats_no_subject_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['year', 'month'], name='student_stats_period_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student} - {self.subject} - {self.month:02}.{self.year}"
+
+    @classmethod
+    def apply_grades(cls, grades, sign=1):
+        """Добавить (sign=1) или вычесть (sign=-1) оценки из сводки
+
+        Работает за постоянное число запросов независимо от количества оценок,
+        поэтому подходит и для одиночного сохранения, и для bulk_create.
+        Оценки без студента в сводку не попадают.
+        """
+        deltas = {}
+        for grade in grades:
+            if grade.student_id is None:
+                continue
+            key = (grade.student_id, grade.subject_id, grade.date.year, grade.date.month)
+            delta = deltas.setdefault(key, [0, 0, 0, 0])
+            pages = grade.pages or 0
+            delta[0] += sign
+            delta[1] += sign * grade.mark
+            delta[2] += sign * pages
+            delta[3] += sign * grade.mark * pages
+        cls._apply_deltas(deltas, create=sign > 0)
+
+    @classmethod
+    def detach_subject(cls, subject_id):
+        """Перенести сводку удаляемого предмета в строки без предмета
+
+        Оценки предмета при удалении остаются с subject=None (SET_NULL)
+        без сигналов, а его строки сводки удаляются каскадом.
+        """
+        deltas = {}
+        for row in cls.objects.filter(subject_id=subject_id):
+            deltas[(row.student_id, None, row.year, row.month)] = [
+                row.grade_count, row.sum_marks, row.sum_pages, row.weighted_score
+            ]
+        cls._apply_deltas(deltas, create=True)
+
+    @classmethod
+    def _apply_deltas(cls, deltas, create):
+        """Прибавить к строкам {(студент, предмет, год, месяц): [count, marks, pages, score]}"""
+        if not deltas:
+            return
+
+        if create:
+            cls.objects.bulk_create([
+                cls(student_id=student_id, subject_id=subject_id, year=year, month=month)
+                for student_id, subject_id, year, month in deltas
+            ], ignore_conflicts=True)
+
+        student_ids = {key[0] for key in deltas}
+        subject_ids = {key[1] for key in deltas}
+        subjects = models.Q(subject_id__in=subject_ids - {None})
+        if None in subject_ids:
+            subjects |= models.Q(subject__isnull=True)
+        periods = {(key[2], key[3]) for key in deltas}
+        rows = []
+        for row in cls.objects.filter(
+            subjects,
+            student_id__in=student_ids,
+            year__in={year for year, _ in periods},
+            month__in={month for _, month in periods}
+        ):
+            delta = deltas.get((row.student_id, row.subject_id, row.year, row.month))
+            if delta is None:
+                continue
+            row.grade_count = models.F('grade_count') + delta[0]
+            row.sum_marks = models.F('sum_marks') + delta[1]
+            row.sum_pages = models.F('sum_pages') + delta[2]
+            row.weighted_score = models.F('weighted_score') + delta[3]
+            rows.append(row)
+        if not rows:
+            return
+
+        pks = [row.pk for row in rows]
+        cls.objects.bulk_update(rows, ['grade_count', 'sum_marks', 'sum_pages', 'weighted_score'])
+        cls.objects.filter(pk__in=pks, grade_count__lte=0).delete()
+        cls.objects.filter(pk__in=pks).update(
+            average=Round(models.F('sum_marks') / models.F('grade_count'), 2)
+        )
+
+
+class GradeChange(models.Model):
+    """Запись журнала изменений оценок (только добавляется)
+
+    feed_id — курсор синхронизации: клиент запрашивает изменения после
+    последнего увиденного feed_id и получает только их, а не весь месяц.
+    Позиция выдаётся после фиксации транзакции (settle), поэтому порядок
+    позиций — порядок фиксации: запись долгой транзакции не окажется
+    позади курсора, который клиент уже прошёл. Поля оценки копируются,
+    потому что удалённой оценки уже нет в базе; связи хранятся числами
+    по той же причине.
+    """
+
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    RESET = 'reset'
+    ACTIONS = [
+        (CREATED, 'Добавлена'),
+        (UPDATED, 'Изменена'),
+        (DELETED, 'Удалена'),
+        (RESET, 'Журнал начат заново'),
+    ]
+
+    action = models.CharField(max_length=7, choices=ACTIONS, verbose_name="Действие")
+    grade_id = models.BigIntegerField(verbose_name="Оценка")
+    student_id = models.BigIntegerField(null=True, verbose_name="Студент")
+    subject_id = models.BigIntegerField(null=True, verbose_name="Предмет")
+    teacher_id = models.BigIntegerField(null=True, verbose_name="Преподаватель")
+    mark = models.FloatField(verbose_name="Оценка")
+    pages = models.FloatField(null=True, verbose_name="Страницы")
+    date = models.DateField(verbose_name="День")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Время изменения")
+    feed_id = models.BigIntegerField(null=True, unique=True, verbose_name="Позиция в ленте")
+
+    class Meta:
+        verbose_name = 'Изменение оценки'
+        verbose_name_plural = 'Изменения оценок'
+        indexes = [
+            models.Index(fields=['student_id', 'feed_id'], name='grade_change_student_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.grade_id}"
+
+    @classmethod
+    def record(cls, grades, action):
+        """Записать изменение оценок одним INSERT; возвращает записи
+
+        Оценки без id (bulk_create на MySQL их не возвращает) пропускаются.
+        Позиций у записей ещё нет — их раздаёт settle после фиксации.
+        """
+        return cls.objects.bulk_create([
+            cls(
+                action=action, grade_id=grade.pk, student_id=grade.student_id,
+                subject_id=grade.subject_id, teacher_id=grade.teacher_id,
+                mark=grade.mark, pages=grade.pages, date=grade.date,
+            )
+            for grade in grades
+            if grade.pk is not None
+        ])
+
+    @classmethod
+    def _lock(cls, connection):
+        """Раздача позиций по одной: следующая видит уже зафиксированные позиции предыдущей
+
+        На SQLite запись в базу и так идёт по одной.
+        """
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [FEED_LOCK_KEY])
+
+    @classmethod
+    def settle(cls, using=DEFAULT_DB_ALIAS):
+        """Выдать позиции всем зафиксированным записям без позиции; возвращает {id: feed_id}
+
+        Вызывается после фиксации транзакции, записавшей изменения. Записи
+        незавершённых транзакций не видны и получат позиции позже, после
+        всех уже выданных. Записи, оставшиеся без позиции из-за падения
+        процесса, подберёт следующий вызов.
+        """
+        connection = connections[using]
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with transaction.atomic(using=using):
+            cls._lock(connection)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {table} SET feed_id = numbered.feed_id FROM ('
+                    f'SELECT id, ROW_NUMBER() OVER (ORDER BY id) '
+                    f'+ (SELECT COALESCE(MAX(feed_id), 0) FROM {table}) AS feed_id '
+                    f'FROM {table} WHERE feed_id IS NULL'
+                    f') AS numbered WHERE {table}.id = numbered.id '
+                    f'RETURNING {table}.id, {table}.feed_id'
+                )
+                return dict(cursor.fetchall())
+
+    @classmethod
+    def start_over(cls, clear=False, using=DEFAULT_DB_ALIAS):
+        """Записать отметку reset: клиенты с прежним курсором загрузят всё заново
+
+        Нужна после изменения оценок в обход журнала (очистка базы,
+        восстановление из копии). clear — заодно удалить старые записи;
+        отметка всё равно получает позицию после них, чтобы курсоры
+        клиентов остались позади неё.
+        """
+        connection = connections[using]
+        with transaction.atomic(using=using):
+            cls._lock(connection)
+            top = cls.objects.using(using).aggregate(top=Max('feed_id'))['top'] or 0
+            if clear:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DELETE FROM {connection.ops.quote_name(cls._meta.db_table)}')
+            return cls.objects.using(using).create(
+                action=cls.RESET, grade_id=0, mark=0, date=datetime.date.today(), feed_id=top + 1,
+            )
@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from apps.schedule.models import Subject
+from apps.student.models import Student
+from apps.teacher.models import Teacher
+from .live import record_changes
+from .models import Grade, GradeChange, StudentMonthlyStats
+from .utils import bump_group_version, patch_grade_added, patch_grade_removed
+
+
+def _student_group_ids(student_id):
+    if student_id is None:
+        return []
+    return list(Student.group.through.objects.filter(
+        student_id=student_id
+    ).values_list('group_id', flat=True))
+
+
+@receiver(pre_save, sender=Grade)
+def grade_pre_save(sender, instance, **kwargs):
+    """Запоминаем прежние значения изменяемой оценки"""
+    instance._previous = None
+    if instance.pk is not None:
+        instance._previous = Grade.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Grade)
+def grade_post_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        StudentMonthlyStats.apply_grades([previous], sign=-1)
+    StudentMonthlyStats.apply_grades([instance])
+
+    # Кеш правим только после коммита: откат не должен оставить в журнале оценку.
+    # И раньше, чем изменение получит позицию в ленте (record_changes): страница,
+    # взявшая курсор после неё, уже прочтёт журнал с этой оценкой
+    def patch_cache():
+        if previous is not None:
+            patch_grade_removed(
+                previous.pk, previous.student_id, previous.subject_id, previous.date,
+                _student_group_ids(previous.student_id)
+            )
+        patch_grade_added(instance, _student_group_ids(instance.student_id))
+
+    transaction.on_commit(patch_cache)
+    record_changes([instance], GradeChange.CREATED if created else GradeChange.UPDATED, previous)
+
+
+@receiver(post_delete, sender=Grade)
+def grade_post_delete(sender, instance, **kwargs):
+    StudentMonthlyStats.apply_grades([instance], sign=-1)
+    grade_id, student_id, subject_id, grade_date = (
+        instance.pk, instance.student_id, instance.subject_id, instance.date
+    )
+    transaction.on_commit(lambda: patch_grade_removed(
+        grade_id, student_id, subject_id, grade_date, _student_group_ids(student_id)
+    ))
+    record_changes([instance], GradeChange.DELETED)
+
+
+@receiver(m2m_changed, sender=Student.group.through)
+def student_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Состав группы изменился — матрицы этих групп строятся заново"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        group_ids = [instance.pk]
+    elif action == 'pre_clear':
+        group_ids = _student_group_ids(instance.pk)
+    else:
+        group_ids = pk_set or []
+    for group_id in group_ids:
+        bump_group_version(group_id)
+
+
+@receiver(post_save, sender=Student)
+@receiver(pre_delete, sender=Student)
+def student_changed(sender, instance, **kwargs):
+    """Имя, фото или статус студента отображаются в строке журнала"""
+    if kwargs.get('created'):
+        return
+    for group_id in _student_group_ids(instance.pk):
+        bump_group_version(group_id)
+
+
+@receiver(post_save, sender=Teacher)
+def teacher_changed(sender, instance, created, **kwargs):
+    """Имя преподавателя хранится в ячейках журнала — сбрасываем группы его оценок"""
+    if created:
+        return
+    group_ids = Student.group.through.objects.filter(
+        student_id__in=Grade.objects.filter(teacher_id=instance.pk).values('student_id')
+    ).values_list('group_id', flat=True).distinct()
+    for group_id in group_ids:
+        bump_group_version(group_id)
+
+
+@receiver(pre_delete, sender=Subject)
+def subject_deleted(sender, instance, **kwargs):
+    """Оценки удаляемого предмета остаются в рейтинге — без предмета"""
+    StudentMonthlyStats.detach_subject(instance.pk)
@@ -1,3 +1,772 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import zipfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.dashboard.events import InProcessBroker, event_stream, get_broker
+from apps.dashboard.models import Course
+from apps.dashboard.queries import QueryTracker
+from apps.group.models import Group
+from apps.schedule.models import Day, Schedule, Subject
+from apps.student.models import Student
+from apps.teacher.models import Teacher
+from apps.user.models import User
+from . import export
+from .live import grade_channel
+from .models import Grade, GradeChange, StudentMonthlyStats
+from .utils import get_matrix, grade_changes, latest_change_cursor, month_range, rated_students
+
+
+class GradeMatrixCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = date.today()
+        self.course = Course.objects.create(title='Тестовый курс')
+        self.group = Group.objects.create(title='Тестовая группа', course=self.course)
+        self.subject = Subject.objects.create(name='Чтение Корана')
+        self.teacher = Teacher.objects.create(
+            user=User.objects.create_user(username='teacher', password='pass', role='teacher'),
+            name='Учитель'
+        )
+        self.student = Student.objects.create(name='Студент', course=self.course)
+        self.student.group.add(self.group)
+
+    def matrix(self):
+        return get_matrix(self.group.id, self.subject.id, self.today.year, self.today.month)
+
+    def add_grade(self, mark):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Grade.objects.create(
+                student=self.student, teacher=self.teacher, subject=self.subject,
+                mark=mark, pages=2, date=self.today
+            )
+
+    def test_matrix_is_served_from_cache(self):
+        self.add_grade(5)
+        self.matrix()
+        with self.assertNumQueries(0):
+            matrix = self.matrix()
+        self.assertEqual(matrix['total_grades'], 1)
+
+    def test_new_grade_patches_cached_cell(self):
+        self.matrix()
+        self.add_grade(5)
+        self.add_grade(4)
+        with self.assertNumQueries(0):
+            matrix = self.matrix()
+        row = matrix['rows'][self.student.id]
+        self.assertEqual([item['mark'] for item in row['grades_by_date'][self.today]], [5, 4])
+        self.assertEqual(row['average'], 4.5)
+        self.assertEqual(matrix['dates'], [self.today])
+
+    def test_deleted_grade_is_removed_from_cached_cell(self):
+        grade = self.add_grade(3)
+        self.matrix()
+        with self.captureOnCommitCallbacks(execute=True):
+            grade.delete()
+        matrix = self.matrix()
+        self.assertEqual(matrix['dates'], [])
+        self.assertEqual(matrix['total_grades'], 0)
+
+    def test_rolled_back_grade_does_not_reach_cache(self):
+        self.matrix()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Grade.objects.create(
+                student=self.student, teacher=self.teacher, subject=self.subject,
+                mark=5, pages=2, date=self.today
+            )
+        # Коммита не было (как при откате) — кеш журнала не тронут
+        self.assertTrue(callbacks)
+        self.assertEqual(self.matrix()['total_grades'], 0)
+
+    def test_uncached_matrix_is_rebuilt_after_commit(self):
+        self.add_grade(5)
+        self.assertEqual(self.matrix()['total_grades'], 1)
+
+    def test_teacher_rename_rebuilds_cached_cells(self):
+        self.add_grade(5)
+        self.matrix()
+        self.teacher.name = 'Новое имя'
+        self.teacher.save()
+        cell = self.matrix()['rows'][self.student.id]['grades_by_date'][self.today]
+        self.assertEqual(cell[0]['teacher_name'], 'Новое имя')
+
+    def test_membership_change_rebuilds_group_matrix(self):
+        self.matrix()
+        newcomer = Student.objects.create(name='Новый студент', course=self.course)
+        newcomer.group.add(self.group)
+        self.assertIn(newcomer.id, self.matrix()['rows'])
+        self.group.student_set.remove(newcomer)
+        self.assertNotIn(newcomer.id, self.matrix()['rows'])
+
+
+class BatchCreateTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = Course.objects.create(title='Тестовый курс')
+        self.group = Group.objects.create(title='Тестовая группа', course=self.course)
+        self.subject = Subject.objects.create(name='Чтение Корана')
+        self.user = User.objects.create_user(username='teacher', password='pass', role='teacher')
+        self.teacher = Teacher.objects.create(user=self.user, name='Учитель')
+        self.students = [Student.objects.create(name=f'Студент {i}', course=self.course) for i in range(3)]
+        for student in self.students:
+            student.group.add(self.group)
+        self.outsider = Student.objects.create(name='Чужой', course=self.course)
+        self.client.force_login(self.user)
+        self.url = reverse('grade:batch_create', args=[self.group.id, self.subject.id])
+
+    def post(self, payload):
+        return self.client.post(self.url, json.dumps(payload), content_type='application/json')
+
+    def test_whole_column_saved_in_one_request(self):
+        payload = {
+            'date': date.today().isoformat(),
+            'grades': [{'student_id': s.id, 'mark': 5, 'pages': 3} for s in self.students],
+        }
+        response = self.post(payload)
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['created'], 3)
+        self.assertTrue(all(result['success'] for result in data['results']))
+        self.assertEqual(Grade.objects.filter(subject=self.subject, teacher=self.teacher).count(), 3)
+
+    def test_invalid_rows_are_reported_per_row(self):
+        payload = {
+            'date': date.today().isoformat(),
+            'grades': [
+                {'student_id': self.students[0].id, 'mark': 4},
+                {'student_id': self.outsider.id, 'mark': 5},
+                {'student_id': self.students[1].id, 'mark': 9},
+            ],
+        }
+        results = self.post(payload).json()['results']
+        self.assertEqual([result['success'] for result in results], [True, False, False])
+        self.assertIn('grade_id', results[0])
+        self.assertEqual(Grade.objects.count(), 1)
+
+    def test_non_object_body_is_rejected(self):
+        for payload in ([], 'x', 5):
+            self.assertEqual(self.post(payload).status_code, 400)
+
+    def test_date_outside_clean_window_is_rejected(self):
+        payload = {
+            'date': (date.today() - timedelta(days=3)).isoformat(),
+            'grades': [{'student_id': self.students[0].id, 'mark': 5}],
+        }
+        self.assertFalse(self.post(payload).json()['success'])
+        self.assertFalse(Grade.objects.exists())
+
+    def test_modal_students_loaded_on_demand(self):
+        url = reverse('grade:students', args=[self.group.id, self.subject.id])
+        self.assertEqual(self.client.get(url).json()['students'], [])
+
+        self.teacher.group.add(self.group)
+        students = self.client.get(url).json()['students']
+        self.assertEqual([student['name'] for student in students], ['Студент 0', 'Студент 1', 'Студент 2'])
+
+        response = self.client.get(reverse('grade:list', args=[self.group.id, self.subject.id]))
+        self.assertContains(response, 'form-select-sm batch-mark', count=1)
+        self.assertNotContains(response, 'Студент 0</option>')
+
+
+class GradeMatrixPayloadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(title='Группа')
+        self.subject = Subject.objects.create(name='Таджвид')
+        self.teacher = Teacher.objects.create(name='Учитель')
+        self.students = [Student.objects.create(name=name) for name in ('Амир', 'Билол', 'Довуд')]
+        for student in self.students:
+            student.group.add(self.group)
+        rows = [(0, 5, 2), (0, 4, 9), (0, 3, 9), (2, 4, 2)]
+        Grade.objects.bulk_create([
+            Grade(student=self.students[student], teacher=self.teacher, subject=self.subject,
+                  mark=mark, pages=1, date=date(2024, 9, day))
+            for student, mark, day in rows
+        ])
+        self.client.force_login(User.objects.create_user(username='admin', role='admin'))
+        self.args = [self.group.id, self.subject.id]
+
+    def test_matrix_as_parallel_arrays(self):
+        data = self.client.get(reverse('grade:matrix', args=self.args), {'month': '2024-09'}).json()
+        # Строки в порядке страницы: по убыванию среднего
+        self.assertEqual(data['names'], ['Амир', 'Довуд', 'Билол'])
+        self.assertEqual(data['dates'], ['2024-09-02', '2024-09-09'])
+        self.assertEqual(data['offsets'], [0, 3, 4, 4])
+        self.assertEqual(data['columns'], [0, 1, 1, 0])
+        self.assertEqual(data['marks'], [5, 4, 3, 4])
+        self.assertEqual(data['teacher_names'], ['Учитель'])
+        self.assertEqual(len(data['grade_ids']), data['total_grades'])
+        self.assertEqual(data['cursor'], latest_change_cursor())
+
+    def test_virtual_mode_skips_server_table(self):
+        url = reverse('grade:list', args=self.args)
+        response = self.client.get(url, {'month': '2024-09', 'view': 'virtual'})
+        self.assertContains(response, 'id="virtualView"')
+        self.assertNotContains(response, 'id="tableView"')
+
+        response = self.client.get(url, {'month': '2024-09'})
+        self.assertNotContains(response, 'id="virtualView"')
+        self.assertContains(response, 'id="tableView"')
+
+
+class GradeIndexUsageTest(TestCase):
+    """Горячие запросы по оценкам должны идти по индексам, а не полным сканированием"""
+
+    @classmethod
+    def setUpTestData(cls):
+        course = Course.objects.create(title='Тестовый курс')
+        cls.group = Group.objects.create(title='Тестовая группа', course=course)
+        cls.subjects = [Subject.objects.create(name=f'Предмет {i}') for i in range(4)]
+        cls.students = Student.objects.bulk_create([
+            Student(name=f'Студент {i}', course=course) for i in range(40)
+        ])
+        cls.group.student_set.add(*cls.students)
+        start = date.today() - timedelta(days=365)
+        Grade.objects.bulk_create([
+            Grade(
+                student=student,
+                subject=cls.subjects[day % len(cls.subjects)],
+                mark=5,
+                pages=1,
+                date=start + timedelta(days=day)
+            )
+            for student in cls.students
+            for day in range(0, 365, 3)
+        ])
+        call_command('rebuild_monthly_stats', stdout=StringIO())
+
+    def setUp(self):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            self.skipTest('EXPLAIN проверяется только на PostgreSQL и SQLite')
+        with connection.cursor() as cursor:
+            # Статистика по году оценок группы, настройки планировщика — по умолчанию
+            cursor.execute('ANALYZE grade_grade' if connection.vendor == 'postgresql' else 'ANALYZE')
+        today = date.today()
+        self.start, self.end = month_range(today.year, today.month)
+
+    def assertNoSeqScan(self, queryset, table='grade_grade', column='date'):
+        """Таблица читается по индексу, и фильтр по периоду входит в условие индекса"""
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            self.assertNotRegex(plan, rf'Seq Scan on "?{table}"?', plan)
+            self.assertRegex(plan, rf'Index Cond: .*\b{column} [>=]', plan)
+        else:
+            lines = [line for line in plan.splitlines() if table in line]
+            self.assertTrue(lines, plan)
+            for line in lines:
+                self.assertIn('SEARCH', line, plan)
+                self.assertRegex(line, rf'\b{column}[>=]', plan)
+
+    def test_journal_query(self):
+        self.assertNoSeqScan(Grade.objects.filter(
+            subject=self.subjects[0],
+            date__gte=self.start,
+            date__lt=self.end,
+            student_id__in=[student.id for student in self.students]
+        ))
+
+    def test_diary_query(self):
+        self.assertNoSeqScan(Grade.objects.filter(
+            student=self.students[0],
+            date__gte=self.start,
+            date__lt=self.end
+        ).order_by('date'))
+
+    def test_rating_query(self):
+        today = date.today()
+        self.assertNoSeqScan(
+            rated_students(today.year, today.month),
+            table='grade_studentmonthlystats',
+            column='year'
+        )
+
+
+class StudentMonthlyStatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = date.today()
+        self.course = Course.objects.create(title='Тестовый курс')
+        self.group = Group.objects.create(title='Тестовая группа', course=self.course)
+        self.subject = Subject.objects.create(name='Чтение Корана')
+        self.teacher = Teacher.objects.create(name='Учитель')
+        self.student = Student.objects.create(name='Студент', course=self.course)
+        self.student.group.add(self.group)
+
+    def stats(self):
+        return StudentMonthlyStats.objects.get(
+            student=self.student, subject=self.subject,
+            year=self.today.year, month=self.today.month
+        )
+
+    def add_grade(self, mark, pages):
+        return Grade.objects.create(
+            student=self.student, teacher=self.teacher, subject=self.subject,
+            mark=mark, pages=pages, date=self.today
+        )
+
+    def test_grades_update_rollup_incrementally(self):
+        self.add_grade(5, 2)
+        grade = self.add_grade(3, 4)
+        stats = self.stats()
+        self.assertEqual(stats.grade_count, 2)
+        self.assertEqual(stats.sum_pages, 6)
+        self.assertEqual(stats.weighted_score, 22)
+        self.assertEqual(stats.average, 4)
+
+        grade.mark = 4
+        grade.save()
+        self.assertEqual(self.stats().average, 4.5)
+
+        grade.delete()
+        self.assertEqual(self.stats().grade_count, 1)
+        Grade.objects.get().delete()
+        self.assertFalse(StudentMonthlyStats.objects.exists())
+
+    def test_rebuild_command_matches_incremental_rollup(self):
+        self.add_grade(5, 2)
+        self.add_grade(4, 0)
+        expected = list(StudentMonthlyStats.objects.values(
+            'student', 'subject', 'year', 'month', 'grade_count',
+            'sum_marks', 'sum_pages', 'weighted_score', 'average'
+        ))
+        call_command('rebuild_monthly_stats', stdout=StringIO())
+        self.assertEqual(list(StudentMonthlyStats.objects.values(
+            'student', 'subject', 'year', 'month', 'grade_count',
+            'sum_marks', 'sum_pages', 'weighted_score', 'average'
+        )), expected)
+
+    def test_rating_reads_rollup(self):
+        self.add_grade(5, 2)
+        student = rated_students(self.today.year, self.today.month).get()
+        self.assertEqual(student.weighted_score, 10)
+        self.assertEqual(student.average_mark, 5)
+
+    def test_grades_without_subject_stay_in_rating(self):
+        # Оценка без предмета появляется, когда предмет удаляют (SET_NULL)
+        self.add_grade(5, 2)
+        self.add_grade(3, 2)
+        self.subject.delete()
+        student = rated_students(self.today.year, self.today.month).get()
+        self.assertEqual(student.grade_count, 2)
+        self.assertEqual(student.weighted_score, 16)
+        self.assertEqual(StudentMonthlyStats.objects.get().subject_id, None)
+
+        call_command('rebuild_monthly_stats', stdout=StringIO())
+        self.assertEqual(rated_students(self.today.year, self.today.month).get().weighted_score, 16)
+
+    def test_rebuild_if_empty_backfills_once(self):
+        self.add_grade(5, 2)
+        StudentMonthlyStats.objects.all().delete()
+        call_command('rebuild_monthly_stats', if_empty=True, stdout=StringIO())
+        self.assertEqual(self.stats().grade_count, 1)
+
+        self.stats().delete()
+        self.add_grade(4, 1)
+        call_command('rebuild_monthly_stats', if_empty=True, stdout=StringIO())
+        self.assertEqual(self.stats().grade_count, 1)
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.course = Course.objects.create(title='Тестовый курс')
+        self.group = Group.objects.create(title='Тестовая группа', course=self.course)
+        self.subject = Subject.objects.create(name='Чтение Корана')
+        self.teacher = Teacher.objects.create(name='Учитель')
+        self.students = [Student.objects.create(name=name, course=self.course) for name in ('Айбек', 'Бакыт')]
+        self.group.student_set.add(*self.students)
+        for mark in (5, 4):
+            Grade.objects.create(
+                student=self.students[0], teacher=self.teacher, subject=self.subject,
+                mark=mark, pages=1, date=self.today
+            )
+        self.client.force_login(User.objects.create_user(username='admin', password='pass', role='admin'))
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_journal_csv_uses_pivot_layout(self):
+        response = self.client.get(
+            reverse('grade:export_journal', args=[self.group.id, self.subject.id]),
+            {'month': self.today.strftime('%Y-%m')}
+        )
+        lines = self.content(response).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0], f'Студент,{self.today:%d.%m.%Y},Средний')
+        self.assertEqual(lines[1], 'Айбек,5 4,4.5')
+        self.assertEqual(lines[2], 'Бакыт,,0')
+
+    def test_journal_marks_follow_students_across_chunks(self):
+        # Порядок имён в Python и в базе может расходиться — оценки ищутся по id
+        extra = [Student.objects.create(name=name, course=self.course) for name in ('бахтияр', 'Айбек')]
+        self.group.student_set.add(*extra)
+        for student, mark in zip(extra, (3, 2)):
+            Grade.objects.create(
+                student=student, teacher=self.teacher, subject=self.subject,
+                mark=mark, pages=1, date=self.today
+            )
+        start, end = month_range(self.today.year, self.today.month)
+        with mock.patch.object(export, 'STUDENT_CHUNK_SIZE', 1):
+            _, rows = export.journal_rows(self.group, self.subject, start, end)
+            averages = {(row[0], row[-1]) for row in rows}
+        self.assertEqual(averages, {('Айбек', 4.5), ('Айбек', 2), ('Бакыт', 0), ('бахтияр', 3)})
+
+    def test_school_xlsx_is_valid_workbook(self):
+        response = self.client.get(reverse('grade:export_school'), {
+            'start': self.today.isoformat(), 'end': self.today.isoformat(), 'format': 'xlsx'
+        })
+        archive = zipfile.ZipFile(BytesIO(self.content(response)))
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertEqual(sheet.count('<row>'), 3)
+        self.assertIn('Тестовая группа', sheet)
+
+
+class DiaryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(title='Группа')
+        self.subjects = [Subject.objects.create(name=name) for name in ('Таджвид', 'Фикх', 'Акыда')]
+        day = Day.objects.create(title='Понедельник', order=1)
+        for subject in self.subjects[:2]:
+            Schedule.objects.create(group=self.group, day=day, subject=subject)
+        self.teacher = Teacher.objects.create(name='Учитель')
+        user = User.objects.create_user(username='student', role='student')
+        self.student = Student.objects.create(name='Студент', user=user)
+        self.student.group.add(self.group)
+        self.client.force_login(user)
+
+        # bulk_create: save() оценки переносит дату на сегодня; сводку пересчитываем
+        rows = [
+            (0, 5, date(2024, 9, 2)), (0, 4, date(2024, 9, 2)), (0, 3, date(2024, 9, 9)),
+            (1, 5, date(2024, 9, 9)), (2, 4, date(2025, 2, 3)), (0, 5, date(2025, 9, 1)),
+        ]
+        Grade.objects.bulk_create([
+            Grade(student=self.student, teacher=self.teacher, subject=self.subjects[index],
+                  mark=mark, pages=1, date=day)
+            for index, mark, day in rows
+        ])
+        call_command('rebuild_monthly_stats', stdout=StringIO())
+
+    def diary(self, **params):
+        self.client.get(reverse('grade:diary'), params)
+        with QueryTracker() as tracker:
+            response = self.client.get(reverse('grade:diary'), params)
+        return response.context['diary'], tracker
+
+    def test_month_rows_are_dense(self):
+        diary, tracker = self.diary(month='2024-09')
+        self.assertEqual(diary['columns'], [date(2024, 9, 2), date(2024, 9, 9)])
+        rows = {row['subject']['name']: row for row in diary['rows']}
+        self.assertEqual(list(rows), ['Таджвид', 'Фикх'])
+
+        tajwid = rows['Таджвид']
+        self.assertEqual([(cell['mark'], cell['count']) for cell in tajwid['cells']], [(4.5, 2), (3, 1)])
+        self.assertEqual(tajwid['cells'][0]['teacher'], 'Учитель')
+        self.assertEqual(tajwid['average'], 4)
+        self.assertEqual(rows['Фикх']['cells'][0], None)
+        self.assertEqual((diary['best_average'], diary['overall_average']), (5, 4.25))
+        self.assertEqual(len([sql for sql in tracker.queries if 'grade_grade' in sql]), 1)
+
+    def test_academic_year_has_month_columns(self):
+        diary, _ = self.diary(year='2024')
+        self.assertEqual(len(diary['columns']), 12)
+        self.assertEqual((diary['columns'][0], diary['columns'][-1]), (date(2024, 9, 1), date(2025, 8, 1)))
+        rows = {row['subject']['name']: row for row in diary['rows']}
+        # Предмет вне расписания группы, но с оценками, тоже попадает в дневник
+        self.assertEqual(list(rows), ['Акыда', 'Таджвид', 'Фикх'])
+        self.assertEqual(rows['Таджвид']['cells'][0]['count'], 3)
+        self.assertEqual(rows['Акыда']['cells'][5]['mark'], 4)
+        self.assertEqual(rows['Таджвид']['average'], 4)
+        self.assertEqual(diary['graded_columns'], 2)
+
+
+class GroupJournalTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(title='Группа')
+        self.other_group = Group.objects.create(title='Другая группа')
+        self.subjects = [Subject.objects.create(name=name) for name in ('Таджвид', 'Фикх', 'Акыда')]
+        day = Day.objects.create(title='Понедельник', order=1)
+        for subject in self.subjects[:2]:
+            Schedule.objects.create(group=self.group, day=day, subject=subject)
+        teacher_user = User.objects.create_user(username='teacher', role='teacher')
+        self.teacher = Teacher.objects.create(name='Учитель', user=teacher_user)
+        self.teacher.group.add(self.group)
+        self.students = [Student.objects.create(name=name) for name in ('Амир', 'Билол')]
+        for student in self.students:
+            student.group.add(self.group)
+
+        rows = [
+            (0, 0, 5, date(2024, 9, 2)), (0, 0, 4, date(2024, 9, 9)), (1, 0, 3, date(2024, 9, 2)),
+            (0, 2, 4, date(2024, 9, 3)), (1, 1, 5, date(2024, 9, 4)), (0, 0, 2, date(2024, 10, 1)),
+        ]
+        Grade.objects.bulk_create([
+            Grade(student=self.students[student], teacher=self.teacher, subject=self.subjects[subject],
+                  mark=mark, pages=1, date=day)
+            for student, subject, mark, day in rows
+        ])
+        self.url = reverse('grade:group_journal', args=[self.group.id])
+
+    def test_all_subjects_loaded_in_one_grade_query(self):
+        self.client.force_login(User.objects.create_user(username='admin', role='admin'))
+        self.client.get(self.url, {'month': '2024-09'})
+        with QueryTracker() as tracker:
+            response = self.client.get(self.url, {'month': '2024-09'})
+        self.assertEqual(len([sql for sql in tracker.queries if 'grade_grade' in sql]), 1)
+
+        journal = response.context['journal']
+        subjects = {subject['name']: subject for subject in journal['subjects']}
+        # Предмет вне расписания, но с оценками за месяц, тоже попадает в журнал
+        self.assertEqual(list(subjects), ['Акыда', 'Таджвид', 'Фикх'])
+        tajwid = subjects['Таджвид']
+        self.assertEqual(tajwid['dates'], [date(2024, 9, 2), date(2024, 9, 9)])
+        self.assertEqual(tajwid['averages'], [4.5, 3])
+        self.assertEqual((tajwid['average'], tajwid['total_grades']), (4, 3))
+        self.assertEqual(subjects['Фикх']['averages'], [None, 5])
+        self.assertEqual([row['average'] for row in journal['overview']], [4.33, 4])
+        self.assertEqual((journal['overall_average'], journal['total_grades']), (4.2, 5))
+        self.assertContains(response, 'id="journal-data"')
+
+    def test_teacher_sees_only_own_groups(self):
+        self.client.force_login(self.teacher.user)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        other_url = reverse('grade:group_journal', args=[self.other_group.id])
+        self.assertEqual(self.client.get(other_url).status_code, 404)
+
+
+class GradeChangeFeedTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(title='Группа')
+        self.subject = Subject.objects.create(name='Таджвид')
+        self.user = User.objects.create_user(username='teacher', role='teacher')
+        self.teacher = Teacher.objects.create(name='Учитель', user=self.user)
+        self.teacher.group.add(self.group)
+        self.students = [Student.objects.create(name=name) for name in ('Амир', 'Билол')]
+        for student in self.students:
+            student.group.add(self.group)
+
+    def add_grade(self, student, mark):
+        return Grade.objects.create(
+            student=student, teacher=self.teacher, subject=self.subject,
+            mark=mark, pages=1, date=date.today()
+        )
+
+    def test_signals_record_every_change(self):
+        cursor = latest_change_cursor()
+        with self.captureOnCommitCallbacks(execute=True):
+            grade = self.add_grade(self.students[0], 4)
+            grade.mark = 5
+            grade.save()
+            grade_id = grade.pk
+            grade.delete()
+
+        changes, next_cursor, has_more, reset = grade_changes(cursor)
+        self.assertEqual(
+            [(change.action, change.grade_id, change.mark) for change in changes],
+            [('created', grade_id, 4), ('updated', grade_id, 5), ('deleted', grade_id, 5)],
+        )
+        self.assertEqual((next_cursor, has_more, reset), (changes[-1].feed_id, False, False))
+        self.assertEqual(grade_changes(next_cursor)[0], [])
+
+    def test_batch_endpoint_records_changes(self):
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('grade:batch_create', args=[self.group.id, self.subject.id]),
+                json.dumps({'date': date.today().isoformat(),
+                            'grades': [{'student_id': student.id, 'mark': 5} for student in self.students]}),
+                content_type='application/json',
+            )
+        changes = grade_changes(0)[0]
+        self.assertEqual([change.action for change in changes], ['created', 'created'])
+        self.assertEqual({change.student_id for change in changes}, {student.id for student in self.students})
+
+    def test_pages_are_bounded_and_filtered(self):
+        for mark in (3, 4, 5):
+            self.add_grade(self.students[0], mark)
+        self.add_grade(self.students[1], 2)
+        # Изменения без позиции (транзакция ещё не зафиксирована) не отдаются
+        self.assertEqual(grade_changes(0)[0], [])
+        GradeChange.settle()
+
+        first, cursor, has_more, _ = grade_changes(0, [self.students[0].id], limit=2)
+        self.assertEqual(([change.mark for change in first], has_more), ([3, 4], True))
+        rest, cursor, has_more, _ = grade_changes(cursor, [self.students[0].id], limit=2)
+        self.assertEqual(([change.mark for change in rest], has_more), ([5], False))
+        # Пустая страница проверяет ещё и то, что курсор не впереди ленты
+        with self.assertNumQueries(2):
+            self.assertEqual(grade_changes(cursor, [self.students[0].id])[0], [])
+
+    def test_feed_follows_commit_order(self):
+        early = self.add_grade(self.students[0], 4)
+        self.add_grade(self.students[0], 5)
+        # Запись долгой транзакции: id меньше, но фиксируется она позже
+        row = GradeChange.objects.get(grade_id=early.pk)
+        row.delete()
+        GradeChange.settle()
+        cursor = latest_change_cursor()
+        self.assertEqual(grade_changes(0)[1], cursor)
+
+        row.save()
+        self.assertEqual(grade_changes(cursor)[0], [])
+        GradeChange.settle()
+        changes, next_cursor, _, _ = grade_changes(cursor)
+        self.assertEqual([change.grade_id for change in changes], [early.pk])
+        self.assertGreater(next_cursor, cursor)
+
+    def test_start_over_tells_clients_to_reload(self):
+        self.add_grade(self.students[0], 4)
+        GradeChange.settle()
+        cursor = latest_change_cursor()
+
+        GradeChange.start_over(clear=True)
+        changes, next_cursor, has_more, reset = grade_changes(cursor, [self.students[0].id])
+        self.assertEqual((changes, next_cursor, has_more, reset), ([], latest_change_cursor(), False, True))
+        self.assertGreater(next_cursor, cursor)
+        self.assertFalse(grade_changes(next_cursor)[3])
+        # Курсор впереди ленты (база восстановлена из старой копии)
+        self.assertTrue(grade_changes(next_cursor + 10)[3])
+
+
+class LiveJournalTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(title='Группа')
+        self.other_group = Group.objects.create(title='Другая группа')
+        self.subject = Subject.objects.create(name='Таджвид')
+        self.user = User.objects.create_user(username='teacher', role='teacher')
+        self.teacher = Teacher.objects.create(name='Учитель', user=self.user)
+        self.teacher.group.add(self.group)
+        self.student = Student.objects.create(name='Амир')
+        self.student.group.add(self.group)
+        self.today = date.today()
+        self.channel = grade_channel(self.group.id, self.subject.id, self.today.year, self.today.month)
+
+    def add_grade(self, mark):
+        return Grade.objects.create(
+            student=self.student, teacher=self.teacher, subject=self.subject,
+            mark=mark, pages=1, date=self.today
+        )
+
+    def test_broker_delivers_events_published_from_other_threads(self):
+        broker = InProcessBroker()
+
+        async def listen():
+            async with broker.subscribe('channel') as subscription:
+                self.assertTrue(broker.active)
+                thread = threading.Thread(target=broker.publish, args=('channel', {'grade': 1}))
+                thread.start()
+                thread.join()
+                broker.publish('other', {'grade': 2})
+                return await subscription.get(timeout=1)
+
+        self.assertEqual(asyncio.run(listen()), {'grade': 1})
+        self.assertFalse(broker.active)
+
+    def test_grade_changes_are_published_after_commit(self):
+        broker = get_broker()
+        subscribed = threading.Event()
+        events = []
+
+        async def listen():
+            async with broker.subscribe(self.channel) as subscription:
+                subscribed.set()
+                for _ in range(2):
+                    events.append(await subscription.get(timeout=5))
+
+        # Подписчик — в своём цикле событий, как под ASGI; оценки меняются в потоке теста
+        listener = threading.Thread(target=asyncio.run, args=(listen(),))
+        listener.start()
+        subscribed.wait(5)
+        with self.captureOnCommitCallbacks(execute=True):
+            grade = self.add_grade(4)
+        with self.captureOnCommitCallbacks(execute=True):
+            grade.delete()
+        listener.join(5)
+
+        self.assertEqual([event['action'] for event in events], ['created', 'deleted'])
+        self.assertEqual(events[0]['mark'], 4)
+        self.assertEqual(events[0]['teacher_name'], 'Учитель')
+        self.assertEqual(events[0]['date'], self.today.isoformat())
+
+    async def read_stream(self, params, headers=None):
+        """Первое событие потока после приветствия; поток закрывается"""
+        url = reverse('grade:events', args=[self.group.id, self.subject.id])
+
+        # Ссылка на сам поток: streaming_content — обёртка, её закрытие поток не закрывает
+        generators = []
+
+        def capture(*args, **kwargs):
+            generators.append(event_stream(*args, **kwargs))
+            return generators[-1]
+
+        with mock.patch('apps.grade.views.event_stream', side_effect=capture):
+            response = await self.async_client.get(url, params, headers=headers or {})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        try:
+            self.assertTrue((await anext(stream)).startswith(b'retry:'))
+            return (await anext(stream)).decode()
+        finally:
+            await stream.aclose()
+            await generators[0].aclose()
+
+    async def test_stream_replays_missed_changes(self):
+        grade = await Grade.objects.acreate(
+            student=self.student, teacher=self.teacher, subject=self.subject,
+            mark=5, pages=1, date=self.today
+        )
+        # Позиции раздаются после фиксации, а тест идёт внутри транзакции
+        await sync_to_async(GradeChange.settle)()
+        await self.async_client.aforce_login(self.user)
+
+        message = await self.read_stream({'month': f'{self.today:%Y-%m}'}, {'Last-Event-ID': '0'})
+        self.assertIn('"action":"created"', message)
+        self.assertIn(f'"grade":{grade.pk}', message)
+
+        other_url = reverse('grade:events', args=[self.other_group.id, self.subject.id])
+        self.assertEqual((await self.async_client.get(other_url)).status_code, 404)
+
+    async def test_stream_sends_changes_made_after_render(self):
+        await self.async_client.aforce_login(self.user)
+        page = await self.async_client.get(reverse('grade:list', args=[self.group.id, self.subject.id]))
+        cursor = page.context['cursor']
+        self.assertContains(page, f'let journalCursor = {cursor};')
+
+        # Оценка поставлена, пока страница ещё не подписалась на поток
+        grade = await Grade.objects.acreate(
+            student=self.student, teacher=self.teacher, subject=self.subject,
+            mark=4, pages=1, date=self.today
+        )
+        await sync_to_async(GradeChange.settle)()
+
+        message = await self.read_stream({'month': f'{self.today:%Y-%m}', 'since': cursor})
+        self.assertIn(f'"grade":{grade.pk}', message)
+        self.assertIn('"mark":4', message)
+
+    async def test_stream_resyncs_after_start_over(self):
+        await self.async_client.aforce_login(self.user)
+        cursor = await sync_to_async(latest_change_cursor)()
+        await sync_to_async(GradeChange.start_over)(clear=True)
+
+        message = await self.read_stream({'month': f'{self.today:%Y-%m}', 'since': cursor})
+        self.assertTrue(message.startswith('event: resync'))
+
+    def test_wsgi_page_listens_when_events_are_served_separately(self):
+        self.client.force_login(self.user)
+        url = reverse('grade:list', args=[self.group.id, self.subject.id])
+        self.assertContains(self.client.get(url), 'const LIVE = false')
+        with override_settings(LIVE_EVENTS=True):
+            self.assertContains(self.client.get(url), 'const LIVE = true')
@@ -6,7 +6,15 @@ app_name = 'grade'
 urlpatterns = [
     path('groups/', group_list, name='group_list'),
     path('groups/<int:pk>/subjects/', subject_list, name='subject_list'),
+    path('groups/<int:pk>/journal/', group_journal, name='group_journal'),
     path('groups/<int:group_pk>/subjects/<int:subject_pk>/', grade_list, name='list'),
+    path('groups/<int:group_pk>/subjects/<int:subject_pk>/matrix/', grade_matrix, name='matrix'),
+    path('groups/<int:group_pk>/subjects/<int:subject_pk>/events/', grade_events, name='events'),
+    path('groups/<int:group_pk>/subjects/<int:subject_pk>/batch/', batch_create, name='batch_create'),
+    path('groups/<int:group_pk>/subjects/<int:subject_pk>/students/', journal_students, name='students'),
     path('diary/', diary, name='diary'),
+    path('export/', export_school, name='export_school'),
+    path('groups/<int:pk>/export/', export_group, name='export_group'),
+    path('groups/<int:group_pk>/subjects/<int:subject_pk>/export/', export_journal, name='export_journal'),
     path('groups/<int:group_pk>/subjects/<int:subject_pk>/<int:pk>/delete/', delete, name='delete'),
 ]
\ No newline at end of file
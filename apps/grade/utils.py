@@ -0,0 +1,542 @@
+from bisect import insort
+from datetime import date
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Max, Q, Sum
+from django.db.models.functions import NullIf, Round
+
+from apps.schedule.models import Subject
+from apps.student.models import Student
+from .models import Grade, GradeChange, StudentMonthlyStats
+
+
+MATRIX_TIMEOUT = 60 * 60 * 24
+
+# Сколько секунд живёт замок правки матрицы, если процесс упал, не сняв его
+MATRIX_LOCK_TIMEOUT = 5
+
+# Изменений оценок на странице ленты: по умолчанию и не больше
+CHANGES_PAGE_SIZE = 100
+CHANGES_MAX_PAGE_SIZE = 500
+
+# С этого числа студентов журнал по умолчанию открывается виртуальной таблицей
+VIRTUAL_TABLE_MIN_ROWS = 60
+
+
+def month_range(year, month):
+    """Полуоткрытый интервал [начало месяца, начало следующего месяца)"""
+    start = date(year, month, 1)
+    if month == 12:
+        end = date(year + 1, 1, 1)
+    else:
+        end = date(year, month + 1, 1)
+    return start, end
+
+
+def rated_students(year, month):
+    """Студенты с оценками за месяц и их итогами из StudentMonthlyStats"""
+    return Student.objects.filter(
+        monthly_stats__year=year,
+        monthly_stats__month=month
+    ).select_related('course').annotate(
+        total_marks=Sum('monthly_stats__sum_marks'),
+        total_pages=Sum('monthly_stats__sum_pages'),
+        weighted_score=Sum('monthly_stats__weighted_score'),
+        grade_count=Sum('monthly_stats__grade_count'),
+        average_mark=Round(F('total_marks') / F('grade_count'), 2)
+    ).order_by('-weighted_score')
+
+
+def _group_version_key(group_id):
+    return f'grade_matrix:group:{group_id}:version'
+
+
+def _group_versions(group_ids):
+    """Версии групп; смена версии сбрасывает все матрицы группы"""
+    keys = {_group_version_key(group_id): group_id for group_id in group_ids}
+    stored = cache.get_many(keys.keys())
+    return {group_id: stored.get(key, 0) for key, group_id in keys.items()}
+
+
+def _matrix_key(group_id, subject_id, year, month, version):
+    return f'grade_matrix:{group_id}:{subject_id}:{year}-{month:02}:v{version}'
+
+
+def bump_group_version(group_id):
+    """Сбросить все кешированные матрицы группы (изменился состав студентов)"""
+    key = _group_version_key(group_id)
+    if cache.add(key, 1, timeout=None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def grade_cell(grade):
+    """Лёгкое представление оценки для ячейки журнала"""
+    return {
+        'id': grade.id,
+        'mark': grade.mark,
+        'pages': grade.pages,
+        'teacher_name': grade.teacher.name if grade.teacher else '',
+    }
+
+
+def _refresh_totals(matrix):
+    """Пересчитать средние по строкам и общую статистику матрицы"""
+    total_sum = 0
+    total_grades = 0
+    averages = []
+    for row in matrix['rows'].values():
+        if row['count']:
+            row['average'] = round(row['sum'] / row['count'], 2)
+        else:
+            row['average'] = 0
+        total_sum += row['sum']
+        total_grades += row['count']
+        averages.append(row['average'])
+
+    matrix['total_grades'] = total_grades
+    matrix['class_average'] = round(total_sum / total_grades, 2) if total_grades > 0 else 0
+    matrix['best_average'] = max(averages) if averages else 0
+
+
+def build_matrix(group_id, subject_id, year, month):
+    """Построить матрицу студент × дата из базы данных"""
+    start, end = month_range(year, month)
+
+    students = Student.objects.filter(
+        group__id=group_id,
+        student_status='active'
+    ).only('id', 'name', 'image').order_by('name')
+
+    rows = {}
+    for student in students:
+        rows[student.id] = {
+            'student': {
+                'id': student.id,
+                'name': student.name,
+                'image_url': student.image.url if student.image else '',
+            },
+            'grades_by_date': {},
+            'sum': 0,
+            'count': 0,
+        }
+
+    grades = Grade.objects.filter(
+        subject_id=subject_id,
+        date__gte=start,
+        date__lt=end,
+        student_id__in=rows.keys()
+    ).select_related('teacher').order_by('date', 'id')
+
+    dates = set()
+    for grade in grades:
+        row = rows[grade.student_id]
+        row['grades_by_date'].setdefault(grade.date, []).append(grade_cell(grade))
+        row['sum'] += grade.mark
+        row['count'] += 1
+        dates.add(grade.date)
+
+    matrix = {
+        'rows': rows,
+        'dates': sorted(dates),
+    }
+    _refresh_totals(matrix)
+    return matrix
+
+
+def get_matrix(group_id, subject_id, year, month):
+    """Матрица журнала из кеша; строится заново только при промахе"""
+    version = _group_versions([group_id])[group_id]
+    key = _matrix_key(group_id, subject_id, year, month, version)
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = build_matrix(group_id, subject_id, year, month)
+        # add, а не set: пока строили, матрицу мог положить и поправить другой запрос
+        cache.add(key, matrix, MATRIX_TIMEOUT)
+    return matrix
+
+
+def _patch_matrices(group_ids, subject_id, year, month, patch):
+    """Поправить закешированные матрицы групп функцией patch(matrix)
+
+    Вызывается после коммита. Чтение и запись матрицы идут под коротким
+    замком в кеше. Если замок занят или матрицы в кеше нет (её может
+    строить запрос, читавший базу до коммита), версия группы сбрасывается:
+    лишняя перестройка дешевле потерянной или лишней оценки.
+    """
+    for group_id, version in _group_versions(group_ids).items():
+        key = _matrix_key(group_id, subject_id, year, month, version)
+        lock = f'{key}:lock'
+        if not cache.add(lock, 1, MATRIX_LOCK_TIMEOUT):
+            bump_group_version(group_id)
+            continue
+        try:
+            matrix = cache.get(key)
+            if matrix is None:
+                bump_group_version(group_id)
+            elif patch(matrix):
+                _refresh_totals(matrix)
+                cache.set(key, matrix, MATRIX_TIMEOUT)
+        finally:
+            cache.delete(lock)
+
+
+def patch_grade_added(grade, group_ids):
+    """Добавить оценку в одну ячейку закешированных матриц"""
+    if grade.subject_id is None or grade.student_id is None:
+        return
+
+    def add(matrix):
+        row = matrix['rows'].get(grade.student_id)
+        if row is None:
+            return False
+        cell = row['grades_by_date'].setdefault(grade.date, [])
+        if any(item['id'] == grade.id for item in cell):
+            return False
+        cell.append(grade_cell(grade))
+        row['sum'] += grade.mark
+        row['count'] += 1
+        if grade.date not in matrix['dates']:
+            insort(matrix['dates'], grade.date)
+        return True
+
+    _patch_matrices(group_ids, grade.subject_id, grade.date.year, grade.date.month, add)
+
+
+def patch_grades_added(grades):
+    """Добавить в кеш оценки, созданные через bulk_create (сигналы не вызываются)"""
+    if not grades:
+        return
+    student_ids = {grade.student_id for grade in grades}
+    group_ids = {}
+    for student_id, group_id in Student.group.through.objects.filter(
+        student_id__in=student_ids
+    ).values_list('student_id', 'group_id'):
+        group_ids.setdefault(student_id, []).append(group_id)
+    for grade in grades:
+        if grade.pk is None:
+            # MySQL не возвращает id из bulk_create — матрицу проще перестроить
+            for group_id in group_ids.get(grade.student_id, []):
+                bump_group_version(group_id)
+        else:
+            patch_grade_added(grade, group_ids.get(grade.student_id, []))
+
+
+def patch_grade_removed(grade_id, student_id, subject_id, grade_date, group_ids):
+    """Убрать оценку из ячейки закешированных матриц"""
+    if subject_id is None or student_id is None:
+        return
+
+    def remove(matrix):
+        row = matrix['rows'].get(student_id)
+        if row is None:
+            return False
+        cell = row['grades_by_date'].get(grade_date, [])
+        removed = [item for item in cell if item['id'] == grade_id]
+        if not removed:
+            return False
+        cell.remove(removed[0])
+        row['sum'] -= removed[0]['mark']
+        row['count'] -= 1
+        if not cell:
+            del row['grades_by_date'][grade_date]
+            if not any(grade_date in other['grades_by_date'] for other in matrix['rows'].values()):
+                matrix['dates'].remove(grade_date)
+        return True
+
+    _patch_matrices(group_ids, subject_id, grade_date.year, grade_date.month, remove)
+
+
+def build_group_journal(group_id, year, month, student_ids=None):
+    """Журнал группы за месяц по всем предметам одним запросом к оценкам
+
+    Оценки всех предметов читаются одним диапазоном по дате и за один
+    проход раскладываются в предмет × студент × дата. Возвращает
+    {'students', 'subjects', 'overview', 'overall_average', 'total_grades'}:
+    у предмета — даты, ячейки [(студент, дата, оценка, страницы)] по
+    индексам students и dates и средние по студентам; overview — средние
+    студента по предметам для сводной таблицы. student_ids ограничивает
+    видимых студентов (журнал преподавателя).
+    """
+    start, end = month_range(year, month)
+    students = Student.objects.filter(group__id=group_id, student_status='active')
+    if student_ids is not None:
+        students = students.filter(id__in=student_ids)
+    students = list(students.order_by('name').values('id', 'name'))
+    student_index = {student['id']: index for index, student in enumerate(students)}
+
+    grades = list(Grade.objects.filter(
+        student_id__in=student_index, date__gte=start, date__lt=end, subject__isnull=False
+    ).order_by('date', 'id').values_list('subject_id', 'student_id', 'date', 'mark', 'pages'))
+
+    graded = {subject_id for subject_id, *_ in grades}
+    subjects = {
+        subject['id']: {
+            **subject, 'dates': [], 'cells': [],
+            'sums': [0] * len(students), 'counts': [0] * len(students),
+        }
+        for subject in Subject.objects.filter(
+            Q(schedule__group__id=group_id) | Q(id__in=graded)
+        ).distinct().order_by('name').values('id', 'name')
+    }
+
+    date_index = {}
+    for subject_id, student_id, grade_date, mark, pages in grades:
+        subject = subjects[subject_id]
+        column = date_index.setdefault((subject_id, grade_date), len(subject['dates']))
+        if column == len(subject['dates']):
+            subject['dates'].append(grade_date)
+        row = student_index[student_id]
+        subject['cells'].append((row, column, mark, pages))
+        subject['sums'][row] += mark
+        subject['counts'][row] += 1
+
+    total_sum = total_count = 0
+    student_sums = [0] * len(students)
+    student_counts = [0] * len(students)
+    for subject in subjects.values():
+        sums, counts = subject.pop('sums'), subject.pop('counts')
+        subject['averages'] = [round(total / count, 2) if count else None for total, count in zip(sums, counts)]
+        subject['total_grades'] = sum(counts)
+        subject['average'] = round(sum(sums) / subject['total_grades'], 2) if subject['total_grades'] else 0
+        total_sum += sum(sums)
+        total_count += subject['total_grades']
+        for row, (total, count) in enumerate(zip(sums, counts)):
+            student_sums[row] += total
+            student_counts[row] += count
+
+    subjects = list(subjects.values())
+    overview = [
+        {
+            'student': student,
+            'averages': [subject['averages'][row] for subject in subjects],
+            'average': round(student_sums[row] / student_counts[row], 2) if student_counts[row] else None,
+        }
+        for row, student in enumerate(students)
+    ]
+    return {
+        'students': students,
+        'subjects': subjects,
+        'overview': overview,
+        'overall_average': round(total_sum / total_count, 2) if total_count else 0,
+        'total_grades': total_count,
+    }
+
+
+def group_journal_payload(journal):
+    """Журнал группы для json_script: переключение предметов без запросов к серверу"""
+    return {
+        'students': journal['students'],
+        'subjects': [
+            {**subject, 'dates': [grade_date.isoformat() for grade_date in subject['dates']]}
+            for subject in journal['subjects']
+        ],
+    }
+
+
+def matrix_context(matrix, visible_ids=None):
+    """Данные для шаблона: строки, отсортированные по среднему баллу"""
+    rows = list(matrix['rows'].values())
+    dates = matrix['dates']
+    class_average = matrix['class_average']
+    best_average = matrix['best_average']
+    total_grades = matrix['total_grades']
+
+    if visible_ids is not None:
+        rows = [row for row in rows if row['student']['id'] in visible_ids]
+        visible = {'rows': {row['student']['id']: row for row in rows}}
+        _refresh_totals(visible)
+        class_average = visible['class_average']
+        best_average = visible['best_average']
+        total_grades = visible['total_grades']
+        dates = sorted({grade_date for row in rows for grade_date in row['grades_by_date']})
+
+    rows.sort(key=lambda row: row['average'], reverse=True)
+
+    return {
+        'students_data': rows,
+        'dates': dates,
+        'class_average': class_average,
+        'best_average': best_average,
+        'total_grades': total_grades,
+    }
+
+
+def matrix_payload(matrix_data):
+    """Матрица журнала параллельными массивами для клиентской таблицы
+
+    matrix_data — результат matrix_context, строки в том же порядке, что
+    и на странице. Оценки i-го студента — элементы [offsets[i],
+    offsets[i + 1]) массивов columns, marks, pages, grade_ids и teachers;
+    columns — индекс даты в dates, teachers — индекс в teacher_names.
+    """
+    column_of = {grade_date: index for index, grade_date in enumerate(matrix_data['dates'])}
+    teacher_names = []
+    teacher_index = {}
+    payload = {
+        'student_ids': [], 'names': [], 'averages': [],
+        'dates': [grade_date.isoformat() for grade_date in matrix_data['dates']],
+        'offsets': [0], 'columns': [], 'marks': [], 'pages': [], 'grade_ids': [], 'teachers': [],
+        'teacher_names': teacher_names,
+        'class_average': matrix_data['class_average'],
+        'best_average': matrix_data['best_average'],
+        'total_grades': matrix_data['total_grades'],
+    }
+    for row in matrix_data['students_data']:
+        payload['student_ids'].append(row['student']['id'])
+        payload['names'].append(row['student']['name'])
+        payload['averages'].append(row['average'])
+        for grade_date in sorted(row['grades_by_date']):
+            for cell in row['grades_by_date'][grade_date]:
+                teacher = teacher_index.setdefault(cell['teacher_name'], len(teacher_names))
+                if teacher == len(teacher_names):
+                    teacher_names.append(cell['teacher_name'])
+                payload['columns'].append(column_of[grade_date])
+                payload['marks'].append(cell['mark'])
+                payload['pages'].append(cell['pages'])
+                payload['grade_ids'].append(cell['id'])
+                payload['teachers'].append(teacher)
+        payload['offsets'].append(len(payload['marks']))
+    return payload
+
+
+# Учебный год начинается в сентябре: 2024 — это сентябрь 2024 — август 2025
+ACADEMIC_YEAR_START_MONTH = 9
+
+
+def academic_year_months(start_year):
+    """[(год, месяц)] учебного года по порядку"""
+    return [
+        (start_year + (month < ACADEMIC_YEAR_START_MONTH), month)
+        for month in [*range(ACADEMIC_YEAR_START_MONTH, 13), *range(1, ACADEMIC_YEAR_START_MONTH)]
+    ]
+
+
+def academic_year_of(day):
+    """Учебный год, в который попадает дата"""
+    return day.year if day.month >= ACADEMIC_YEAR_START_MONTH else day.year - 1
+
+
+def _diary_month_cells(student_id, year, month):
+    """Ячейки месяца одним сгруппированным запросом: (предмет, день) → итог"""
+    start, end = month_range(year, month)
+    rows = Grade.objects.filter(
+        student_id=student_id, date__gte=start, date__lt=end, subject__isnull=False
+    ).values('subject_id', 'date').annotate(
+        mark=Round(Avg('mark'), 2),
+        count=Count('id'),
+        pages=Sum('pages'),
+        teacher=Max('teacher__name'),
+    ).order_by()
+    return {(row['subject_id'], row['date']): row for row in rows}
+
+
+def _academic_year_stats(start_year):
+    """Условие на StudentMonthlyStats: месяцы учебного года"""
+    return (
+        Q(year=start_year, month__gte=ACADEMIC_YEAR_START_MONTH) |
+        Q(year=start_year + 1, month__lt=ACADEMIC_YEAR_START_MONTH)
+    )
+
+
+def _diary_year_cells(student_id, start_year):
+    """Ячейки учебного года из месячной сводки: (предмет, 1-е число месяца) → итог"""
+    rows = StudentMonthlyStats.objects.filter(
+        _academic_year_stats(start_year), student_id=student_id
+    ).values('subject_id', 'year', 'month', 'average', 'grade_count', 'sum_pages')
+    return {
+        (row['subject_id'], date(row['year'], row['month'], 1)): {
+            'mark': row['average'], 'count': row['grade_count'], 'pages': row['sum_pages'], 'teacher': None,
+        }
+        for row in rows
+    }
+
+
+def _diary_averages(student_id, period):
+    """Средний балл и число оценок по предметам за период — в SQL"""
+    rows = StudentMonthlyStats.objects.filter(period, student_id=student_id).values('subject_id').annotate(
+        marks=Sum('sum_marks'),
+        count=Sum('grade_count'),
+        average=Round(Sum('sum_marks') / NullIf(Sum('grade_count'), 0), 2),
+    ).order_by()
+    return {row['subject_id']: row for row in rows}
+
+
+def build_diary(student_id, group_ids, year, month=None):
+    """Дневник студента плотными строками
+
+    month=None — учебный год, начинающийся в year, с колонками-месяцами
+    (1-е число месяца); иначе — месяц с колонками-днями, в которые есть
+    оценки. В строке {'subject', 'cells', 'average'} ячейки идут
+    параллельно columns (None — оценок нет), и шаблон перебирает их подряд
+    без поиска по словарям. Три запроса: предметы, ячейки, средние.
+    """
+    if month is None:
+        cells = _diary_year_cells(student_id, year)
+        columns = [date(column_year, column_month, 1) for column_year, column_month in academic_year_months(year)]
+        period = _academic_year_stats(year)
+    else:
+        cells = _diary_month_cells(student_id, year, month)
+        columns = sorted({column for _, column in cells})
+        period = Q(year=year, month=month)
+
+    averages = _diary_averages(student_id, period)
+    graded = {subject_id for subject_id, _ in cells}
+    subjects = Subject.objects.filter(
+        Q(schedule__group__in=group_ids) | Q(id__in=graded)
+    ).distinct().order_by('name').values('id', 'name')
+
+    rows = [
+        {
+            'subject': subject,
+            'cells': [cells.get((subject['id'], column)) for column in columns],
+            'average': averages.get(subject['id'], {}).get('average') or 0,
+        }
+        for subject in subjects
+    ]
+    marks = sum(row['marks'] for row in averages.values())
+    count = sum(row['count'] for row in averages.values())
+    return {
+        'columns': columns,
+        'rows': rows,
+        'graded_columns': len({column for _, column in cells}),
+        'best_average': max((row['average'] for row in rows), default=0),
+        'overall_average': round(marks / count, 2) if count else 0,
+    }
+
+
+def latest_change_cursor():
+    """Курсор конца ленты изменений: с него клиент продолжает после полной загрузки
+
+    Позиции выдаются в порядке фиксации, поэтому всё, что окажется в
+    ленте позже, получит позицию больше этого курсора.
+    """
+    return GradeChange.objects.aggregate(top=Max('feed_id'))['top'] or 0
+
+
+def grade_changes(since, student_ids=None, limit=CHANGES_PAGE_SIZE):
+    """Изменения оценок после курсора since: (записи, следующий курсор, есть ли ещё, reset)
+
+    student_ids ограничивает ленту студентами (None — все). Страница
+    читается по индексу с feed_id > since, поэтому цена запроса зависит
+    от числа изменений, а не от числа оценок за месяц.
+
+    reset — клиенту нужно загрузить данные заново: после его курсора
+    журнал начат заново (очистка, восстановление из копии) или курсор
+    впереди ленты. Тогда записей нет, а курсор — конец ленты.
+    """
+    changes = GradeChange.objects.filter(feed_id__gt=since)
+    if student_ids is not None:
+        changes = changes.filter(Q(student_id__in=student_ids) | Q(action=GradeChange.RESET))
+    rows = list(changes.order_by('feed_id')[:limit + 1])
+    if any(row.action == GradeChange.RESET for row in rows):
+        return [], latest_change_cursor(), False, True
+    if not rows:
+        latest = latest_change_cursor()
+        return [], min(since, latest), False, since > latest
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, rows[-1].feed_id, has_more, False
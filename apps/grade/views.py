@@ -1,29 +1,38 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
 from django.db.models import Q, Avg, Prefetch, Count
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from datetime import datetime, date, timedelta
-from collections import defaultdict
-from .models import Grade
+import json
+from functools import partial
+from asgiref.sync import sync_to_async
+from .models import GRADE_DATE_WINDOW, Grade, GradeChange, StudentMonthlyStats
 from .forms import GradeForm
+from .utils import (
+    VIRTUAL_TABLE_MIN_ROWS, academic_year_of, build_diary, build_group_journal, get_matrix,
+    group_journal_payload, latest_change_cursor, matrix_context, matrix_payload, month_range,
+    patch_grades_added
+)
+from .export import export_response, journal_rows, group_rows, school_rows
+from .live import grade_channel, missed_events, record_changes
+from apps.dashboard.events import event_stream
 from apps.group.models import Group
 from apps.schedule.models import Subject
 from apps.student.models import Student
-from apps.teacher.models import Teacher
+from apps.user.utils import is_admin
 
 
 @login_required
 def group_list(request):
     """Список групп для журнала"""
-    groups = Group.objects.select_related('course').annotate(
-        student_count=Count('student', filter=Q(student__student_status='active'))
-    ).order_by('title')
+    groups = Group.objects.select_related('course').order_by('title')
 
     if request.user.role == 'teacher':
-        teacher = get_object_or_404(Teacher, user=request.user)
-        groups = groups.filter(teacher=teacher)
+        groups = groups.filter(id__in=request.profile.require('teacher').group_ids)
     
     context = {
         'groups': groups
@@ -50,24 +59,39 @@ def subject_list(request, pk):
     return render(request, 'grade/subject_list.html', context)
 
 
+def _journal_month(request):
+    """(год, месяц) из ?month=YYYY-MM, по умолчанию текущий"""
+    try:
+        year, month = map(int, request.GET.get('month', '').split('-'))
+        date(year, month, 1)
+    except ValueError:
+        today = date.today()
+        year, month = today.year, today.month
+    return year, month
+
+
+def _journal_matrix(request, group, subject, year, month):
+    """Матрица журнала из кеша; преподаватель видит только студентов своих групп"""
+    matrix = get_matrix(group.id, subject.id, year, month)
+
+    visible_ids = None
+    if request.user.role == 'teacher':
+        visible_ids = set(Student.objects.filter(
+            group=group
+        ).filter(
+            group__in=request.profile.require('teacher').group_ids
+        ).values_list('id', flat=True))
+
+    return matrix_context(matrix, visible_ids)
+
+
 @login_required
 def grade_list(request, group_pk, subject_pk):
     """Журнал оценок для группы и предмета"""
     group = get_object_or_404(Group, id=group_pk)
     subject = get_object_or_404(Subject, id=subject_pk)
     
-    # Получаем дату из параметров
-    date_param = request.GET.get('month')
-    if date_param:
-        try:
-            year, month = map(int, date_param.split('-'))
-        except (ValueError, AttributeError):
-            today = datetime.now()
-            year, month = today.year, today.month
-    else:
-        today = datetime.now()
-        year, month = today.year, today.month
-    
+    year, month = _journal_month(request)
     date_filter = f'{year}-{month:02}'
     current_date = date.today()  # Определяем current_date в начале функции
     
@@ -76,7 +100,7 @@ def grade_list(request, group_pk, subject_pk):
         if request.user.role != 'teacher':
             return JsonResponse({'success': False, 'error': 'Недостаточно прав'})
         
-        teacher = get_object_or_404(Teacher, user=request.user)
+        teacher_id = request.profile.require('teacher').pk
         
         try:
             with transaction.atomic():
@@ -101,7 +125,7 @@ def grade_list(request, group_pk, subject_pk):
                     return JsonResponse({'success': False, 'error': 'Дата должна быть в пределах 3 дней от сегодня'})
                 
                 grade = Grade.objects.create(
-                    teacher=teacher,
+                    teacher_id=teacher_id,
                     student=student,
                     mark=mark,
                     subject=subject,
@@ -122,7 +146,7 @@ def grade_list(request, group_pk, subject_pk):
     
     # Обработка обычного POST запроса
     elif request.method == 'POST' and request.user.role == 'teacher':
-        teacher = get_object_or_404(Teacher, user=request.user)
+        teacher_id = request.profile.require('teacher').pk
         
         try:
             with transaction.atomic():
@@ -139,7 +163,7 @@ def grade_list(request, group_pk, subject_pk):
                     return redirect('grade:list', group_pk=group_pk, subject_pk=subject_pk)
                 
                 Grade.objects.create(
-                    teacher=teacher,
+                    teacher_id=teacher_id,
                     student=student,
                     mark=mark,
                     subject=subject,
@@ -153,102 +177,229 @@ def grade_list(request, group_pk, subject_pk):
         except Exception as e:
             messages.error(request, f'Произошла ошибка: {str(e)}')
     
-    # Оптимизированный запрос студентов с предзагрузкой оценок
-    students = Student.objects.filter(
-        group=group,
-        student_status='active'
-    ).select_related('user').prefetch_related(
-        Prefetch(
-            'grade_set',
-            queryset=Grade.objects.filter(
-                subject=subject,
-                date__year=year,
-                date__month=month
-            ).select_related('teacher__user').order_by('date'),
-            to_attr='monthly_grades'
-        )
-    ).order_by('name')
-    
-    # Фильтрация для преподавателей
-    if request.user.role == 'teacher':
-        teacher = get_object_or_404(Teacher, user=request.user)
-        students = students.filter(group__teacher=teacher)
-    
-    # Получаем все уникальные даты за месяц
-    dates_qs = Grade.objects.filter(
-        subject=subject,
-        date__year=year,
-        date__month=month,
-        student__in=students
-    ).values_list('date', flat=True).distinct().order_by('date')
-    
-    sorted_dates = list(dates_qs)
-    
-    # Создаем структуру данных для таблицы
-    grade_matrix = {}
-    student_averages = {}
-    total_grades = 0
-    total_sum = 0
-    
-    for student in students:
-        grade_matrix[student.id] = {}
-        student_grades = []
-        
-        for grade in student.monthly_grades:
-            if grade.date not in grade_matrix[student.id]:
-                grade_matrix[student.id][grade.date] = []
-            grade_matrix[student.id][grade.date].append(grade)
-            student_grades.append(grade.mark)
-            total_grades += 1
-            total_sum += grade.mark
-        
-        # Вычисляем средний балл студента
-        if student_grades:
-            student_averages[student.id] = round(sum(student_grades) / len(student_grades), 2)
-        else:
-            student_averages[student.id] = 0
-    
-    # Общая статистика
-    class_average = round(total_sum / total_grades, 2) if total_grades > 0 else 0
-    best_average = max(student_averages.values()) if student_averages.values() else 0
-    
-    # Сортируем студентов по средней оценке (по убыванию)
-    students = sorted(students, key=lambda s: student_averages[s.id], reverse=True)
-    
-    # Создаем удобную структуру для шаблона
-    students_data = []
-    for student in students:
-        student_data = {
-            'student': student,
-            'average': student_averages[student.id],
-            'grades_by_date': {}
-        }
-        
-        for grade_date in sorted_dates:
-            if grade_date in grade_matrix[student.id]:
-                student_data['grades_by_date'][grade_date] = grade_matrix[student.id][grade_date]
-            else:
-                student_data['grades_by_date'][grade_date] = []
-        
-        students_data.append(student_data)
-    
+    # Курсор ленты берётся до чтения журнала: поток событий досылает всё,
+    # что изменится между ними (повтор уже показанного безвреден)
+    cursor = latest_change_cursor()
+    matrix_data = _journal_matrix(request, group, subject, year, month)
+
+    # Большой журнал рисуется в браузере из grade:matrix — только видимая часть
+    view = request.GET.get('view')
+    virtual = view == 'virtual' or (
+        view != 'table' and len(matrix_data['students_data']) >= VIRTUAL_TABLE_MIN_ROWS
+    )
+
     context = {
-        'students_data': students_data,
+        **matrix_data,
         'subject': subject,
         'group': group,
-        'dates': sorted_dates,
         'date_filter': date_filter,
         'current_month': f'{year}-{month:02}',
         'can_edit': request.user.role == 'teacher',
-        'class_average': class_average,
-        'best_average': best_average,
-        'total_grades': total_grades,
         'today': current_date,
+        'virtual': virtual,
+        # Поток SSE держит только ASGI: отдельный сервис (LIVE_EVENTS) или сам этот процесс;
+        # иначе страница перезагружается после изменений
+        'live': settings.LIVE_EVENTS or isinstance(request, ASGIRequest),
+        'cursor': cursor,
     }
     
     return render(request, 'grade/list.html', context)
 
 
+@login_required
+def grade_matrix(request, group_pk, subject_pk):
+    """Матрица журнала параллельными массивами (JSON) для виртуальной таблицы
+
+    Те же данные, что и у grade_list, но без HTML: браузер рисует только
+    видимые строки и столбцы. cursor — курсор ленты, взятый до чтения
+    журнала: с него страница снова подписывается на поток событий.
+    """
+    group = get_object_or_404(Group, id=group_pk)
+    subject = get_object_or_404(Subject, id=subject_pk)
+    year, month = _journal_month(request)
+    cursor = latest_change_cursor()
+    payload = matrix_payload(_journal_matrix(request, group, subject, year, month))
+    return JsonResponse({**payload, 'cursor': cursor})
+
+
+def _can_watch_group(request, group_pk):
+    """Журнал группы виден администратору и преподавателю этой группы"""
+    profile = request.profile
+    return Group.objects.filter(id=group_pk).exists() and (
+        profile.is_admin or profile.is_teacher and group_pk in profile.group_ids
+    )
+
+
+@login_required
+async def grade_events(request, group_pk, subject_pk):
+    """Живые изменения ячеек журнала (Server-Sent Events, только под ASGI)
+
+    Канал — группа, предмет и месяц из ?month=YYYY-MM. Каждое событие —
+    одно изменение оценки (action, grade, student, date, mark, ...), id
+    события — курсор ленты изменений. ?since= — курсор, взятый страницей
+    до чтения журнала: изменения после него досылаются сразу.
+    """
+    if not await sync_to_async(_can_watch_group)(request, group_pk):
+        raise Http404
+    year, month = _journal_month(request)
+
+    # Досылаем пропущенное из ленты изменений: после курсора страницы при первом
+    # подключении, после Last-Event-ID — при переподключении браузера
+    backlog = None
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since', '')
+    if since.isdigit():
+        backlog = sync_to_async(partial(missed_events, group_pk, subject_pk, year, month, int(since)))
+
+    response = StreamingHttpResponse(
+        event_stream(grade_channel(group_pk, subject_pk, year, month), backlog),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+def group_journal(request, pk):
+    """Журнал группы за месяц по всем предметам
+
+    Все оценки месяца читаются одним запросом; сводная таблица рисуется
+    на сервере, таблицы предметов — в браузере из json_script, поэтому
+    переключение предметов не обращается к серверу.
+    """
+    group = get_object_or_404(Group.objects.select_related('course'), id=pk)
+    profile = request.profile
+    if not (profile.is_admin or profile.is_teacher and group.id in profile.group_ids):
+        raise Http404
+
+    year, month = _journal_month(request)
+    journal = build_group_journal(group.id, year, month)
+
+    context = {
+        'group': group,
+        'journal': journal,
+        'payload': group_journal_payload(journal),
+        'date_filter': f'{year}-{month:02}',
+    }
+    return render(request, 'grade/group_journal.html', context)
+
+
+@login_required
+def journal_students(request, group_pk, subject_pk):
+    """Студенты группы для окон «Добавить оценку» и «Оценки за день» (AJAX, JSON)
+
+    Окна журнала общие для всей страницы, список студентов подгружается
+    при первом открытии и не входит в HTML журнала.
+    """
+    if request.user.role != 'teacher':
+        return JsonResponse({'success': False, 'error': 'Недостаточно прав'}, status=403)
+
+    group = get_object_or_404(Group, id=group_pk)
+    students = []
+    if group.id in request.profile.require('teacher').group_ids:
+        students = list(Student.objects.filter(
+            group=group,
+            student_status='active'
+        ).order_by('name').values('id', 'name'))
+
+    return JsonResponse({'success': True, 'students': students})
+
+
+@login_required
+def batch_create(request, group_pk, subject_pk):
+    """Сохранение оценок за один день для всей группы (AJAX, JSON)
+
+    Тело запроса: {"date": "YYYY-MM-DD", "grades": [{"student_id": 1, "mark": 5, "pages": 2}, ...]}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Метод не поддерживается'}, status=405)
+    if request.user.role != 'teacher':
+        return JsonResponse({'success': False, 'error': 'Недостаточно прав'}, status=403)
+
+    group = get_object_or_404(Group, id=group_pk)
+    subject = get_object_or_404(Subject, id=subject_pk)
+    teacher_id = request.profile.require('teacher').pk
+
+    try:
+        payload = json.loads(request.body)
+        if not isinstance(payload, dict):
+            raise TypeError
+        grade_date = datetime.strptime(payload.get('date'), '%Y-%m-%d').date()
+        rows = payload.get('grades') or []
+        if not isinstance(rows, list):
+            raise TypeError
+    except (ValueError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Неверный формат данных'}, status=400)
+
+    if abs(grade_date - date.today()) > GRADE_DATE_WINDOW:
+        return JsonResponse({
+            'success': False,
+            'error': f'Дата должна быть в пределах {GRADE_DATE_WINDOW.days} дней от сегодня'
+        })
+
+    # Одним запросом получаем студентов группы из запроса
+    requested_ids = set()
+    for row in rows:
+        try:
+            requested_ids.add(int(row.get('student_id')))
+        except (AttributeError, ValueError, TypeError):
+            pass
+    group_student_ids = set(Student.group.through.objects.filter(
+        group_id=group.id,
+        student_id__in=requested_ids
+    ).values_list('student_id', flat=True))
+
+    results = []
+    grades = []
+    for row in rows:
+        try:
+            student_id = int(row.get('student_id'))
+            mark = float(row.get('mark'))
+            pages = int(row.get('pages') or 0)
+        except (AttributeError, ValueError, TypeError):
+            results.append({'student_id': row.get('student_id') if isinstance(row, dict) else None,
+                            'success': False, 'error': 'Неверный формат данных'})
+            continue
+
+        if not (1 <= mark <= 5):
+            results.append({'student_id': student_id, 'success': False, 'error': 'Оценка должна быть от 1 до 5'})
+            continue
+        if student_id not in group_student_ids:
+            results.append({'student_id': student_id, 'success': False, 'error': 'Студент не принадлежит к этой группе'})
+            continue
+
+        grade = Grade(
+            teacher_id=teacher_id,
+            student_id=student_id,
+            mark=mark,
+            subject=subject,
+            date=grade_date,
+            pages=pages
+        )
+        grade.clean()
+        grades.append(grade)
+        results.append({'student_id': student_id, 'success': True})
+
+    with transaction.atomic():
+        created = Grade.objects.bulk_create(grades)
+        StudentMonthlyStats.apply_grades(created)
+        # bulk_create не вызывает сигналы — сводку, кеш журнала и журнал изменений обновляем вручную
+        # (кеш — раньше, чем изменения получат позиции в ленте, как и в сигналах)
+        transaction.on_commit(lambda: patch_grades_added(created))
+        record_changes(created, GradeChange.CREATED)
+
+    created_iter = iter(created)
+    for result in results:
+        if result['success']:
+            result['grade_id'] = next(created_iter).pk
+
+    return JsonResponse({
+        'success': True,
+        'created': len(created),
+        'results': results,
+    })
+
+
 @login_required
 def diary(request):
     """Дневник студента"""
@@ -256,61 +407,34 @@ def diary(request):
         messages.error(request, 'Доступ только для студентов.')
         return redirect('dashboard:dashboard')
     
-    student = get_object_or_404(Student, user=request.user)
-    
-    # Получаем дату из параметров
-    date_param = request.GET.get('month')
-    if date_param:
+    student = request.profile.require('student')
+    today = date.today()
+
+    # ?year=2024 — учебный год 2024/25 по месяцам, иначе ?month=2024-03
+    year_param = request.GET.get('year', '')
+    if year_param.isdigit() and 1 <= int(year_param) < 9999:
+        year, month = int(year_param), None
+    else:
         try:
-            year, month = map(int, date_param.split('-'))
-        except (ValueError, AttributeError):
-            today = datetime.now()
+            year, month = map(int, request.GET.get('month', '').split('-'))
+            date(year, month, 1)
+        except ValueError:
             year, month = today.year, today.month
+
+    diary = build_diary(student.pk, student.group_ids, year, month)
+    if month is None:
+        academic_year, shown = year, today
     else:
-        today = datetime.now()
-        year, month = today.year, today.month
-    
-    date_filter = f'{year}-{month:02}'
-    
-    # Получаем предметы студента
-    subjects = Subject.objects.filter(
-        schedule__group__in=student.group.all()
-    ).distinct().order_by('name')
-    
-    # Получаем оценки за месяц с предзагрузкой
-    grades_qs = Grade.objects.filter(
-        student=student,
-        date__year=year,
-        date__month=month
-    ).select_related('subject', 'teacher').order_by('date')
-    
-    # Группируем оценки по предметам и датам
-    grades_by_subject_date = defaultdict(lambda: defaultdict(list))
-    all_dates = set()
-    
-    for grade in grades_qs:
-        grades_by_subject_date[grade.subject.id][grade.date].append(grade)
-        all_dates.add(grade.date)
-    
-    # Сортируем даты
-    sorted_dates = sorted(all_dates)
-    
-    # Вычисляем средние оценки по предметам
-    subject_averages = {}
-    for subject in subjects:
-        subject_grades = [g.mark for g in grades_qs if g.subject_id == subject.id]
-        if subject_grades:
-            subject_averages[subject.id] = round(sum(subject_grades) / len(subject_grades), 2)
-        else:
-            subject_averages[subject.id] = 0
-    
+        shown = date(year, month, 1)
+        academic_year = academic_year_of(shown)
+
     context = {
         'student': student,
-        'subjects': subjects,
-        'dates': sorted_dates,
-        'date_filter': date_filter,
-        'grades_by_subject_date': dict(grades_by_subject_date),
-        'subject_averages': subject_averages,
+        'diary': diary,
+        'mode': 'year' if month is None else 'month',
+        'date_filter': f'{shown.year}-{shown.month:02}',
+        'academic_year': academic_year,
+        'academic_year_end': academic_year + 1,
     }
     
     return render(request, 'grade/diary.html', context)
@@ -326,10 +450,10 @@ def delete(request, group_pk, subject_pk, pk):
         return redirect('grade:list', group_pk=group_pk, subject_pk=subject_pk)
     
     grade = get_object_or_404(Grade, id=pk)
-    teacher = get_object_or_404(Teacher, user=request.user)
+    teacher_id = request.profile.require('teacher').pk
     
     # Проверяем, что преподаватель может удалить эту оценку
-    if grade.teacher != teacher:
+    if grade.teacher_id != teacher_id:
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({'success': False, 'error': 'Вы можете удалять только свои оценки'})
         messages.error(request, 'Вы можете удалять только свои оценки.')
@@ -344,3 +468,63 @@ def delete(request, group_pk, subject_pk, pk):
     
     messages.success(request, f'Оценка {mark} для {student_name} удалена.')
     return redirect('grade:list', group_pk=group_pk, subject_pk=subject_pk)
+
+
+def _export_period(request):
+    """Период выгрузки из ?start=YYYY-MM-DD&end=YYYY-MM-DD (конец включительно)
+    или ?month=YYYY-MM
+
+    По умолчанию — текущий месяц. Возвращает полуоткрытый интервал [start, end).
+    """
+    if request.GET.get('month'):
+        try:
+            year, month = map(int, request.GET['month'].split('-'))
+            return month_range(year, month)
+        except ValueError:
+            pass
+    try:
+        start = datetime.strptime(request.GET.get('start', ''), '%Y-%m-%d').date()
+        end = datetime.strptime(request.GET.get('end', ''), '%Y-%m-%d').date() + timedelta(days=1)
+    except ValueError:
+        today = date.today()
+        return month_range(today.year, today.month)
+    return start, end
+
+
+@login_required(login_url='user:login')
+@is_admin
+def export_journal(request, group_pk, subject_pk):
+    """Выгрузка журнала группы по предмету (CSV/XLSX)"""
+    group = get_object_or_404(Group, id=group_pk)
+    subject = get_object_or_404(Subject, id=subject_pk)
+    start, end = _export_period(request)
+    header, rows = journal_rows(group, subject, start, end)
+    return export_response(
+        f'journal_{group.id}_{subject.id}_{start:%Y%m%d}',
+        header, rows, request.GET.get('format', 'csv'), sheet_title=f'{group.title} - {subject.name}'
+    )
+
+
+@login_required(login_url='user:login')
+@is_admin
+def export_group(request, pk):
+    """Выгрузка всех оценок группы по всем предметам (CSV/XLSX)"""
+    group = get_object_or_404(Group, id=pk)
+    start, end = _export_period(request)
+    header, rows = group_rows(group, start, end)
+    return export_response(
+        f'group_{group.id}_{start:%Y%m%d}',
+        header, rows, request.GET.get('format', 'csv'), sheet_title=group.title or 'Группа'
+    )
+
+
+@login_required(login_url='user:login')
+@is_admin
+def export_school(request):
+    """Выгрузка всех оценок школы за период (CSV/XLSX)"""
+    start, end = _export_period(request)
+    header, rows = school_rows(start, end)
+    return export_response(
+        f'grades_{start:%Y%m%d}_{end - timedelta(days=1):%Y%m%d}',
+        header, rows, request.GET.get('format', 'csv'), sheet_title='Оценки'
+    )
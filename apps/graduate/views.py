@@ -1,11 +1,11 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
 from django.core.paginator import Paginator
 from .models import Graduate, GraduateAchievement
 from .forms import GraduateForm, GraduateAchievementForm, MakeGraduateForm
 from apps.student.models import Student
+from apps.dashboard.search import search
 
 
 @login_required
@@ -16,12 +16,7 @@ def graduate_list(request):
     # Поиск
     search_query = request.GET.get('search', '')
     if search_query:
-        graduates = graduates.filter(
-            Q(student__name__icontains=search_query) |
-            Q(student__user__first_name__icontains=search_query) |
-            Q(student__user__last_name__icontains=search_query) |
-            Q(diploma_number__icontains=search_query)
-        )
+        graduates = search(graduates, search_query)
     
     # Фильтр по году выпуска
     year_filter = request.GET.get('year', '')
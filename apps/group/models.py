@@ -7,6 +7,8 @@ class Group(models.Model):
 
     title = models.CharField(max_length=40, null=True)
     course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True)
+    # Поддерживается сигналами (apps.dashboard.counters), чинится командой reconcile_counters
+    active_students_count = models.IntegerField(default=0, editable=False, verbose_name='Активных студентов')
 
 
     class Meta:
@@ -1,3 +1,59 @@
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from apps.dashboard.models import Course
+from apps.dashboard.queries import QueryTracker
+from apps.student.models import Student
+from apps.teacher.models import Teacher
+from apps.user.models import User
+from .models import Group
+
+
+class GroupListTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = Course.objects.create(title='Хифз')
+        self.client.force_login(User.objects.create_user(username='admin', role='admin'))
+
+    def add_group(self, title, students=2, teachers=4):
+        group = Group.objects.create(title=title, course=self.course)
+        for index in range(students):
+            Student.objects.create(name=f'{title} студент {index}').group.add(group)
+        for index in range(teachers):
+            Teacher.objects.create(name=f'{title} учитель {index}').group.add(group)
+        return group
+
+    def get(self, **params):
+        with QueryTracker() as tracker:
+            response = self.client.get(reverse('group:list'), params)
+        return response, tracker
+
+    def test_counts_and_first_teachers(self):
+        self.add_group('Альфа', students=3, teachers=5)
+        response, _ = self.get()
+        group = response.context['page_obj'][0]
+        self.assertEqual((group.students_count, group.teachers_count), (3, 5))
+        self.assertEqual([teacher.name for teacher in group.first_teachers],
+                         ['Альфа учитель 0', 'Альфа учитель 1', 'Альфа учитель 2'])
+        self.assertContains(response, '+2')
+
+    def test_query_count_does_not_grow_with_groups(self):
+        self.add_group('Первая')
+        self.get()
+        _, tracker = self.get()
+        baseline = tracker.count
+
+        for index in range(15):
+            self.add_group(f'Группа {index}')
+        response, tracker = self.get()
+        self.assertEqual(len(response.context['page_obj']), 12)
+        self.assertEqual(tracker.count, baseline, tracker.report())
+
+    def test_search_by_title_and_course(self):
+        self.add_group('Альфа')
+        other = Group.objects.create(title='Бета', course=Course.objects.create(title='Таджвид'))
+        response, _ = self.get(**{'group-search': 'Альф'})
+        self.assertEqual([group.title for group in response.context['page_obj']], ['Альфа'])
+        response, _ = self.get(**{'group-search': 'Таджвид'})
+        self.assertEqual([group.id for group in response.context['page_obj']], [other.id])
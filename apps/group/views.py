@@ -3,7 +3,9 @@ from django.contrib.auth.decorators import login_required
 from apps.student.models import *
 from apps.teacher.models import *
 from .models import *
-from django.db.models import Count
+from django.core.paginator import Paginator
+from django.db.models import Count, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib import messages
 from apps.schedule.models import *
 from .forms import *
@@ -28,31 +30,60 @@ def create(request):
     return render(request, 'group/create.html', context)
 
 
+# Групп на странице списка и преподавателей на карточке группы
+GROUPS_PER_PAGE = 12
+GROUP_CARD_TEACHERS = 3
+
+
+def _members_count(through):
+    """Число строк m2m-таблицы для группы подзапросом (без JOIN студентов и преподавателей)"""
+    members = through.objects.filter(group_id=OuterRef('pk')).order_by().values('group_id')
+    return Coalesce(Subquery(members.annotate(total=Count('*')).values('total')), 0)
+
+
 @login_required(login_url='user:login')
 def list(request):
     
     
     form = GroupForm()
-    groups = (
-    Group.objects
-    .select_related("course")                # подтянет курс через JOIN
-    .prefetch_related("teacher_set", "student_set")  # подтянет преподавателей и студентов отдельными запросами
-    .order_by("-id")
-    )
 
     if request.method == 'POST':
         form = GroupForm(request.POST)
         if form.is_valid():
             form.save()
 
-    search_q = request.GET.get('group-search', '')
+    search_q = request.GET.get('group-search', '').strip()
     if request.user.role == 'student':
-        groups = Group.objects.filter(student=request.user.student)
+        groups = Group.objects.filter(id__in=request.profile.group_ids)
     else:
-        groups = Group.objects.all().order_by('-id')
-        
+        groups = Group.objects.all()
+
+    if search_q:
+        groups = groups.filter(Q(title__icontains=search_q) | Q(course__title__icontains=search_q))
+
+    # Счётчики считаются в SQL подзапросами, первые три преподавателя
+    # приходят одним запросом для всей страницы
+    groups = (
+        groups
+        .select_related("course")
+        .annotate(
+            students_count=_members_count(Student.group.through),
+            teachers_count=_members_count(Teacher.group.through),
+        )
+        .prefetch_related(Prefetch(
+            "teacher_set",
+            queryset=Teacher.objects.only("id", "name").order_by("name", "id")[:GROUP_CARD_TEACHERS],
+            to_attr="first_teachers",
+        ))
+        .order_by("-id")
+    )
+
+    paginator = Paginator(groups, GROUPS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
     context = {
-        'groups': groups,
+        'page_obj': page_obj,
+        'search_q': search_q,
         'form': form
     }
     return render(request, 'group/list.html', context)
@@ -63,7 +94,10 @@ def details(request, pk):
     group = get_object_or_404(Group, id=pk)
     teachers = group.teacher_set.all()
     students = group.student_set.all()
-    schedules = group.schedule_set.all()  # Расписание для выбранной группы
+    # Расписание для выбранной группы; преподаватели предметов — одним запросом
+    schedules = group.schedule_set.select_related(
+        'group', 'day', 'subject'
+    ).prefetch_related('subject__teacher_set')
     subject_count = schedules.values('subject__name').annotate(total=Count('id'))
     days = Day.objects.all()  # Все дни недели
 
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class ScheduleConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.schedule'
-    verbose_name = 'Расписание'
\ No newline at end of file
+    verbose_name = 'Расписание'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,36 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from apps.dashboard.models import Course
+from apps.group.models import Group
+from .models import Day, Schedule, Subject
+from .utils import bump_group_schedule, bump_schedule_version
+
+
+@receiver(pre_save, sender=Schedule)
+def schedule_pre_save(sender, instance, **kwargs):
+    """Запоминаем прежнюю группу занятия: её строка тоже устаревает"""
+    instance._previous_group_id = None
+    if instance.pk is not None:
+        instance._previous_group_id = Schedule.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Schedule)
+def schedule_post_save(sender, instance, **kwargs):
+    bump_group_schedule(instance.group_id, getattr(instance, '_previous_group_id', None))
+
+
+@receiver(post_delete, sender=Schedule)
+def schedule_post_delete(sender, instance, **kwargs):
+    bump_group_schedule(instance.group_id)
+
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Day)
+@receiver([post_save, post_delete], sender=Group)
+@receiver([post_save, post_delete], sender=Subject)
+def schedule_reference_changed(sender, **kwargs):
+    """Дни, группы, курсы и предметы видны во всех строках — сбрасываем всё"""
+    bump_schedule_version()
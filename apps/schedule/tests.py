@@ -1,3 +1,157 @@
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from apps.dashboard.queries import QueryTracker
+from apps.group.models import Group
+from apps.student.models import Student
+from apps.user.models import User
+from .models import Day, Schedule, Subject
+from .utils import GROUPS_PER_PAGE, build_grid
+
+
+class ScheduleListTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.days = [Day.objects.create(title=title, order=order)
+                     for order, title in enumerate(['Понедельник', 'Вторник'], 1)]
+        self.subject = Subject.objects.create(name='Таджвид')
+        self.other_subject = Subject.objects.create(name='Фикх')
+        self.group = Group.objects.create(title='Своя группа')
+        self.other = Group.objects.create(title='Чужая группа')
+        Schedule.objects.create(group=self.group, day=self.days[0], subject=self.subject)
+        Schedule.objects.create(group=self.other, day=self.days[1], subject=self.other_subject)
+
+    def test_student_sees_only_own_groups(self):
+        user = User.objects.create_user(username='student', role='student')
+        student = Student.objects.create(user=user, name='Студент')
+        student.group.add(self.group)
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('schedule:list'))
+        self.assertContains(response, 'Своя группа')
+        self.assertContains(response, 'Таджвид')
+        self.assertNotContains(response, 'Чужая группа')
+        self.assertNotContains(response, 'Фикх')
+        self.assertNotContains(response, 'id="addModal"')
+
+        response = self.client.get(reverse('schedule:calendar'))
+        self.assertContains(response, 'Таджвид')
+        self.assertNotContains(response, 'Фикх')
+
+    def test_grid_places_lessons_by_group_and_day(self):
+        rows = {row['group'].title: row for row in build_grid([self.group, self.other], self.days)}
+        own = [[lesson.subject.name for lesson in cell['lessons']] for cell in rows['Своя группа']['cells']]
+        other = [[lesson.subject.name for lesson in cell['lessons']] for cell in rows['Чужая группа']['cells']]
+        self.assertEqual(own, [['Таджвид'], []])
+        self.assertEqual(other, [[], ['Фикх']])
+
+        user = User.objects.create_user(username='admin', role='admin')
+        self.client.force_login(user)
+        response = self.client.get(reverse('schedule:list'))
+        self.assertContains(response, 'Своя группа')
+        self.assertContains(response, 'Чужая группа')
+        self.assertContains(response, 'id="addModal"', count=1)
+        self.assertContains(response, 'id="deleteModal"', count=1)
+
+    def test_admin_groups_paginated(self):
+        for index in range(GROUPS_PER_PAGE + 1):
+            Group.objects.create(title=f'Группа {index}')
+        user = User.objects.create_user(username='admin', role='admin')
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('schedule:list'))
+        self.assertEqual(len(response.context['rows']), GROUPS_PER_PAGE)
+        self.assertContains(response, 'Своя группа')
+        response = self.client.get(reverse('schedule:list'), {'page': 2})
+        self.assertEqual(len(response.context['rows']), 3)
+        self.assertNotContains(response, 'Своя группа')
+
+    def test_only_admin_adds_lessons(self):
+        user = User.objects.create_user(username='student', role='student')
+        Student.objects.create(user=user, name='Студент')
+        self.client.force_login(user)
+
+        self.client.post(reverse('schedule:list'), {
+            'lesson': '', 'group': self.group.id, 'day': self.days[1].id, 'subject': self.subject.id
+        })
+        self.assertEqual(Schedule.objects.count(), 2)
+
+    def test_modals_load_data_on_demand(self):
+        user = User.objects.create_user(username='admin', role='admin')
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('schedule:list'))
+        self.assertNotContains(response, f'<option value="{self.subject.id}">')
+        subjects = self.client.get(reverse('schedule:subject_options')).json()['subjects']
+        self.assertEqual([subject['name'] for subject in subjects], ['Таджвид', 'Фикх'])
+
+        lesson = Schedule.objects.get(group=self.group)
+        data = self.client.get(reverse('schedule:lesson', args=[lesson.id])).json()
+        self.assertEqual(data, {
+            'subject': 'Таджвид',
+            'group': 'Своя группа',
+            'day': 'Понедельник',
+            'delete_url': reverse('schedule:delete', args=[lesson.id]),
+        })
+
+
+class ScheduleCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.day = Day.objects.create(title='Понедельник', order=1)
+        self.subject = Subject.objects.create(name='Таджвид')
+        self.group = Group.objects.create(title='Группа 1')
+        self.other = Group.objects.create(title='Группа 2')
+        self.user = User.objects.create_user(username='admin', role='admin')
+        self.client.force_login(self.user)
+
+    def lesson_queries(self, tracker):
+        return [sql for sql in tracker.queries if '"schedule_schedule"' in sql]
+
+    def test_repeat_request_served_from_cache_and_304(self):
+        url = reverse('schedule:list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with QueryTracker() as tracker:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.lesson_queries(tracker), [])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Subject.objects.create(name='Фикх')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        # Список предметов окна «Добавить занятие» тоже обновился
+        subjects = self.client.get(reverse('schedule:subject_options')).json()['subjects']
+        self.assertIn('Фикх', [subject['name'] for subject in subjects])
+
+    def test_add_lesson_invalidates_only_its_group(self):
+        url = reverse('schedule:list')
+        self.client.get(url)
+
+        self.client.post(url, {
+            'lesson': '', 'group': self.group.id, 'day': self.day.id, 'subject': self.subject.id
+        })
+        with QueryTracker() as tracker:
+            response = self.client.get(url)
+        self.assertContains(response, 'Таджвид')
+        # Строка второй группы осталась в кеше: заново строится только
+        # изменённая группа
+        rebuilt = [sql for sql in tracker.queries if sql.startswith('SELECT "group_group"')]
+        self.assertEqual(len(rebuilt), 1)
+        self.assertIn('IN (%s)', rebuilt[0])
+
+    def test_calendar_follows_schedule_changes(self):
+        url = reverse('schedule:calendar')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Schedule.objects.create(group=self.other, day=self.day, subject=self.subject)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Таджвид - Группа 2')
@@ -6,6 +6,8 @@ app_name = 'schedule'
 urlpatterns = [
     path('', schedule, name='list'),
     path('calendar/', calendar_view, name='calendar'),
+    path('<int:pk>/', lesson_detail, name='lesson'),
     path('<int:pk>/delete/', delete, name='delete'),
     path('subjects/create/', subject_create, name='subject_create'),
+    path('subjects/options/', subject_options, name='subject_options'),
 ]
\ No newline at end of file
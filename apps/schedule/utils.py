@@ -0,0 +1,256 @@
+import hashlib
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.utils.safestring import mark_safe
+
+from apps.group.models import Group
+from apps.user.profile import profile_version
+from .models import Day, Schedule, Subject
+
+
+# Сколько групп администратор видит на одной странице расписания
+GROUPS_PER_PAGE = 10
+
+# Сколько хранятся закешированные части страниц; устаревшие версии
+# просто истекают
+SCHEDULE_CACHE_TIMEOUT = 60 * 60 * 24
+
+WEEKDAYS = {
+    0: 'Понедельник',
+    1: 'Вторник',
+    2: 'Среда',
+    3: 'Четверг',
+    4: 'Пятница',
+    5: 'Суббота',
+    6: 'Воскресенье'
+}
+
+# Версии расписания — время последнего изменения (time.time()):
+# общая меняется с днями, группами, курсами и предметами, версия группы — с её
+# занятиями, версия занятий — с любым занятием школы (итоги по дням,
+# календарь администратора). Закешированные части страниц строятся
+# заново, когда меняется версия в их ключе
+_VERSION_KEY = 'schedule:version'
+_LESSONS_VERSION_KEY = 'schedule:lessons:version'
+
+
+def _group_version_key(group_id):
+    return f'schedule:group:{group_id}:version'
+
+
+def bump_schedule_version():
+    """Сбросить всё расписание (изменились дни, группы, курсы или предметы)"""
+    cache.set(_VERSION_KEY, time.time(), timeout=None)
+
+
+def bump_group_schedule(*group_ids):
+    """Сбросить расписание групп и общие итоги занятий"""
+    now = time.time()
+    versions = {_group_version_key(group_id): now for group_id in group_ids if group_id}
+    versions[_LESSONS_VERSION_KEY] = now
+    cache.set_many(versions, timeout=None)
+
+
+def _versions(keys):
+    """Версии по ключам; отсутствующие в кеше заводятся текущим временем"""
+    stored = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in stored}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        stored.update(missing)
+    return stored
+
+
+class ScheduleVersions:
+    """Версии, от которых зависит страница: общая, занятий и групп"""
+
+    def __init__(self, group_ids=(), lessons=False):
+        keys = [_VERSION_KEY] + [_group_version_key(group_id) for group_id in group_ids]
+        if lessons:
+            keys.append(_LESSONS_VERSION_KEY)
+        self.values = _versions(keys)
+        self.common = self.values[_VERSION_KEY]
+        self.lessons = self.values.get(_LESSONS_VERSION_KEY)
+
+    def group(self, group_id):
+        return self.values[_group_version_key(group_id)]
+
+    @property
+    def last_modified(self):
+        return max(self.values.values())
+
+    def etag(self, *parts):
+        source = repr((sorted(self.values.items()), parts))
+        return hashlib.md5(source.encode()).hexdigest()
+
+
+def conditional_page(request, versions, build, *etag_parts):
+    """Ответ с ETag/Last-Modified; 304, если у браузера актуальная копия
+
+    build() строит ответ только когда копия браузера устарела. В ETag
+    входят версии расписания, сессия (CSRF-токен в формах) и профиль из
+    шапки страницы. Пока в сессии ждут сообщения, 304 не отдаётся.
+    """
+    user = request.user
+    etag = quote_etag(versions.etag(
+        user.pk, profile_version(user.pk), request.session.session_key, *etag_parts
+    ))
+    last_modified = int(versions.last_modified)
+
+    response = None
+    if not len(get_messages(request)):
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build()
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def current_day_title():
+    """Название сегодняшнего дня недели, как в Day.title"""
+    return WEEKDAYS.get(datetime.now().weekday(), '')
+
+
+def visible_lessons(profile):
+    """Занятия видимых пользователю групп (для календаря)"""
+    lessons = Schedule.objects.select_related('group', 'day', 'subject').order_by('day__order', 'time_slot', 'id')
+    if profile.is_admin:
+        return lessons
+    return lessons.filter(group_id__in=profile.group_ids)
+
+
+def paginate_groups(group_ids, page_number, per_page=GROUPS_PER_PAGE):
+    """Страница групп для администратора; размер страницы не зависит от школы"""
+    return Paginator(group_ids, per_page).get_page(page_number)
+
+
+def build_grid(groups, days):
+    """Сетка группа → день → занятия одним запросом к Schedule
+
+    Возвращает [{'group': группа, 'cells': [{'day': день, 'lessons': [...]}]}],
+    занятия в ячейке упорядочены по time_slot. Шаблону не нужно перебирать
+    все занятия для каждой ячейки.
+    """
+    groups = list(groups)
+    lessons = Schedule.objects.filter(
+        group_id__in=[group.id for group in groups]
+    ).select_related('subject').order_by('time_slot', 'id')
+
+    cells = defaultdict(list)
+    for lesson in lessons:
+        cells[lesson.group_id, lesson.day_id].append(lesson)
+
+    return [
+        {
+            'group': group,
+            'cells': [{'day': day, 'lessons': cells[group.id, day.id]} for day in days],
+        }
+        for group in groups
+    ]
+
+
+def schedule_group_ids(versions):
+    """id всех групп по порядку (для страниц администратора)"""
+    key = f'schedule:group_ids:v{versions.common}'
+    group_ids = cache.get(key)
+    if group_ids is None:
+        group_ids = list(Group.objects.order_by('id').values_list('id', flat=True))
+        cache.set(key, group_ids, SCHEDULE_CACHE_TIMEOUT)
+    return group_ids
+
+
+def schedule_days(versions):
+    """Дни недели по порядку"""
+    key = f'schedule:days:v{versions.common}'
+    days = cache.get(key)
+    if days is None:
+        days = list(Day.objects.order_by('order'))
+        cache.set(key, days, SCHEDULE_CACHE_TIMEOUT)
+    return days
+
+
+def schedule_subjects(versions):
+    """Предметы для окна добавления занятия"""
+    key = f'schedule:subjects:v{versions.common}'
+    subjects = cache.get(key)
+    if subjects is None:
+        subjects = list(Subject.objects.values('id', 'name').order_by('id'))
+        cache.set(key, subjects, SCHEDULE_CACHE_TIMEOUT)
+    return subjects
+
+
+def school_day_counts(versions):
+    """Число занятий по дням по всей школе: {id дня: число}"""
+    key = f'schedule:day_counts:v{versions.common}:{versions.lessons}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = dict(Day.objects.annotate(
+            schedule_count=Count('schedule')
+        ).values_list('id', 'schedule_count'))
+        cache.set(key, counts, SCHEDULE_CACHE_TIMEOUT)
+    return counts
+
+
+def _row_key(group_id, is_admin, versions):
+    mode = 'admin' if is_admin else 'view'
+    return f'schedule:row:{group_id}:{mode}:v{versions.common}:{versions.group(group_id)}'
+
+
+def grid_rows(group_ids, days, versions, is_admin):
+    """Отрисованные строки сетки по группам из кеша
+
+    Строка — {'html': ..., 'counts': [занятий по дням]}. Промахи строятся
+    одним запросом к группам и одним к занятиям; изменение занятий группы
+    сбрасывает только её строку.
+    """
+    keys = {_row_key(group_id, is_admin, versions): group_id for group_id in group_ids}
+    cached = cache.get_many(keys.keys())
+    rows = {keys[key]: row for key, row in cached.items()}
+
+    missing = [group_id for group_id in group_ids if group_id not in rows]
+    if missing:
+        groups = Group.objects.select_related('course').filter(id__in=missing).order_by('id')
+        built = {}
+        for row in build_grid(groups, days):
+            group_id = row['group'].id
+            rows[group_id] = {
+                'html': render_to_string('schedule/grid_row.html', {'row': row, 'is_admin': is_admin}),
+                'counts': [len(cell['lessons']) for cell in row['cells']],
+            }
+            built[_row_key(group_id, is_admin, versions)] = rows[group_id]
+        cache.set_many(built, SCHEDULE_CACHE_TIMEOUT)
+
+    return [
+        {'html': mark_safe(rows[group_id]['html']), 'counts': rows[group_id]['counts']}
+        for group_id in group_ids if group_id in rows
+    ]
+
+
+def calendar_events(profile, versions):
+    """События календаря видимых групп: [{'title': ..., 'weekday': ...}]"""
+    if profile.is_admin:
+        key = f'schedule:calendar:all:v{versions.common}:{versions.lessons}'
+    else:
+        key = 'schedule:calendar:{}:{}'.format(
+            ','.join(map(str, profile.group_ids)),
+            versions.etag()
+        )
+    events = cache.get(key)
+    if events is None:
+        events = [
+            {'title': f'{lesson.subject.name} - {lesson.group.title}', 'weekday': lesson.day_id - 1}
+            for lesson in visible_lessons(profile)
+        ]
+        cache.set(key, events, SCHEDULE_CACHE_TIMEOUT)
+    return events
@@ -1,12 +1,16 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from .models import *
 from .forms import *
 from collections import defaultdict
 from django.contrib import messages
 from apps.user.utils import is_admin
-from django.db.models import Count
-from datetime import datetime
+from .utils import (
+    ScheduleVersions, calendar_events, conditional_page, current_day_title, grid_rows,
+    paginate_groups, schedule_days, schedule_group_ids, school_day_counts, schedule_subjects
+)
 
 
 def create_schedule(group_id, day_id, subject_id):
@@ -18,29 +22,11 @@ def create_schedule(group_id, day_id, subject_id):
 
 @login_required(login_url='user:login')
 def schedule(request):
-    schedules = Schedule.objects.select_related("group", "day", "subject").all()
-    groups = Group.objects.prefetch_related("schedule_set__subject", "schedule_set__day").all()
-    
-    # Get days with schedule counts
-    days = Day.objects.annotate(
-        schedule_count=Count('schedule')
-    ).order_by('order')
-    
-    subjects = Subject.objects.all()
-    
-    # Get current day name in Russian
-    current_day_mapping = {
-        0: 'Понедельник',
-        1: 'Вторник', 
-        2: 'Среда',
-        3: 'Четверг',
-        4: 'Пятница',
-        5: 'Суббота',
-        6: 'Воскресенье'
-    }
-    current_day = current_day_mapping.get(datetime.now().weekday(), '')
+    profile = request.profile
 
     if request.method == 'POST' and 'lesson' in request.POST:
+        if not profile.is_admin:
+            return redirect('schedule:list')
         group = request.POST.get('group')
         day = request.POST.get('day')
         subject = request.POST.get('subject')
@@ -49,32 +35,78 @@ def schedule(request):
             messages.success(request, 'Занятие успешно добавлено в расписание!')
         except Exception as e:
             messages.error(request, f'Ошибка при добавлении занятия: {str(e)}')
-        return redirect('schedule:list')
-    
-    context = {
-        'schedules': schedules,
-        'groups': groups,
-        'days': days,
-        'subjects': subjects,
-        'current_day': current_day
-    }
-    return render(request, 'schedule/list.html', context)
+        return redirect(request.get_full_path())
+
+    # Студент и преподаватель видят только свои группы, администратор —
+    # все группы постранично. Сетка и справочники берутся из кеша по
+    # версиям расписания, браузеру отдаётся 304, если версии не менялись
+    page_obj = None
+    if profile.is_admin:
+        versions = ScheduleVersions(lessons=True)
+        page_obj = paginate_groups(schedule_group_ids(versions), request.GET.get('page'))
+        group_ids = list(page_obj.object_list)
+        versions = ScheduleVersions(group_ids, lessons=True)
+    else:
+        group_ids = profile.group_ids
+        versions = ScheduleVersions(group_ids)
+
+    def build():
+        days = schedule_days(versions)
+        rows = grid_rows(group_ids, days, versions, profile.is_admin)
+        if profile.is_admin:
+            counts = school_day_counts(versions)
+            for day in days:
+                day.schedule_count = counts.get(day.id, 0)
+        else:
+            for index, day in enumerate(days):
+                day.schedule_count = sum(row['counts'][index] for row in rows)
+
+        context = {
+            'rows': rows,
+            'days': days,
+            'page_obj': page_obj,
+            'current_day': current_day_title()
+        }
+        return render(request, 'schedule/list.html', context)
+
+    return conditional_page(request, versions, build, current_day_title(), page_obj and page_obj.number)
 
 
 @login_required(login_url='user:login')
 def calendar_view(request):
-    schedules = Schedule.objects.select_related("group", "day", "subject").all()
-    groups = Group.objects.all()
-    days = Day.objects.order_by('order')
-    subjects = Subject.objects.all()
-    
-    context = {
-        'schedules': schedules,
-        'groups': groups,
-        'days': days,
-        'subjects': subjects
-    }
-    return render(request, 'schedule/calendar_simple.html', context)
+    profile = request.profile
+    if profile.is_admin:
+        versions = ScheduleVersions(lessons=True)
+    else:
+        versions = ScheduleVersions(profile.group_ids)
+
+    def build():
+        context = {
+            'events': calendar_events(profile, versions),
+        }
+        return render(request, 'schedule/calendar_simple.html', context)
+
+    return conditional_page(request, versions, build)
+
+
+@login_required(login_url='user:login')
+@is_admin
+def subject_options(request):
+    """Предметы для окна «Добавить занятие» (JSON, подгружается при открытии)"""
+    return JsonResponse({'subjects': schedule_subjects(ScheduleVersions())})
+
+
+@login_required(login_url='user:login')
+@is_admin
+def lesson_detail(request, pk):
+    """Данные занятия для окна удаления (JSON)"""
+    lesson = get_object_or_404(Schedule.objects.select_related('group', 'day', 'subject'), id=pk)
+    return JsonResponse({
+        'subject': lesson.subject.name,
+        'group': lesson.group.title,
+        'day': lesson.day.title,
+        'delete_url': reverse('schedule:delete', args=[lesson.id]),
+    })
 
 
 @is_admin
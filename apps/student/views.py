@@ -15,6 +15,16 @@ from apps.teacher.models import *
 from apps.group.models import *
 from apps.user.utils import generate_password, is_admin
 from apps.schedule.models import *
+from apps.grade.utils import rated_students
+from apps.dashboard.pagination import keyset_page
+from apps.dashboard.search import search
+
+
+# Сортировки списка студентов: последней колонкой идёт id (курсор страниц)
+LIST_SORTS = {
+    'new': ('-id',),
+    'name': ('name', 'id'),
+}
 
 
 @login_required(login_url='user:login')
@@ -42,16 +52,12 @@ def create(request):
 @login_required(login_url='user:login')
 @is_admin
 def list(request):
-    students = Student.objects.all().order_by('-id')
+    students = Student.objects.select_related('course').prefetch_related('group').order_by('-id')
     
     # Поиск
     search_query = request.GET.get('search', '')
     if search_query:
-        students = students.filter(
-            Q(name__icontains=search_query) |
-            Q(phone__icontains=search_query) |
-            Q(user__username__icontains=search_query)
-        )
+        students = search(students, search_query)
     
     # Фильтр по курсу
     course_filter = request.GET.get('course', '')
@@ -71,12 +77,21 @@ def list(request):
         elif learning_status == 'inactive':
             students = students.filter(status=False)
     
+    # Страница по ключу: при поиске — по релевантности, иначе по выбранной колонке
+    sort = request.GET.get('sort', '')
+    if sort not in LIST_SORTS:
+        sort = 'new'
+    ordering = ('-search_rank', '-id') if search_query else LIST_SORTS[sort]
+    page = keyset_page(request, students, ordering)
+
     # Получаем данные для фильтров
     from apps.dashboard.models import Course
     courses = Course.objects.all()
     
     context = {
-        'students': students,
+        'students': page,
+        'page': page,
+        'sort': sort,
         'courses': courses,
         'search_query': search_query,
         'course_filter': course_filter,
@@ -129,17 +144,9 @@ def total_rating_list(request):
     """Общий рейтинг студентов"""
     month, year = datetime.now().month, datetime.now().year
 
-    students = Student.objects.filter(
+    students = rated_students(year, month).filter(
         student_status='active'
-    ).annotate(
-        total_marks=Sum('grade__mark', filter=Q(grade__date__month=month) & Q(grade__date__year=year)),
-        total_pages=Sum('grade__pages', filter=Q(grade__date__month=month) & Q(grade__date__year=year)),
-        weighted_score=Sum(F('grade__mark') * F('grade__pages'), filter=Q(grade__date__month=month) & Q(grade__date__year=year)),
-        average_mark=Round(Avg('grade__mark', filter=Q(grade__date__month=month) & Q(grade__date__year=year)), 2),
-        grade_count=Count('grade', filter=Q(grade__date__month=month) & Q(grade__date__year=year))
-    ).filter(
-        grade_count__gt=0  # Только студенты с оценками
-    ).order_by('-weighted_score')
+    )
 
     # Добавляем информацию о месте в рейтинге
     for i, student in enumerate(students, 1):
@@ -168,18 +175,10 @@ def rating_by_course(request, pk):
     course = get_object_or_404(Course, id=pk)
     month, year = datetime.now().month, datetime.now().year
 
-    students = Student.objects.filter(
+    students = rated_students(year, month).filter(
         course=course,
         student_status='active'
-    ).annotate(
-        total_marks=Sum('grade__mark', filter=Q(grade__date__month=month) & Q(grade__date__year=year)),
-        total_pages=Sum('grade__pages', filter=Q(grade__date__month=month) & Q(grade__date__year=year)),
-        weighted_score=Sum(F('grade__mark') * F('grade__pages'), filter=Q(grade__date__month=month) & Q(grade__date__year=year)),
-        average_mark=Round(Avg('grade__mark', filter=Q(grade__date__month=month) & Q(grade__date__year=year)), 2),
-        grade_count=Count('grade', filter=Q(grade__date__month=month) & Q(grade__date__year=year))
-    ).filter(
-        grade_count__gt=0  # Только студенты с оценками
-    ).order_by('-weighted_score')
+    )
 
     # Добавляем информацию о месте в рейтинге и медали
     for i, student in enumerate(students, 1):
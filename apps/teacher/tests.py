@@ -1,3 +1,130 @@
+from datetime import date
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from apps.dashboard.queries import QueryTracker
+from apps.grade.models import Grade
+from apps.group.models import Group
+from apps.schedule.models import Day, Schedule, Subject
+from apps.student.models import Student
+from apps.user.models import User
+from .models import Teacher
+from .utils import attach_workload, directory_queryset
+
+
+class TeacherDirectoryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.day = Day.objects.create(title='Понедельник', order=1)
+        self.subjects = [Subject.objects.create(name=name) for name in ('Таджвид', 'Фикх')]
+        self.client.force_login(User.objects.create_user(username='admin', role='admin'))
+
+    def add_teacher(self, name, groups=2):
+        teacher = Teacher.objects.create(name=name)
+        teacher.subjects.add(self.subjects[0])
+        for index in range(groups):
+            group = Group.objects.create(title=f'{name} группа {index}')
+            teacher.group.add(group)
+            Schedule.objects.create(group=group, day=self.day, subject=self.subjects[0])
+            Schedule.objects.create(group=group, day=self.day, subject=self.subjects[1], time_slot=2)
+        return teacher
+
+    def test_workload_from_grouped_aggregates(self):
+        teacher = self.add_teacher('Учитель', groups=2)
+        student = Student.objects.create(name='Студент')
+        today = date(2024, 3, 15)
+        # bulk_create: save() оценки переносит дату на сегодня
+        Grade.objects.bulk_create([
+            Grade(student=student, teacher=teacher, subject=self.subjects[0], mark=mark, pages=1, date=day)
+            for mark, day in ((5, today), (4, date(2024, 2, 28)))
+        ])
+
+        with QueryTracker() as tracker:
+            teachers = attach_workload(directory_queryset().filter(pk=teacher.pk), today=today)
+        self.assertEqual(tracker.count, 5)
+        # Уроки фикха идут в тех же группах, но это не его предмет
+        self.assertEqual((teachers[0].weekly_lessons, teachers[0].month_marks), (2, 1))
+
+    def test_list_queries_do_not_grow_with_teachers(self):
+        self.add_teacher('Первый')
+        self.client.get(reverse('teacher:list'))
+        with QueryTracker() as tracker:
+            self.client.get(reverse('teacher:list'))
+        baseline = tracker.count
+
+        for index in range(5):
+            self.add_teacher(f'Учитель {index}', groups=3)
+        with QueryTracker() as tracker:
+            response = self.client.get(reverse('teacher:list'))
+        self.assertEqual(tracker.count, baseline, tracker.report())
+        self.assertContains(response, 'Учитель 4 группа 2')
+        self.assertContains(response, '<span class="badge bg-label-warning">Таджвид</span>', count=6)
+
+
+class TeacherRosterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.subject = Subject.objects.create(name='Таджвид')
+        self.other_subject = Subject.objects.create(name='Фикх')
+        self.groups = [Group.objects.create(title=title) for title in ('Альфа', 'Бета')]
+        self.foreign = Group.objects.create(title='Чужая')
+        user = User.objects.create_user(username='teacher', role='teacher')
+        self.teacher = Teacher.objects.create(name='Учитель', user=user)
+        self.teacher.subjects.add(self.subject)
+        self.teacher.group.add(*self.groups)
+        self.client.force_login(user)
+
+        self.both = Student.objects.create(name='Бекзат')
+        self.both.group.add(self.groups[0], self.groups[1], self.foreign)
+        self.one = Student.objects.create(name='Азиз')
+        self.one.group.add(self.groups[1])
+        self.today = date.today()
+        self.grade(self.both, 5, 3)
+        self.grade(self.both, 4, 2)
+        self.grade(self.both, 2, 10, subject=self.other_subject)
+
+    def grade(self, student, mark, pages, subject=None):
+        Grade.objects.create(student=student, teacher=self.teacher, subject=subject or self.subject,
+                             mark=mark, pages=pages, date=self.today)
+
+    def get(self, **params):
+        with QueryTracker() as tracker:
+            response = self.client.get(reverse('teacher:students'), params)
+        return response, tracker
+
+    def test_distinct_students_with_summaries(self):
+        response, _ = self.get()
+        students = list(response.context['students'])
+        self.assertEqual([student.name for student in students], ['Азиз', 'Бекзат'])
+
+        both = students[1]
+        self.assertEqual([group.title for group in both.roster_groups], ['Альфа', 'Бета'])
+        # Оценка по чужому предмету в итоги не входит
+        self.assertEqual((both.month_average, both.month_pages, both.last_graded), (4.5, 5, self.today))
+        self.assertIsNone(students[0].month_average)
+
+    def test_sort_and_filter_on_server(self):
+        response, _ = self.get(sort='average')
+        self.assertEqual([student.name for student in response.context['students']], ['Бекзат', 'Азиз'])
+
+        response, _ = self.get(group=self.groups[0].id)
+        self.assertEqual([student.name for student in response.context['students']], ['Бекзат'])
+        response, _ = self.get(group=self.foreign.id)
+        self.assertEqual(len(response.context['students']), 2)
+
+        response, _ = self.get(search='aziz')
+        self.assertEqual([student.name for student in response.context['students']], ['Азиз'])
 
-# Create your tests here.
+    def test_queries_do_not_grow_with_students(self):
+        self.get()
+        _, tracker = self.get()
+        baseline = tracker.count
+        for index in range(5):
+            student = Student.objects.create(name=f'Студент {index}')
+            student.group.add(*self.groups)
+            self.grade(student, 5, 1)
+        response, tracker = self.get()
+        self.assertEqual(len(response.context['students']), 7)
+        self.assertEqual(tracker.count, baseline, tracker.report())
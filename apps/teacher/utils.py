@@ -1,7 +1,18 @@
 import random
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db.models import Count, F, Max, OuterRef, Prefetch, Q, Subquery, Sum
+from django.db.models.functions import NullIf, Round
 from django.utils import timezone
-from .models import Code
-from datetime import timedelta
+
+from apps.grade.models import Grade
+from apps.grade.utils import month_range
+from apps.group.models import Group
+from apps.schedule.models import Schedule, Subject
+from apps.student.models import Student
+from .models import Code, Teacher
+
 
 def generate_code():
     code = f"{random.randint(1000, 9999)}"
@@ -12,4 +23,88 @@ def generate_code():
         else:
             Code.objects.create(value=code, created_at=timezone.now())
     else:
-        Code.objects.create(value=code, created_at=timezone.now())
\ No newline at end of file
+        Code.objects.create(value=code, created_at=timezone.now())
+
+
+def directory_queryset():
+    """Преподаватели с предметами и группами: по одной предзагрузке на страницу"""
+    return Teacher.objects.prefetch_related(
+        Prefetch('subjects', queryset=Subject.objects.only('id', 'name').order_by('name')),
+        Prefetch('group', queryset=Group.objects.only('id', 'title').order_by('title')),
+    )
+
+
+def attach_workload(teachers, today=None):
+    """Нагрузка преподавателей страницы двумя сгруппированными запросами
+
+    weekly_lessons — занятий в неделю по расписанию: уроки его предметов в
+    его группах; month_marks — оценок, поставленных в текущем месяце.
+    Предметы и группы берутся из предзагрузки directory_queryset().
+    """
+    teachers = list(teachers)
+    if not teachers:
+        return teachers
+    today = today or date.today()
+    start, end = month_range(today.year, today.month)
+
+    lessons = defaultdict(int)
+    group_ids = {group.id for teacher in teachers for group in teacher.group.all()}
+    for row in Schedule.objects.filter(group_id__in=group_ids).values(
+        'group_id', 'subject_id'
+    ).annotate(total=Count('id')).order_by():
+        lessons[row['group_id'], row['subject_id']] = row['total']
+
+    marks = dict(Grade.objects.filter(
+        teacher_id__in=[teacher.id for teacher in teachers], date__gte=start, date__lt=end
+    ).values('teacher_id').annotate(total=Count('id')).order_by().values_list('teacher_id', 'total'))
+
+    for teacher in teachers:
+        subject_ids = [subject.id for subject in teacher.subjects.all()]
+        teacher.weekly_lessons = sum(
+            lessons[group.id, subject_id]
+            for group in teacher.group.all() for subject_id in subject_ids
+        )
+        teacher.month_marks = marks.get(teacher.id, 0)
+    return teachers
+
+
+# Сортировки списка учеников преподавателя; пустые значения — в конце
+ROSTER_SORTS = {
+    'name': (F('name').asc(), 'id'),
+    'average': (F('month_average').desc(nulls_last=True), 'name', 'id'),
+    'pages': (F('month_pages').desc(nulls_last=True), 'name', 'id'),
+    'last_graded': (F('last_graded').desc(nulls_last=True), 'name', 'id'),
+}
+
+
+def roster_queryset(teacher_id, group_ids, today=None):
+    """Ученики групп преподавателя, каждый один раз, с итогами его предметов
+
+    month_average и month_pages — за текущий месяц из StudentMonthlyStats,
+    last_graded — дата последней оценки по его предметам. Группы ученика
+    (только группы преподавателя, с курсом) предзагружаются в roster_groups.
+    """
+    today = today or date.today()
+    subject_ids = Teacher.subjects.through.objects.filter(teacher_id=teacher_id).values('subject_id')
+    in_month = Q(
+        monthly_stats__year=today.year,
+        monthly_stats__month=today.month,
+        monthly_stats__subject_id__in=subject_ids,
+    )
+    last_graded = Grade.objects.filter(
+        student=OuterRef('pk'), subject_id__in=subject_ids
+    ).order_by().values('student').annotate(last=Max('date')).values('last')
+
+    return Student.objects.filter(
+        pk__in=Student.group.through.objects.filter(group_id__in=group_ids).values('student_id')
+    ).annotate(
+        month_marks=Sum('monthly_stats__sum_marks', filter=in_month),
+        month_count=Sum('monthly_stats__grade_count', filter=in_month),
+        month_pages=Sum('monthly_stats__sum_pages', filter=in_month),
+        month_average=Round(F('month_marks') / NullIf(F('month_count'), 0), 2),
+        last_graded=Subquery(last_graded),
+    ).prefetch_related(Prefetch(
+        'group',
+        queryset=Group.objects.filter(id__in=group_ids).select_related('course').order_by('title'),
+        to_attr='roster_groups',
+    ))
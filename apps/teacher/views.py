@@ -2,12 +2,22 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 from datetime import datetime
-from apps.teacher.utils import generate_code
+from apps.teacher.utils import ROSTER_SORTS, attach_workload, directory_queryset, generate_code, roster_queryset
 from .models import *
 from .forms import *
 from django.contrib import messages
 from apps.user.utils import generate_password, is_admin, is_teacher
 from django.db.models import Q
+from apps.dashboard.pagination import keyset_page
+from apps.dashboard.search import search
+
+
+# Сортировки списка преподавателей: последней колонкой идёт id (курсор страниц)
+LIST_SORTS = {
+    'new': ('-id',),
+    'name': ('name', 'id'),
+}
+
 
 @is_admin
 def create(request):
@@ -34,28 +44,34 @@ def create(request):
 @login_required(login_url='user:login')
 @is_admin
 def list(request):
-    teachers = Teacher.objects.all().order_by('-id')
+    teachers = directory_queryset().order_by('-id')
     
     # Поиск
     search_query = request.GET.get('search', '')
     if search_query:
-        teachers = teachers.filter(
-            Q(name__icontains=search_query) |
-            Q(phone__icontains=search_query) |
-            Q(user__username__icontains=search_query)
-        )
+        teachers = search(teachers, search_query)
     
     # Фильтр по предмету
     subject_filter = request.GET.get('subject', '')
     if subject_filter:
         teachers = teachers.filter(subjects__id=subject_filter)
     
+    # Страница по ключу: при поиске — по релевантности, иначе по выбранной колонке
+    sort = request.GET.get('sort', '')
+    if sort not in LIST_SORTS:
+        sort = 'new'
+    ordering = ('-search_rank', '-id') if search_query else LIST_SORTS[sort]
+    page = keyset_page(request, teachers, ordering)
+    attach_workload(page)
+
     # Получаем данные для фильтров
     from apps.schedule.models import Subject
     subjects = Subject.objects.all()
 
     context = {
-        'teachers': teachers,
+        'teachers': page,
+        'page': page,
+        'sort': sort,
         'subjects': subjects,
         'search_query': search_query,
         'subject_filter': subject_filter,
@@ -85,22 +101,49 @@ def details(request, pk):
 @is_teacher
 def students(request):
 
-    teacher = get_object_or_404(Teacher, user=request.user)
-    groups = Group.objects.filter(teacher=teacher)
-    students = Student.objects.filter(group__in=groups)
+    profile = request.profile.require('teacher')
+    students = roster_queryset(profile.pk, profile.group_ids)
 
-    context = {'students': students, 'teacher': teacher}
+    # Фильтры: группа, статус и поиск по имени или телефону
+    group_filter = request.GET.get('group', '')
+    if group_filter.isdigit() and int(group_filter) in profile.group_ids:
+        students = students.filter(group__id=group_filter)
+    else:
+        group_filter = ''
+
+    status_filter = request.GET.get('student_status', '')
+    if status_filter:
+        students = students.filter(student_status=status_filter)
+
+    search_query = request.GET.get('search', '')
+    if search_query:
+        students = search(students, search_query)
+
+    sort = request.GET.get('sort', '')
+    if sort not in ROSTER_SORTS:
+        sort = 'name'
+    students = students.order_by(*ROSTER_SORTS[sort])
+
+    context = {
+        'students': students,
+        'groups': Group.objects.filter(id__in=profile.group_ids).order_by('title'),
+        'group_filter': group_filter,
+        'status_filter': status_filter,
+        'search_query': search_query,
+        'sort': sort,
+    }
     return render(request, 'teacher/students.html', context)
 
 
 # Список отчетов учителя
 @login_required(login_url='user:login')
 def report_list(request):
-    report_list = TeacherReport.objects.all().order_by('-id')
+    reports = TeacherReport.objects.select_related('group__course', 'teacher')
+    report_list = keyset_page(request, reports, ('-id',))
     form = TeacherReportForm()
 
-    try:
-        teacher = Teacher.objects.get(user_id=request.user.id)
+    if request.profile.is_teacher and request.profile.pk is not None:
+        teacher = request.profile.instance
         groups = teacher.group
         if request.method == 'POST':
             form = TeacherReportForm(request.POST)
@@ -111,7 +154,7 @@ def report_list(request):
                 form.instance.group = group
                 form.save()
                 return redirect('teacher:reports')
-    except Teacher.DoesNotExist:
+    else:
         form = None
         groups = []
 
@@ -137,6 +180,7 @@ def generated_code(request):
 @login_required(login_url='user:login')
 @is_teacher
 def code(request):
+    profile = request.profile.require('teacher')
     form = TeacherCodeForm()
     current_year = datetime.now().year
     current_month = datetime.now().month
@@ -147,8 +191,7 @@ def code(request):
             code = form.cleaned_data.get('code')
             generated_code = Code.objects.latest('created_at')
             if code == generated_code.value:
-                teacher = Teacher.objects.get(user=request.user)
-                Attendance.objects.create(teacher=teacher)
+                Attendance.objects.create(teacher_id=profile.pk)
                 messages.success(request, 'Код подтвержден')
                 return redirect('teacher:code')
             else:
@@ -158,7 +201,7 @@ def code(request):
     context = {
         'form': form,
         'today': Attendance.objects.filter(
-            Q(date__month=current_month) & Q(date__year=current_year) & Q(date__day=current_day) & Q(teacher__user__id=request.user.id)).exists()
+            Q(date__month=current_month) & Q(date__year=current_year) & Q(date__day=current_day) & Q(teacher_id=profile.pk)).exists()
             
         }
     return render(request, 'teacher/code.html', context)
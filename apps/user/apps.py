@@ -5,3 +5,6 @@ class UserConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.user'
     verbose_name = 'Аккаунты'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,31 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+
+from apps.user.profile import get_profile
+
+
+class ProfileMiddleware:
+    """request.profile — профиль роли пользователя, загружается при первом обращении
+
+    Подходит и для ASGI: сам профиль читается лениво, при первом обращении
+    из синхронного кода представления.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request.profile = SimpleLazyObject(lambda: get_profile(request))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_profile(request))
+        return await self.get_response(request)
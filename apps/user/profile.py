@@ -0,0 +1,164 @@
+"""Профиль роли текущего пользователя (request.profile)
+
+У пользователя одна роль и не больше одной записи Student, Teacher или
+Administrator. ProfileMiddleware находит её один раз и кладёт в сессию
+вместе с именем, аватаром и группами. Данные в сессии сверяются с
+версией профиля в кеше; сигналы (apps.user.signals) сбрасывают версию
+при изменении записи роли, её групп или самого пользователя.
+
+group_ids решают доступ к журналам, поэтому сессии можно доверять только
+при общем для всех процессов кеше (Redis, Memcached, база, файлы). С
+кешем в памяти процесса (LocMemCache) сброс версии в одном воркере не
+виден другим, и профиль читается из базы на каждый запрос.
+"""
+from uuid import uuid4
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from apps.administrator.models import Administrator
+from apps.student.models import Student
+from apps.teacher.models import Teacher
+
+
+SESSION_KEY = '_profile'
+
+PROFILE_MODELS = {
+    'student': Student,
+    'teacher': Teacher,
+    'administrator': Administrator,
+}
+
+ROLE_TITLES = {
+    'admin': 'Администратор',
+    'administrator': 'Администратор',
+    'teacher': 'Преподаватель',
+    'student': 'Студент',
+}
+
+
+# Кеши в памяти одного процесса: версия профиля в них не видна другим воркерам
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def session_cache_enabled():
+    """Хранить профиль в сессии можно только при общем кеше версий"""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], PROCESS_LOCAL_CACHES)
+
+
+def _version_key(user_id):
+    return f'profile:{user_id}:version'
+
+
+def profile_version(user_id):
+    """Текущая версия профиля; при пустом кеше выдаётся новая"""
+    return cache.get_or_set(_version_key(user_id), lambda: uuid4().hex, None)
+
+
+def bump_profile_version(*user_ids):
+    """Сбросить закешированные в сессиях профили пользователей"""
+    cache.delete_many([_version_key(user_id) for user_id in user_ids if user_id])
+
+
+def _empty_data(user):
+    return {'user_id': user.pk, 'kind': None, 'pk': None, 'name': '', 'image_url': '', 'group_ids': []}
+
+
+def load_profile_data(user):
+    """Запись роли пользователя: до двух запросов (запись и её группы)"""
+    data = _empty_data(user)
+    model = PROFILE_MODELS.get(user.role)
+    if model is None:
+        return data
+
+    fields = ['id', 'name'] + (['image'] if hasattr(model, 'image') else [])
+    row = model.objects.filter(user_id=user.pk).values(*fields).first()
+    if row is None:
+        return data
+
+    data.update(kind=user.role, pk=row['id'], name=row['name'])
+    if row.get('image'):
+        data['image_url'] = model._meta.get_field('image').storage.url(row['image'])
+    if hasattr(model, 'group'):
+        through = model.group.through
+        data['group_ids'] = sorted(through.objects.filter(
+            **{f'{model._meta.model_name}_id': row['id']}
+        ).values_list('group_id', flat=True))
+    return data
+
+
+class Profile:
+    """Роль текущего пользователя и её запись
+
+    pk — id записи Student/Teacher/Administrator (None, если записи нет),
+    group_ids — группы студента или преподавателя. Сама запись модели
+    загружается лениво через instance.
+    """
+
+    def __init__(self, user, data):
+        self.user = user
+        self.role = getattr(user, 'role', None)
+        self.kind = data['kind']
+        self.pk = data['pk']
+        self.name = data['name']
+        self.image_url = data['image_url']
+        self.group_ids = data['group_ids']
+
+    def __repr__(self):
+        return f'<Profile {self.kind or self.role}:{self.pk}>'
+
+    @property
+    def is_admin(self):
+        return bool(self.user.is_superuser or self.role in ('admin', 'administrator'))
+
+    @property
+    def is_teacher(self):
+        """По роли, как раньше; запись Teacher проверяет require('teacher')"""
+        return self.role == 'teacher'
+
+    @property
+    def is_student(self):
+        return self.role == 'student'
+
+    @property
+    def role_title(self):
+        return ROLE_TITLES.get(self.role, '')
+
+    @property
+    def display_name(self):
+        return self.name or ('Админ' if self.role == 'admin' else self.user.get_username())
+
+    @cached_property
+    def instance(self):
+        """Запись Student/Teacher/Administrator (один запрос при первом обращении)"""
+        if self.pk is None:
+            return None
+        return PROFILE_MODELS[self.kind].objects.get(pk=self.pk)
+
+    def require(self, kind):
+        """Профиль нужной роли или 404, как раньше get_object_or_404(Model, user=...)"""
+        if self.kind != kind or self.pk is None:
+            raise Http404('Профиль не найден')
+        return self
+
+
+def get_profile(request):
+    """Профиль из сессии или из базы, если версия в кеше сменилась"""
+    user = request.user
+    if not user.is_authenticated:
+        return Profile(user, _empty_data(user))
+    if not session_cache_enabled():
+        return Profile(user, load_profile_data(user))
+
+    session = getattr(request, 'session', None)
+    version = profile_version(user.pk)
+    data = session.get(SESSION_KEY) if session is not None else None
+    if not data or data.get('user_id') != user.pk or data.get('version') != version:
+        data = load_profile_data(user)
+        data['version'] = version
+        if session is not None:
+            session[SESSION_KEY] = data
+    return Profile(user, data)
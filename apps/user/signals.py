@@ -0,0 +1,42 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from apps.administrator.models import Administrator
+from apps.student.models import Student
+from apps.teacher.models import Teacher
+from .models import User
+from .profile import bump_profile_version
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    bump_profile_version(instance.pk)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=Administrator)
+@receiver(post_delete, sender=Administrator)
+def profile_changed(sender, instance, **kwargs):
+    bump_profile_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Student.group.through)
+@receiver(m2m_changed, sender=Teacher.group.through)
+def profile_groups_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Группы студента или преподавателя изменились — профиль в сессии устарел"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        bump_profile_version(instance.user_id)
+        return
+
+    # Со стороны группы: instance — Group, pk_set — студенты или преподаватели
+    if action == 'pre_clear':
+        members = model.objects.filter(group=instance)
+    else:
+        members = model.objects.filter(pk__in=pk_set)
+    bump_profile_version(*members.values_list('user_id', flat=True))
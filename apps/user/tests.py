@@ -1,3 +1,83 @@
-from django.test import TestCase
+import tempfile
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.dashboard.queries import QueryTracker
+from apps.group.models import Group
+from apps.teacher.models import Teacher
+from .models import User
+from .profile import SESSION_KEY
+
+
+# Общий для процессов кеш: только с ним профиль хранится в сессии
+SHARED_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': tempfile.mkdtemp(),
+}}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class ProfileTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(title='Группа 1')
+        self.user = User.objects.create_user(username='teacher', role='teacher')
+        self.teacher = Teacher.objects.create(user=self.user, name='Учитель Тестовый')
+        self.teacher.group.add(self.group)
+        self.client.force_login(self.user)
+
+    def teacher_queries(self, tracker):
+        return [sql for sql in tracker.queries if '"teacher_teacher"' in sql]
+
+    def test_profile_resolved_once_and_cached_in_session(self):
+        with QueryTracker() as tracker:
+            response = self.client.get(reverse('grade:group_list'))
+        self.assertContains(response, 'Учитель Тестовый')
+        self.assertContains(response, 'Группа 1')
+        self.assertEqual(len(self.teacher_queries(tracker)), 1)
+        self.assertEqual(self.client.session[SESSION_KEY]['group_ids'], [self.group.id])
+
+        with QueryTracker() as tracker:
+            response = self.client.get(reverse('grade:group_list'))
+        self.assertContains(response, 'Учитель Тестовый')
+        self.assertEqual(self.teacher_queries(tracker), [])
+
+    def test_changes_invalidate_session_profile(self):
+        self.client.get(reverse('grade:group_list'))
+
+        other = Group.objects.create(title='Группа 2')
+        self.teacher.group.add(other)
+        response = self.client.get(reverse('grade:group_list'))
+        self.assertContains(response, 'Группа 2')
+
+        self.teacher.name = 'Новое Имя'
+        self.teacher.save()
+        response = self.client.get(reverse('grade:group_list'))
+        self.assertContains(response, 'Новое Имя')
+
+        other.teacher_set.clear()
+        self.client.get(reverse('grade:group_list'))
+        self.assertEqual(self.client.session[SESSION_KEY]['group_ids'], [self.group.id])
+
+    def test_missing_role_record(self):
+        # Роль решает is_teacher, как раньше; страницы записи без неё отдают 404
+        self.teacher.delete()
+        response = self.client.get(reverse('grade:group_list'))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('teacher:students'))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('teacher:code'))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('teacher:reports'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_reads_profile_every_request(self):
+        self.client.get(reverse('grade:group_list'))
+        self.assertNotIn(SESSION_KEY, self.client.session)
+        with QueryTracker() as tracker:
+            response = self.client.get(reverse('grade:group_list'))
+        self.assertContains(response, 'Учитель Тестовый')
+        self.assertEqual(len(self.teacher_queries(tracker)), 1)
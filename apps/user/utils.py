@@ -10,7 +10,7 @@ def generate_password():
 
 def is_admin(func):
     def wrapper(request, *args, **kwargs):
-        if request.user.is_superuser or request.user.role == 'admin' or request.user.role == 'administrator':
+        if request.profile.is_admin:
             return func(request, *args, **kwargs)
         else:
             return redirect('schedule:list')
@@ -19,7 +19,7 @@ def is_admin(func):
 
 def is_teacher(func):
     def wrapper(request, *args, **kwargs):
-        if request.user.role == 'teacher':
+        if request.profile.is_teacher:
             return func(request, *args, **kwargs)
         else:
             return redirect('schedule:list')
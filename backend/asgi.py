@@ -3,6 +3,12 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Живые обновления журнала (Server-Sent Events, grade:events) работают только
+под ASGI: gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker.
+В docker-compose.yml так запущен только сервис events, и nginx отправляет
+в него одни адреса .../events/; остальные страницы идут через WSGI, где
+потоковые выгрузки не собираются в памяти целиком.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -30,20 +30,31 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.dashboard.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.user.middleware.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Поиск N+1 запросов (для разработки): повторяющиеся формы SQL пишутся в лог
+if config('QUERY_INSPECTOR', default=False, cast=bool):
+    MIDDLEWARE.append('apps.dashboard.middleware.QueryInspectorMiddleware')
+
+# Замеры запросов (ServerTimingMiddleware): заголовок Server-Timing
+# и журнал медленных запросов с их SQL (0 — выключен)
+SERVER_TIMING = config('SERVER_TIMING', default=DEBUG, cast=bool)
+SLOW_REQUEST_MS = config('SLOW_REQUEST_MS', default=0, cast=int)
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'apps.dashboard.timing.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -97,6 +108,42 @@ DATABASES = {
 # }
 
 
+# Cache (журнал оценок и другие материализованные данные).
+# Для нескольких воркеров укажите общий бэкенд, например
+# django.core.cache.backends.redis.RedisCache. С LocMemCache профиль
+# пользователя читается из базы на каждый запрос (apps.user.profile)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='tahfiz'),
+    }
+}
+
+# Живые обновления страниц (SSE, apps.dashboard.events). В памяти процесса
+# достаточно одного воркера ASGI, который обслуживает и страницы; если
+# поток событий идёт через отдельный ASGI-сервис, а страницы — через WSGI
+# (docker-compose.yml), нужен PostgreSQL: apps.dashboard.events.PostgresBroker
+LIVE_EVENTS_BACKEND = config('LIVE_EVENTS_BACKEND', default='apps.dashboard.events.InProcessBroker')
+
+# Страницы под WSGI подключаются к потоку событий (его обслуживает ASGI-сервис)
+LIVE_EVENTS = config('LIVE_EVENTS', default=False, cast=bool)
+
+# Журналы приложений. Строки замеров каждого запроса (ServerTimingMiddleware)
+# пишутся с уровнем INFO, медленные запросы и N+1 — WARNING
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'apps': {'handlers': ['console'], 'level': config('APPS_LOG_LEVEL', default='WARNING')},
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',